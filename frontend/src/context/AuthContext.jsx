@@ -107,15 +107,18 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    // Read the tokens before clearing them, so the server can revoke both
+    const accessToken = localStorage.getItem('accessToken');
+    const refreshToken = localStorage.getItem('refreshToken');
+    
     // Clear all auth data
     localStorage.removeItem('accessToken');
     localStorage.removeItem('refreshToken');
     localStorage.removeItem('user');
     setCurrentUser(null);
     
-    const refreshToken = localStorage.getItem('refreshToken');
     if (refreshToken) {
-      api.post('/users/logout/', { refresh: refreshToken }).catch(() => {});
+      api.post('/users/logout/', { refresh: refreshToken, access: accessToken }).catch(() => {});
     }
   };
 
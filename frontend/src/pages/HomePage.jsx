@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import Layout from '../components/layout/Layout';
-import api from '../utils/api';
+import api, { getProductImageUrl } from '../utils/api';
 import { useAuth } from '../context/AuthContext';
 import { useCart } from '../context/CartContext';
 
@@ -157,7 +157,7 @@ const HomePage = () => {
                 <div className="h-48 bg-gray-200">
                   {product.image ? (
                     <img
-                      src={product.image}
+                      src={getProductImageUrl(product)}
                       alt={product.name}
                       className="w-full h-full object-cover"
                     />
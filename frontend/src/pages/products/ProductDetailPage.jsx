@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link, useNavigate, useLocation } from 'react-router-dom';
 import Layout from '../../components/layout/Layout';
-import api from '../../utils/api';
+import api, { getProductImageUrl } from '../../utils/api';
 import { useAuth } from '../../context/AuthContext';
 import { useCart } from '../../context/CartContext';
 import CustomButton from '../../components/CustomButton';
@@ -120,7 +120,7 @@ const ProductDetailPage = () => {
             <div className="bg-white rounded-lg shadow-md overflow-hidden">
               {product?.image ? (
                 <img
-                  src={product.image}
+                  src={getProductImageUrl(product, 'detail')}
                   alt={product.name}
                   className="w-full h-auto object-cover"
                 />
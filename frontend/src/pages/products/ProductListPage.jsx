@@ -3,7 +3,7 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { Link, useSearchParams, useNavigate, useLocation } from 'react-router-dom';
 import Layout from '../../components/layout/Layout';
-import api from '../../utils/api';
+import api, { getProductImageUrl } from '../../utils/api';
 import { useAuth } from '../../context/AuthContext';
 import { useCart } from '../../context/CartContext';
 
@@ -371,7 +371,7 @@ const ProductListPage = () => {
                       <div className="h-48 bg-gray-200">
                         {product.image ? (
                           <img
-                            src={product.image}
+                            src={getProductImageUrl(product)}
                             alt={product.name}
                             className="w-full h-full object-cover"
                           />
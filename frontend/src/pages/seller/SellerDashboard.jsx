@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import Layout from '../../components/layout/Layout';
-import api from '../../utils/api';
+import api, { getProductImageUrl } from '../../utils/api';
 import { useAuth } from '../../context/AuthContext';
 import CustomButton from '../../components/CustomButton';
 
@@ -324,7 +324,7 @@ const SellerDashboard = () => {
                           <div className="flex items-center">
                             <div className="h-10 w-10 flex-shrink-0 bg-gray-100 rounded-md overflow-hidden">
                               {product.image ? (
-                                <img src={product.image} alt={product.name} className="h-10 w-10 object-cover" />
+                                <img src={getProductImageUrl(product, 'thumbnail')} alt={product.name} className="h-10 w-10 object-cover" />
                               ) : (
                                 <div className="h-10 w-10 flex items-center justify-center text-gray-500">
                                   <svg className="h-5 w-5" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
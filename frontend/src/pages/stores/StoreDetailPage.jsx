@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import Layout from '../../components/layout/Layout';
-import api, { getMediaUrl } from '../../utils/api';
+import api, { getMediaUrl, getProductImageUrl } from '../../utils/api';
 import { useAuth } from '../../context/AuthContext';
 import { useCart } from '../../context/CartContext';
 import { applyFont } from '../../utils/fontLoader';
@@ -30,27 +30,12 @@ const StoreDetailPage = () => {
     const fetchStoreData = async () => {
       setLoading(true);
       try {
-        // Fetch store details
-        const storeResponse = await api.get(`/stores/${subdomain}/`);
-        setStore(storeResponse.data);
+        // Fetch store, products and ratings in a single request
+        const response = await api.get(`/stores/${subdomain}/page/`);
+        setStore(response.data.store);
+        setProducts(response.data.products.results);
         
-        // Fetch store products
-        const productsResponse = await api.get(`/products/?store=${storeResponse.data.store_id}`);
-        setProducts(productsResponse.data.results || productsResponse.data);
-        
-        // Fetch store ratings 
-        const ratingsResponse = await api.get(`/stores/${subdomain}/ratings/?limit=100`);
-        console.log('Ratings data:', ratingsResponse.data);
-        
-        // Set ratings directly from the results array
-        let allReviews = [];
-        if (ratingsResponse.data?.results && Array.isArray(ratingsResponse.data.results)) {
-          allReviews = ratingsResponse.data.results;
-        } else if (Array.isArray(ratingsResponse.data)) {
-          allReviews = ratingsResponse.data;
-        }
-        
-        console.log(`Found ${allReviews.length} total reviews`);
+        const allReviews = response.data.recent_ratings || [];
         setRatings(allReviews);
         setDisplayedReviews(allReviews.slice(0, reviewsPerPage));
         setHasMoreReviews(allReviews.length > reviewsPerPage);
@@ -379,7 +364,7 @@ const SimpleButton = ({ onClick, disabled, children, type = "primary", fullWidth
                       <div className="product-image">
                         {product.image ? (
                           <img
-                            src={product.image}
+                            src={getProductImageUrl(product)}
                             alt={product.name}
                             className="w-full h-full object-cover"
                           />
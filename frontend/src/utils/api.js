@@ -26,6 +26,17 @@ export const getMediaUrl = (url) => {
   return `${baseUrl}/${cleanUrl}`;
 };
 
+// Pick a resized product image (thumbnail, card or detail), falling back to
+// the placeholder and then the original upload while variants are rendering
+export const getProductImageUrl = (product, size = 'card') => {
+  const variants = product.image_variants?.[size];
+  if (variants && variants.length > 0) {
+    const variant = variants.find((v) => v.format === 'webp') || variants[0];
+    return getMediaUrl(variant.url);
+  }
+  return getMediaUrl(product.image_placeholder || product.image);
+};
+
 api.interceptors.request.use(
   (config) => {
     const token = localStorage.getItem('accessToken');
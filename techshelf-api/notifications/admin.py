@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, SalesReport
+from .models import Notification, ArchivedNotification, OutboundEmail, SalesReport
 
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('user', 'message', 'is_read', 'created_at')
@@ -7,10 +7,23 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'message')
     date_hierarchy = 'created_at'
 
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'message', 'created_at', 'archived_at')
+    search_fields = ('user__username', 'message')
+    date_hierarchy = 'created_at'
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to_email', 'subject', 'user__username')
+    date_hierarchy = 'created_at'
+
 class SalesReportAdmin(admin.ModelAdmin):
     list_display = ('report_id', 'store', 'total_sales', 'start_date', 'end_date', 'report_date')
     search_fields = ('report_id', 'store__store_name')
     date_hierarchy = 'report_date'
 
 admin.site.register(Notification, NotificationAdmin)
+admin.site.register(ArchivedNotification, ArchivedNotificationAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
 admin.site.register(SalesReport, SalesReportAdmin)
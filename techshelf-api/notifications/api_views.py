@@ -16,15 +16,17 @@ class NotificationListView(generics.ListAPIView):
     """List all notifications for the authenticated user"""
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
     
     def get_queryset(self):
         queryset = Notification.objects.filter(user=self.request.user).order_by('-created_at')
         
         store_id = self.request.query_params.get('store_id')
-        if store_id and hasattr(self.request.user, 'store') and self.request.user.store.store_id == store_id:
+        store = self.request.seller.store
+        if store_id and store is not None and store.store_id == store_id:
             store_notifications = queryset.filter(
                 Q(message__icontains=store_id) | 
-                Q(message__icontains=self.request.user.store.store_name)
+                Q(message__icontains=store.store_name)
             )
             return store_notifications
         
@@ -64,12 +66,14 @@ class SalesReportListView(generics.ListAPIView):
     """List all sales reports for the authenticated seller's store"""
     serializer_class = SalesReportSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+    query_budget = 4
     
     def get_queryset(self):
-        if self.request.user.role != 'SELLER' or not hasattr(self.request.user, 'store'):
+        if not self.request.seller:
             return SalesReport.objects.none()
         
-        return SalesReport.objects.filter(store=self.request.user.store).order_by('-report_date')
+        return SalesReport.objects.filter(store_id=self.request.seller.store_pk).select_related('store').order_by('-report_date')
 
 class GenerateReportView(APIView):
     """Generate a new sales report"""
@@ -79,10 +83,11 @@ class GenerateReportView(APIView):
         try:
             logger.debug(f"Report generation request received: {request.data}")
             
-            if request.user.role != 'SELLER':
+            seller = request.seller
+            if not seller.is_seller:
                 return Response({'error': 'Only sellers can generate sales reports'}, status=status.HTTP_403_FORBIDDEN)
             
-            if not hasattr(request.user, 'store'):
+            if seller.store is None:
                 return Response({'error': 'You need to create a store first'}, status=status.HTTP_400_BAD_REQUEST)
             
             try:
@@ -103,8 +108,8 @@ class GenerateReportView(APIView):
             
             try:
                 report = SalesReport.objects.create(
-                    report_id=f"report_{request.user.store.store_id}_{int(datetime.now().timestamp())}",
-                    store=request.user.store,
+                    report_id=f"report_{seller.store_id}_{int(datetime.now().timestamp())}",
+                    store=seller.store,
                     total_sales=0.0,
                     start_date=start_date_obj,
                     end_date=end_date_obj
@@ -127,10 +132,11 @@ class SalesReportDetailView(generics.RetrieveAPIView):
     """Get details of a specific sales report"""
     serializer_class = SalesReportSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
     lookup_field = 'report_id'
     
     def get_queryset(self):
-        if self.request.user.role != 'SELLER' or not hasattr(self.request.user, 'store'):
+        if not self.request.seller:
             return SalesReport.objects.none()
         
-        return SalesReport.objects.filter(store=self.request.user.store)
+        return SalesReport.objects.filter(store_id=self.request.seller.store_pk)
@@ -0,0 +1,132 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SUBJECT = 'You have {count} new notifications from TechShelf'
+
+
+def backoff_delay(attempts):
+    """Exponential backoff for the given number of failed attempts"""
+    base = settings.EMAIL_OUTBOX_BACKOFF_SECONDS
+    return timedelta(seconds=min(base * (2 ** (attempts - 1)), settings.EMAIL_OUTBOX_MAX_BACKOFF_SECONDS))
+
+
+def build_message(emails):
+    """Build one message for a recipient, coalescing several emails into a digest"""
+    if len(emails) == 1:
+        subject, body = emails[0].subject, emails[0].body
+    else:
+        subject = DIGEST_SUBJECT.format(count=len(emails))
+        body = '\n\n'.join(f"- {email.body}" for email in emails)
+
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [emails[0].to_email])
+
+
+def group_by_recipient(emails):
+    """Group emails by recipient address, keeping the oldest first"""
+    groups = {}
+    for email in emails:
+        groups.setdefault(email.to_email, []).append(email)
+    return list(groups.values())
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to batch_size due emails for this worker.
+
+    The claim is a short transaction that marks the rows SENDING with a lease
+    of EMAIL_OUTBOX_LEASE_SECONDS in next_attempt_at, so no lock is held
+    while sending. Rows left SENDING by a worker that died are claimed again
+    once their lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=('PENDING', 'SENDING'), next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if emails:
+            OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                status='SENDING',
+                next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+            )
+    return emails
+
+
+def drain_outbox(batch_size=None, rate_limit=None, connection=None):
+    """
+    Send one batch of due emails over a single backend connection.
+
+    Each message is marked sent in its own commit as soon as it has gone
+    out, so a crash mid-batch only leaves the unsent rest of the batch to be
+    retried. Returns a dict with counts of sent, retried and failed emails.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    rate_limit = settings.EMAIL_OUTBOX_RATE_LIMIT if rate_limit is None else rate_limit
+    min_interval = 1.0 / rate_limit if rate_limit else 0
+    stats = {'messages': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    emails = claim_batch(batch_size)
+    if not emails:
+        return stats
+
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning(f"Could not open email connection: {e}")
+        for email in emails:
+            mark_failed_attempt(email, str(e), stats)
+        return stats
+
+    try:
+        last_sent = 0.0
+        for group in group_by_recipient(emails):
+            wait = min_interval - (time.monotonic() - last_sent)
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                connection.send_messages([build_message(group)])
+            except Exception as e:
+                logger.warning(f"Email delivery to {group[0].to_email} failed: {e}")
+                for email in group:
+                    mark_failed_attempt(email, str(e), stats)
+            else:
+                OutboundEmail.objects.filter(pk__in=[email.pk for email in group]).update(
+                    status='SENT',
+                    sent_at=timezone.now(),
+                    attempts=F('attempts') + 1
+                )
+                stats['messages'] += 1
+                stats['sent'] += len(group)
+            last_sent = time.monotonic()
+    finally:
+        connection.close()
+
+    return stats
+
+
+def mark_failed_attempt(email, error, stats):
+    """Record a failed attempt and schedule a retry, or give up after the last one"""
+    email.attempts += 1
+    email.last_error = error
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'FAILED'
+        stats['failed'] += 1
+    else:
+        email.status = 'PENDING'
+        email.next_attempt_at = timezone.now() + backoff_delay(email.attempts)
+        stats['retried'] += 1
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
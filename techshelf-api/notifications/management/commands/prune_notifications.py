@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notifications import retention
+
+
+class Command(BaseCommand):
+    help = 'Delete or archive old read notifications and enforce the per-user notification cap'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Remove read notifications older than this many days')
+        parser.add_argument('--max-per-user', type=int, default=settings.NOTIFICATION_MAX_PER_USER,
+                            help='Keep at most this many notifications per user (0 disables the cap)')
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_PRUNE_BATCH_SIZE,
+                            help='Rows removed per transaction')
+        parser.add_argument('--archive', action='store_true',
+                            help='Copy removed notifications to the archive table instead of discarding them')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Run VACUUM ANALYZE on the notifications table afterwards (PostgreSQL)')
+        parser.add_argument('--sample-users', type=int, default=20,
+                            help='Number of heaviest users used to measure list-query latency')
+
+    def handle(self, *args, **options):
+        users = retention.sample_users(options['sample_users'])
+        latency_before = retention.measure_list_latency(users)
+
+        pruned_old = retention.prune_read_notifications(
+            options['days'], batch_size=options['batch_size'], archive=options['archive']
+        )
+        pruned_cap = 0
+        if options['max_per_user']:
+            pruned_cap = retention.enforce_user_cap(
+                options['max_per_user'], batch_size=options['batch_size'], archive=options['archive']
+            )
+
+        if options['vacuum'] and retention.compact_table():
+            self.stdout.write('Compacted notifications table')
+
+        latency_after = retention.measure_list_latency(users)
+
+        action = 'Archived' if options['archive'] else 'Deleted'
+        self.stdout.write(f"{action} {pruned_old} read notifications older than {options['days']} days")
+        self.stdout.write(f"{action} {pruned_cap} notifications above the per-user cap")
+        if latency_before is not None:
+            self.stdout.write(
+                f"List query latency over {len(users)} users: "
+                f"{latency_before:.2f}ms before, {latency_after:.2f}ms after"
+            )
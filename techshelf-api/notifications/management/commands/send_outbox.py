@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notifications.mailer import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification emails in batches over a single connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+                            help='Maximum number of queued emails per batch')
+        parser.add_argument('--rate-limit', type=float, default=settings.EMAIL_OUTBOX_RATE_LIMIT,
+                            help='Maximum messages per second (0 disables the limit)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep draining the outbox instead of exiting after one pass')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when the outbox is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = drain_outbox(batch_size=options['batch_size'], rate_limit=options['rate_limit'])
+            if stats['messages'] or stats['retried'] or stats['failed']:
+                self.stdout.write(
+                    f"Sent {stats['messages']} messages covering {stats['sent']} emails, "
+                    f"{stats['retried']} scheduled for retry, {stats['failed']} failed"
+                )
+
+            if not options['loop']:
+                break
+
+            # Keep draining while there is a backlog, otherwise wait for new mail
+            if stats['sent'] + stats['retried'] + stats['failed'] < options['batch_size']:
+                time.sleep(options['interval'])
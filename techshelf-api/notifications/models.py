@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
 class Notification(models.Model):
@@ -9,6 +10,17 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            # Unread badge and unread-first listings
+            models.Index(fields=['user', '-created_at'], condition=models.Q(is_read=False),
+                         name='notif_user_unread_idx'),
+            # Read notifications past retention (prune_notifications)
+            models.Index(fields=['created_at'], condition=models.Q(is_read=True),
+                         name='notif_read_created_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.notification_id:
             # Generate a unique ID in production
@@ -26,14 +38,13 @@ class Notification(models.Model):
         return notification
     
     def send_email(self):
-        # In production, integrate with email service
-        from django.core.mail import send_mail
-        send_mail(
-            'Notification from TechShelf',
-            self.message,
-            'noreply@techshelf.com',
-            [self.user.email],
-            fail_silently=False,
+        """Queue this notification for delivery by the outbox worker"""
+        return OutboundEmail.objects.create(
+            user=self.user,
+            notification=self,
+            to_email=self.user.email,
+            subject='Notification from TechShelf',
+            body=self.message
         )
     
     def send_sms(self):
@@ -43,6 +54,52 @@ class Notification(models.Model):
     def __str__(self):
         return f"Notification to {self.user.username}: {self.message[:30]}..."
 
+class ArchivedNotification(models.Model):
+    notification_id = models.CharField(max_length=50, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_notifications')
+    message = models.TextField()
+    is_read = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Archived notification to {self.user.username}: {self.message[:30]}..."
+
+class OutboundEmail(models.Model):
+    STATUS = (
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    )
+    
+    email_id = models.CharField(max_length=50, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='outbound_emails')
+    notification = models.ForeignKey(Notification, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    # While SENDING, when the worker's claim lapses and the email is due again
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if not self.email_id:
+            self.email_id = f"email_{uuid.uuid4().hex[:8]}"
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"Email to {self.to_email}: {self.subject} ({self.status})"
+
 class SalesReport(models.Model):
     report_id = models.CharField(max_length=50, unique=True)
     store = models.ForeignKey('stores.Store', on_delete=models.CASCADE, related_name='sales_reports')
@@ -51,6 +108,11 @@ class SalesReport(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', '-report_date']),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.report_id:
             # Generate a unique ID in production
@@ -58,42 +120,44 @@ class SalesReport(models.Model):
         super().save(*args, **kwargs)
     
     @staticmethod
-    def generate_report(store, start_date, end_date):
-        from django.db.models import Sum, F, ExpressionWrapper, DecimalField
-        from django.db.models.functions import Coalesce
+    def paid_order_items(store, start_date, end_date):
+        """The store's items in paid orders placed within the date range"""
         from orders.models import OrderItem
-        
-        # Find all orders for products from this store in the date range
-        order_items = OrderItem.objects.filter(
-            product_id__in=store.products.values_list('product_id', flat=True),
+        return OrderItem.objects.filter(
+            store_id=store.pk,
             order__created_at__date__range=(start_date, end_date),
             order__payment_status='PAID'
         )
+    
+    @staticmethod
+    def paid_archived_order_items(store, start_date, end_date):
+        """The same items among archived orders"""
+        from orders.models import ArchivedOrderItem
+        return ArchivedOrderItem.objects.filter(
+            store_id=store.pk,
+            archived_order__created_at__date__range=(start_date, end_date),
+            archived_order__payment_status='PAID'
+        )
+    
+    @staticmethod
+    def generate_report(store, start_date, end_date):
+        from django.db.models import Sum, F, ExpressionWrapper, DecimalField
+        from django.db.models.functions import Coalesce
         
-        # Calculate total sales
-        total_sales = order_items.annotate(
-            item_total=ExpressionWrapper(
-                F('price') * F('quantity'),
-                output_field=DecimalField()
-            )
-        ).aggregate(
-            total=Coalesce(Sum('item_total'), 0.0)
-        )['total']
+        order_items = SalesReport.paid_order_items(store, start_date, end_date)
         
-        # Get top products
-        from products.models import Product
-        top_products = Product.objects.filter(
-            product_id__in=order_items.values_list('product_id', flat=True),
-            store=store
-        ).annotate(
-            sold_quantity=Coalesce(Sum('orderitem__quantity'), 0),
-            sales_amount=Coalesce(
-                Sum(ExpressionWrapper(
-                    F('orderitem__price') * F('orderitem__quantity'),
+        # Calculate total sales, archived orders included
+        total_sales = sum(
+            items.annotate(
+                item_total=ExpressionWrapper(
+                    F('price') * F('quantity'),
                     output_field=DecimalField()
-                )), 0.0
-            )
-        ).order_by('-sales_amount')
+                )
+            ).aggregate(
+                total=Coalesce(Sum('item_total'), 0, output_field=DecimalField())
+            )['total']
+            for items in (order_items, SalesReport.paid_archived_order_items(store, start_date, end_date))
+        )
         
         # Create report
         report = SalesReport.objects.create(
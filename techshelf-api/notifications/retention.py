@@ -0,0 +1,99 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_FIELDS = ('id', 'notification_id', 'user_id', 'message', 'is_read', 'created_at')
+
+
+def remove_batch(pks, archive=False):
+    """Delete the given notifications, copying them to the archive table first if requested"""
+    with transaction.atomic():
+        if archive:
+            rows = Notification.objects.filter(pk__in=pks).values(*ARCHIVED_FIELDS)
+            ArchivedNotification.objects.bulk_create(
+                [ArchivedNotification(**{k: v for k, v in row.items() if k != 'id'}) for row in rows],
+                ignore_conflicts=True
+            )
+        deleted, _ = Notification.objects.filter(pk__in=pks).delete()
+    return deleted
+
+
+def prune_read_notifications(days, batch_size=1000, archive=False):
+    """Remove read notifications older than the given number of days in bounded batches"""
+    cutoff = timezone.now() - timedelta(days=days)
+    queryset = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('created_at')
+
+    total = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        total += remove_batch(pks, archive=archive)
+
+    logger.info(f"Pruned {total} read notifications older than {days} days")
+    return total
+
+
+def enforce_user_cap(max_per_user, batch_size=1000, archive=False):
+    """Keep only the newest max_per_user notifications for every user"""
+    over_cap = (
+        Notification.objects.values('user')
+        .annotate(total=Count('id'))
+        .filter(total__gt=max_per_user)
+        .values_list('user', flat=True)
+    )
+
+    total = 0
+    for user_id in list(over_cap):
+        while True:
+            pks = list(
+                Notification.objects.filter(user_id=user_id)
+                .order_by('-created_at', '-pk')
+                .values_list('pk', flat=True)[max_per_user:max_per_user + batch_size]
+            )
+            if not pks:
+                break
+            total += remove_batch(pks, archive=archive)
+
+    logger.info(f"Pruned {total} notifications above the per-user cap of {max_per_user}")
+    return total
+
+
+def sample_users(limit):
+    """Users with the most stored notifications, used to measure list latency"""
+    return list(
+        Notification.objects.values('user')
+        .annotate(total=Count('id'))
+        .order_by('-total')
+        .values_list('user', flat=True)[:limit]
+    )
+
+
+def measure_list_latency(user_ids, page_size=10):
+    """Average time in milliseconds to load a notification list page for the given users"""
+    if not user_ids:
+        return None
+
+    elapsed = 0.0
+    for user_id in user_ids:
+        start = time.perf_counter()
+        list(Notification.objects.filter(user_id=user_id).order_by('-created_at')[:page_size])
+        elapsed += time.perf_counter() - start
+    return elapsed * 1000 / len(user_ids)
+
+
+def compact_table():
+    """Reclaim space after large deletes (PostgreSQL only)"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f'VACUUM (ANALYZE) {Notification._meta.db_table}')
+    return True
@@ -0,0 +1,340 @@
+import socketserver
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from stores.models import Store
+from techshelf.querycount import assert_query_budget
+from users.models import User
+from users.tokens import RevocableAccessToken
+from .api_views import NotificationListView, SalesReportListView
+from . import retention
+from .mailer import claim_batch, drain_outbox
+from .models import ArchivedNotification, Notification, OutboundEmail, SalesReport
+
+
+class SMTPSink(socketserver.StreamRequestHandler):
+    """Just enough of an SMTP server to accept mail and record each message"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply('220 localhost ready')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while (data := self.rfile.readline().decode()) not in ('.\r\n', ''):
+                    lines.append(data)
+                self.server.messages.append(''.join(lines))
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPSink)
+        self.messages = []
+        # One connection per batch is the point of the outbox
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class FailingConnection:
+    """Email backend stand-in that fails for the given recipients"""
+
+    def __init__(self, failing=(), crash_after=None):
+        self.failing = set(failing)
+        self.crash_after = crash_after
+        self.sent = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        if self.crash_after is not None and len(self.sent) >= self.crash_after:
+            raise SystemExit('worker killed')
+        for message in messages:
+            if message.to[0] in self.failing:
+                raise ConnectionError('mailbox unavailable')
+            self.sent.append(message)
+        return len(messages)
+
+
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+
+    def queue(self, user, message):
+        return Notification.objects.create(user=user, message=message).send_email()
+
+
+class DrainOutboxTests(OutboxTestCase):
+    def test_sends_one_digest_per_recipient(self):
+        self.queue(self.alice, 'first')
+        self.queue(self.alice, 'second')
+        self.queue(self.bob, 'hello')
+
+        stats = drain_outbox(rate_limit=0)
+
+        self.assertEqual(stats, {'messages': 2, 'sent': 3, 'retried': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(message for message in mail.outbox if message.to == ['alice@example.com'])
+        self.assertIn('2 new notifications', digest.subject)
+        self.assertIn('- first', digest.body)
+        self.assertIn('- second', digest.body)
+        self.assertFalse(OutboundEmail.objects.exclude(status='SENT').exists())
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.queue(self.alice, 'hi')
+        self.queue(self.bob, 'hi')
+
+        stats = drain_outbox(rate_limit=0, connection=FailingConnection(failing={'bob@example.com'}))
+
+        self.assertEqual((stats['sent'], stats['retried']), (1, 1))
+        email = OutboundEmail.objects.get(to_email='bob@example.com')
+        self.assertEqual((email.status, email.attempts), ('PENDING', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn('mailbox unavailable', email.last_error)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_gives_up_after_the_last_attempt(self):
+        self.queue(self.bob, 'hi')
+        stats = drain_outbox(rate_limit=0, connection=FailingConnection(failing={'bob@example.com'}))
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(OutboundEmail.objects.get().status, 'FAILED')
+
+    def test_crash_mid_batch_keeps_sent_marks(self):
+        self.queue(self.alice, 'hi')
+        self.queue(self.bob, 'hi')
+        connection = FailingConnection(crash_after=1)
+
+        with self.assertRaises(SystemExit):
+            drain_outbox(rate_limit=0, connection=connection)
+
+        sent_to = connection.sent[0].to[0]
+        self.assertEqual(OutboundEmail.objects.get(to_email=sent_to).status, 'SENT')
+        unsent = OutboundEmail.objects.exclude(to_email=sent_to).get()
+        self.assertEqual(unsent.status, 'SENDING')
+
+        # Not claimed again while the dead worker's lease lasts, then only the unsent email is
+        self.assertEqual(claim_batch(10), [])
+        OutboundEmail.objects.filter(pk=unsent.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([email.pk for email in claim_batch(10)], [unsent.pk])
+
+    def test_claimed_rows_are_skipped_by_other_workers(self):
+        self.queue(self.alice, 'hi')
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(drain_outbox(rate_limit=0)['messages'], 0)
+
+
+class SMTPDeliveryTests(OutboxTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = SMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_batch_goes_over_one_smtp_connection(self):
+        for user in (self.alice, self.bob):
+            self.queue(user, f"hello {user.username}")
+        connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=self.server.server_address[1], use_tls=False,
+        )
+
+        stats = drain_outbox(rate_limit=0, connection=connection)
+
+        self.assertEqual(stats['messages'], 2)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertTrue(any('hello bob' in message for message in self.server.messages))
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+
+    def notify(self, user, days_ago, is_read=True, count=1):
+        created = []
+        for _ in range(count):
+            notification = Notification.objects.create(user=user, message=f'{days_ago} days old', is_read=is_read)
+            # created_at is auto_now_add, so backdate it afterwards
+            Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+            created.append(notification.pk)
+        return created
+
+    def remaining(self, user=None):
+        queryset = Notification.objects.filter(user=user) if user else Notification.objects.all()
+        return set(queryset.values_list('pk', flat=True))
+
+    def batches(self):
+        return mock.patch.object(retention, 'remove_batch', wraps=retention.remove_batch)
+
+    def test_only_read_notifications_past_retention_are_pruned(self):
+        old_read = self.notify(self.alice, 100)
+        old_unread = self.notify(self.alice, 100, is_read=False)
+        recent_read = self.notify(self.bob, 10)
+
+        self.assertEqual(retention.prune_read_notifications(90), 1)
+
+        self.assertEqual(self.remaining(), set(old_unread + recent_read))
+        self.assertNotIn(old_read[0], self.remaining())
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_archive_copies_rows_before_deleting_them(self):
+        [pk] = self.notify(self.alice, 100)
+        notification = Notification.objects.get(pk=pk)
+
+        self.assertEqual(retention.prune_read_notifications(90, archive=True), 1)
+
+        self.assertFalse(Notification.objects.filter(pk=pk).exists())
+        archived = ArchivedNotification.objects.get()
+        self.assertEqual(
+            (archived.notification_id, archived.user_id, archived.message, archived.is_read, archived.created_at),
+            (notification.notification_id, self.alice.id, notification.message, True, notification.created_at),
+        )
+
+    def test_failed_archive_deletes_nothing(self):
+        self.notify(self.alice, 100, count=3)
+
+        with mock.patch.object(ArchivedNotification.objects, 'bulk_create', side_effect=RuntimeError('archive down')):
+            with self.assertRaises(RuntimeError):
+                retention.prune_read_notifications(90, archive=True)
+
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_rows_archived_by_an_interrupted_run_are_not_duplicated(self):
+        pks = self.notify(self.alice, 100, count=2)
+        retention.remove_batch(pks[:1], archive=True)
+        # The archive copy exists but, as if the delete was lost, so does the row
+        notification = Notification.objects.get(pk=pks[1])
+        ArchivedNotification.objects.create(
+            notification_id=notification.notification_id, user=self.alice, message=notification.message,
+            created_at=notification.created_at,
+        )
+
+        self.assertEqual(retention.prune_read_notifications(90, archive=True), 1)
+
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(ArchivedNotification.objects.count(), 2)
+
+    def test_pruning_runs_in_bounded_batches(self):
+        for count, expected in ((5, [2, 2, 1]), (4, [2, 2])):
+            with self.subTest(count=count):
+                Notification.objects.all().delete()
+                self.notify(self.alice, 100, count=count)
+
+                with self.batches() as remove_batch:
+                    self.assertEqual(retention.prune_read_notifications(90, batch_size=2), count)
+
+                self.assertEqual([len(call.args[0]) for call in remove_batch.call_args_list], expected)
+                self.assertFalse(Notification.objects.exists())
+
+    def test_cap_keeps_each_users_newest_notifications(self):
+        oldest = self.notify(self.alice, 30, is_read=False, count=2)
+        newest = self.notify(self.alice, 1, is_read=False, count=3)
+        bobs = self.notify(self.bob, 30, count=3)
+
+        self.assertEqual(retention.enforce_user_cap(3), 2)
+
+        self.assertEqual(self.remaining(self.alice), set(newest))
+        self.assertTrue(set(oldest).isdisjoint(self.remaining()))
+        # At the cap, not over it
+        self.assertEqual(self.remaining(self.bob), set(bobs))
+
+    def test_cap_breaks_ties_on_created_at_by_id(self):
+        pks = self.notify(self.alice, 5, count=4)
+        Notification.objects.filter(pk__in=pks).update(created_at=timezone.now())
+
+        retention.enforce_user_cap(2)
+
+        self.assertEqual(self.remaining(self.alice), set(sorted(pks)[-2:]))
+
+    def test_cap_runs_in_bounded_batches(self):
+        self.notify(self.alice, 5, count=7)
+
+        with self.batches() as remove_batch:
+            self.assertEqual(retention.enforce_user_cap(2, batch_size=2, archive=True), 5)
+
+        self.assertEqual([len(call.args[0]) for call in remove_batch.call_args_list], [2, 2, 1])
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(ArchivedNotification.objects.count(), 5)
+
+    def test_command_prunes_by_age_then_by_cap(self):
+        self.notify(self.alice, 100, count=2)
+        self.notify(self.alice, 1, is_read=False, count=3)
+        output = StringIO()
+
+        call_command('prune_notifications', days=90, max_per_user=2, batch_size=1, archive=True, stdout=output)
+
+        self.assertIn('Archived 2 read notifications older than 90 days', output.getvalue())
+        self.assertIn('Archived 1 notifications above the per-user cap', output.getvalue())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(ArchivedNotification.objects.count(), 3)
+
+
+@override_settings(REVOCATION_SYNC_INTERVAL=3600)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'pw', role='SELLER')
+        self.store = Store.objects.create(store_name='Acme', user=self.seller)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(self.seller)}")
+        # Caches the principal, as every request after the first finds it
+        self.client.get('/api/users/profile/')
+
+    def fetch(self, url, query=None):
+        return lambda: self.assertEqual(self.client.get(url, query).status_code, 200)
+
+    def grow_notifications(self, size):
+        for n in range(Notification.objects.count(), size):
+            Notification.objects.create(user=self.seller, message=f'Order {n} for {self.store.store_id}')
+
+    def test_notification_list(self):
+        assert_query_budget(NotificationListView, self.fetch('/api/notifications/'), self.grow_notifications)
+
+    def test_store_notification_list(self):
+        fetch = self.fetch('/api/notifications/', {'store_id': self.store.store_id})
+        assert_query_budget(NotificationListView, fetch, self.grow_notifications)
+
+    def test_sales_report_list(self):
+        def grow(size):
+            today = timezone.now().date()
+            for n in range(SalesReport.objects.count(), size):
+                SalesReport.objects.create(store=self.store, start_date=today - timedelta(days=n), end_date=today)
+
+        assert_query_budget(SalesReportListView, self.fetch('/api/notifications/reports/'), grow)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, ShippingInfo, Order, OrderItem, Payment, Promotion
+from .models import ArchivedOrder, Cart, CartItem, ShippingInfo, Order, OrderItem, Payment, Promotion
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
@@ -26,6 +26,13 @@ class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
     date_hierarchy = 'created_at'
 
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('order_id', 'user', 'total_amount', 'order_status', 'created_at', 'archived_at')
+    list_filter = ('order_status',)
+    search_fields = ('order_id', 'user__username')
+    readonly_fields = ('order_id', 'user', 'order_status', 'total_amount', 'created_at', 'archived_at', 'data')
+    date_hierarchy = 'created_at'
+
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('payment_id', 'order', 'amount', 'payment_status', 'created_at')
     list_filter = ('payment_status',)
@@ -39,5 +46,6 @@ class PromotionAdmin(admin.ModelAdmin):
 admin.site.register(Cart, CartAdmin)
 admin.site.register(ShippingInfo, ShippingInfoAdmin)
 admin.site.register(Order, OrderAdmin)
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
 admin.site.register(Payment, PaymentAdmin)
 admin.site.register(Promotion, PromotionAdmin)
@@ -1,7 +1,7 @@
 from django.urls import path
 from .api_views import (
     CartView, CartAddItemView, CartRemoveItemView, CartUpdateItemView,
-    CheckoutView, OrderListView, OrderDetailView, OrderCancelView,
+    CheckoutView, OrderListView, ArchivedOrderListView, OrderDetailView, OrderCancelView,
     ApplyPromotionView, SellerOrderListView, SellerOrderDetailView,
     SellerOrderUpdateStatusView
 )
@@ -13,6 +13,7 @@ urlpatterns = [
     path('cart/update/<str:product_id>/', CartUpdateItemView.as_view(), name='api_cart_update'),
     path('checkout/', CheckoutView.as_view(), name='api_checkout'),
     path('orders/', OrderListView.as_view(), name='api_order_list'),
+    path('orders/archived/', ArchivedOrderListView.as_view(), name='api_archived_order_list'),
     path('seller-orders/', SellerOrderListView.as_view(), name='api_seller_order_list'),
     path('orders/<str:order_id>/', OrderDetailView.as_view(), name='api_order_detail'),
     path('orders/<str:order_id>/cancel/', OrderCancelView.as_view(), name='api_order_cancel'),
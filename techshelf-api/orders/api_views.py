@@ -1,17 +1,23 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from .models import Cart, CartItem, ShippingInfo, Order, OrderItem, Promotion
+from .models import ArchivedOrder, Cart, CartItem, ShippingInfo, Order, OrderItem, Promotion
 from products.models import Product
 from notifications.models import Notification
-from .serializers import CartSerializer, OrderSerializer, ShippingInfoSerializer, PromotionSerializer, OrderItemSerializer, CartItemSerializer
+from .serializers import CartSerializer, OrderSerializer, ShippingInfoSerializer, PromotionSerializer, OrderItemSerializer, CartItemSerializer, OrderValuesSerializer
+from .services import OrderService
+from techshelf.cache import ConditionalGetMixin
+from techshelf.serialization import ValuesListMixin
+from techshelf.throttling import AdmissionControlMixin
 from decimal import Decimal
 
 class CartView(generics.RetrieveAPIView):
     """View the current user's cart"""
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 6
     
     def get_object(self):
         # Check if there are multiple carts for this user
@@ -126,9 +132,11 @@ class CartUpdateItemView(APIView):
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class CheckoutView(APIView):
+class CheckoutView(AdmissionControlMixin, APIView):
     """Process checkout and create an order"""
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'checkout'
+    admission_scope = 'checkout'
     
     def post(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
@@ -215,13 +223,35 @@ class CheckoutView(APIView):
             traceback.print_exc()  
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-class OrderListView(generics.ListAPIView):
+class OrderListView(ValuesListMixin, generics.ListAPIView):
     """List all orders for the authenticated user"""
     serializer_class = OrderSerializer
+    values_serializer_class = OrderValuesSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+    # 5 data queries across live and archived orders, 2 for a revocation sync
+    query_budget = 7
     
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user).order_by('-created_at')
+    
+    def list(self, request, *args, **kwargs):
+        # Archived orders are listed along with the live ones, newest first
+        orders = self.get_queryset()
+        archived = ArchivedOrder.objects.filter(user=request.user)
+        page = self.paginate_queryset(OrderService.with_archived(orders, archived))
+        
+        values_serializer = self.values_serializer_class(context=self.get_serializer_context())
+        rows = list(values_serializer.values(orders.filter(pk__in=[pk for pk, created_at, is_archived in page if not is_archived])))
+        live = {
+            values_serializer.value(row, 'id'): data
+            for row, data in zip(rows, values_serializer.to_representation(rows))
+        }
+        archived = archived.in_bulk([pk for pk, created_at, is_archived in page if is_archived])
+        return self.get_paginated_response([
+            archived[pk].data if is_archived else live[pk]
+            for pk, created_at, is_archived in page
+        ])
 
 class OrderDetailView(generics.RetrieveAPIView):
     """Get details of a specific order"""
@@ -231,6 +261,26 @@ class OrderDetailView(generics.RetrieveAPIView):
     
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Old delivered and cancelled orders live in the archive
+            archived = get_object_or_404(ArchivedOrder, order_id=kwargs['order_id'], user=request.user)
+            return Response(archived.data)
+
+class ArchivedOrderListView(generics.ListAPIView):
+    """List the authenticated user's archived orders"""
+    permission_classes = [permissions.IsAuthenticated]
+    read_replica = True
+    
+    def get_queryset(self):
+        return ArchivedOrder.objects.filter(user=self.request.user).order_by('-created_at')
+    
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset().values_list('data', flat=True))
+        return self.get_paginated_response(page)
 
 class OrderCancelView(APIView):
     """Cancel an order and initiate a refund"""
@@ -261,7 +311,7 @@ class OrderCancelView(APIView):
                     
                     # Restore stock
                     product.stock += item.quantity
-                    product.save()
+                    product.save(update_fields=['stock', 'updated_at'])
                 except Product.DoesNotExist:
                     pass
                     
@@ -289,25 +339,23 @@ class ApplyPromotionView(APIView):
         serializer = PromotionSerializer(promotion)
         return Response(serializer.data)
 
-class SellerOrderListView(generics.ListAPIView):
+class SellerOrderListView(ConditionalGetMixin, generics.ListAPIView):
     """List all orders that contain products from the seller's store"""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # 5 data queries, the ETag's tag version, 2 for a revocation sync
+    query_budget = 8
+    
+    def get_etag_tags(self, request, *args, **kwargs):
+        return [f"seller-orders:{request.seller.store_id}"] if request.seller else None
     
     def get_queryset(self):
         try:
-            if self.request.user.role != 'SELLER' or not hasattr(self.request.user, 'store'):
+            seller = self.request.seller
+            if not seller:
                 return Order.objects.none()
-                
-            store = self.request.user.store
-            
-            store_product_ids = list(store.products.values_list('product_id', flat=True))
             
-            store_order_items = OrderItem.objects.filter(product_id__in=store_product_ids)
-            
-            order_ids = store_order_items.values_list('order', flat=True).distinct()
-            
-            orders = Order.objects.filter(id__in=order_ids).order_by('-created_at')
+            orders = OrderService.seller_orders(seller.store_pk)
             
             status_filter = self.request.query_params.get('status')
             if status_filter and status_filter != 'ALL':
@@ -320,6 +368,24 @@ class SellerOrderListView(generics.ListAPIView):
             print(f"Error in SellerOrderListView.get_queryset: {str(e)}")
             print(traceback.format_exc())
             return Order.objects.none() 
+    
+    def list(self, request, *args, **kwargs):
+        if not request.seller:
+            return super().list(request, *args, **kwargs)
+        # Archived orders are listed along with the live ones, newest first
+        orders = self.get_queryset()
+        archived = OrderService.seller_archived_orders(request.seller.store_pk)
+        status_filter = request.query_params.get('status')
+        if status_filter and status_filter != 'ALL':
+            archived = archived.filter(order_status=status_filter)
+        
+        page = self.paginate_queryset(OrderService.with_archived(orders, archived))
+        live = orders.in_bulk([pk for pk, created_at, is_archived in page if not is_archived])
+        archived = archived.in_bulk([pk for pk, created_at, is_archived in page if is_archived])
+        return self.get_paginated_response([
+            archived[pk].data if is_archived else self.get_serializer(live[pk]).data
+            for pk, created_at, is_archived in page
+        ])
 
 class SellerOrderDetailView(generics.RetrieveAPIView):
     """Get details of a specific order for a seller - only if it contains their products"""
@@ -330,13 +396,9 @@ class SellerOrderDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         try:
             # Check if user is a seller and has a store
-            if self.request.user.role != 'SELLER' or not hasattr(self.request.user, 'store'):
+            seller = self.request.seller
+            if not seller:
                 return Order.objects.none()
-                
-            store = self.request.user.store
-            
-            # Get all product IDs from this store
-            store_product_ids = list(store.products.values_list('product_id', flat=True))
             
             # Get orders that contain the seller's products
             from django.db.models import Exists, OuterRef
@@ -344,19 +406,31 @@ class SellerOrderDetailView(generics.RetrieveAPIView):
             # Find order items that contain this seller's products
             order_item_subquery = OrderItem.objects.filter(
                 order=OuterRef('pk'),
-                product_id__in=store_product_ids
+                store_id=seller.store_pk
             )
             
             # Return orders that contain these items
             return Order.objects.filter(
                 Exists(order_item_subquery)
-            )
+            ).select_related('user', 'shipping_info')
                 
         except Exception as e:
             import traceback
             print(f"Error in SellerOrderDetailView.get_queryset: {str(e)}")
             print(traceback.format_exc())
             return Order.objects.none()
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not request.seller:
+                raise
+            # Old delivered and cancelled orders live in the archive
+            archived = get_object_or_404(
+                OrderService.seller_archived_orders(request.seller.store_pk), order_id=kwargs['order_id']
+            )
+            return Response(archived.data)
 
 class SellerOrderUpdateStatusView(APIView):
     """Update order status for seller - only if it contains their products"""
@@ -365,13 +439,9 @@ class SellerOrderUpdateStatusView(APIView):
     def put(self, request, order_id):
         try:
             # Check if user is a seller and has a store
-            if request.user.role != 'SELLER' or not hasattr(request.user, 'store'):
+            seller = request.seller
+            if not seller:
                 return Response({'error': 'Only sellers can update order status'}, status=status.HTTP_403_FORBIDDEN)
-                
-            store = request.user.store
-            
-            # Get all product IDs from this store
-            store_product_ids = list(store.products.values_list('product_id', flat=True))
             
             # Find the order
             order = get_object_or_404(Order, order_id=order_id)
@@ -379,7 +449,7 @@ class SellerOrderUpdateStatusView(APIView):
             # Check if order contains products from this seller
             order_contains_seller_products = OrderItem.objects.filter(
                 order=order, 
-                product_id__in=store_product_ids
+                store_id=seller.store_pk
             ).exists()
             
             if not order_contains_seller_products:
@@ -0,0 +1,92 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, ShippingInfo
+from .serializers import OrderSerializer, PaymentSerializer
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ('DELIVERED', 'CANCELLED')
+
+
+def archivable_orders(older_than_days):
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Order.objects.filter(order_status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+
+
+def snapshot(order):
+    """The archived representation of an order: what order detail returned for it, plus its payment"""
+    data = OrderSerializer(order).data
+    payment = getattr(order, 'payment', None)
+    if payment is not None:
+        data['payment'] = {key: value for key, value in PaymentSerializer(payment).data.items() if key != 'order'}
+    return data
+
+
+def archive_batch(order_pks):
+    """
+    Move these orders into ArchivedOrder in one transaction.
+
+    Orders whose status changed since they were selected are skipped. Their
+    items are copied to ArchivedOrderItem; the order items and payment go
+    with the order (on_delete CASCADE), as does its shipping info, which
+    every order gets its own of at checkout.
+    """
+    with transaction.atomic():
+        orders = list(
+            Order.objects.filter(pk__in=order_pks, order_status__in=ARCHIVABLE_STATUSES)
+            .select_for_update(of=('self',))
+            .select_related('user', 'shipping_info', 'payment')
+            .prefetch_related('items')
+        )
+        if not orders:
+            return 0
+
+        archived = ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                order_id=order.order_id,
+                user_id=order.user_id,
+                order_status=order.order_status,
+                payment_status=order.payment_status,
+                total_amount=order.total_amount,
+                created_at=order.created_at,
+                data=snapshot(order),
+            )
+            for order in orders
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(
+                archived_order=archived_order,
+                product_id=item.product_id,
+                store_id=item.store_id,
+                quantity=item.quantity,
+                price=item.price,
+            )
+            for order, archived_order in zip(orders, archived)
+            for item in order.items.all()
+        ])
+        shipping_pks = [order.shipping_info_id for order in orders if order.shipping_info_id is not None]
+        Order.objects.filter(pk__in=[order.pk for order in orders]).delete()
+        ShippingInfo.objects.filter(pk__in=shipping_pks, order__isnull=True).delete()
+    return len(orders)
+
+
+def archive_orders(older_than_days, batch_size, dry_run=False):
+    """Archive delivered and cancelled orders placed more than older_than_days ago; returns how many"""
+    queryset = archivable_orders(older_than_days).order_by('pk')
+    if dry_run:
+        return queryset.count()
+
+    archived = 0
+    last_pk = 0
+    while True:
+        order_pks = list(queryset.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+        if not order_pks:
+            break
+        archived += archive_batch(order_pks)
+        last_pk = order_pks[-1]
+        logger.info(f"Archived {archived} orders")
+    return archived
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS into the order archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help='Archive orders placed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_ARCHIVE_BATCH_SIZE,
+                            help='Orders moved per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the orders that would be archived without moving them')
+
+    def handle(self, *args, **options):
+        count = archive_orders(options['days'], options['batch_size'], dry_run=options['dry_run'])
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(f"{verb} {count} orders older than {options['days']} days")
@@ -0,0 +1,170 @@
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from notifications.models import SalesReport
+from orders.models import Order, OrderItem
+from orders.services import OrderService
+from stores.models import Store
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert the order item table, online, into a PostgreSQL table hash-partitioned by store, '
+        'or check that the seller queries only scan one partition'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=16,
+                            help='Number of hash partitions to create')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows copied per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the SQL instead of running it')
+        parser.add_argument('--explain', type=int, metavar='STORE_PK',
+                            help="Explain the seller order and sales report queries for this store")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Declarative partitioning needs PostgreSQL')
+        if connection.pg_version < 150000:
+            raise CommandError('Converting the order item table needs PostgreSQL 15 or later (UNIQUE NULLS NOT DISTINCT)')
+
+        self.table = OrderItem._meta.db_table
+        self.staging = f"{self.table}_partitioned"
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+
+        if options['explain'] is not None:
+            self.explain(options['explain'])
+        elif self.is_partitioned():
+            self.stdout.write(f"{self.table} is already partitioned")
+        else:
+            self.convert(options['partitions'], options['batch_size'])
+
+    def is_partitioned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [self.table])
+            return cursor.fetchone() is not None
+
+    def run(self, sql, params=None):
+        if self.dry_run:
+            self.stdout.write(f"{sql};")
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone() if cursor.description else None
+
+    def convert(self, partitions, batch_size):
+        """
+        Build the partitioned copy next to the live table and swap them.
+
+        A trigger mirrors writes to the live table into the copy while the
+        existing rows are copied in short batches, so the table is only
+        locked for the final rename.
+        """
+        table, staging = self.table, self.staging
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in OrderItem._meta.concrete_fields)
+        new_columns = ', '.join(f"NEW.{connection.ops.quote_name(field.column)}" for field in OrderItem._meta.concrete_fields)
+
+        # A unique constraint on a partitioned table must include the partition key;
+        # items without a store must still clash on id, hence NULLS NOT DISTINCT
+        self.run(f"CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING IDENTITY) PARTITION BY HASH (store_id)")
+        self.run(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_id_store_uniq UNIQUE NULLS NOT DISTINCT (id, store_id)")
+        for remainder in range(partitions):
+            self.run(
+                f"CREATE TABLE {table}_p{remainder} PARTITION OF {staging} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+        self.run(f"CREATE INDEX {staging}_id_idx ON {staging} (id)")
+        self.run(f"CREATE INDEX {staging}_order_id_idx ON {staging} (order_id)")
+        self.run(f"CREATE INDEX {staging}_store_order_idx ON {staging} (store_id, order_id)")
+        self.run(
+            f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_order_fk FOREIGN KEY (order_id) "
+            f"REFERENCES {Order._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        self.run(
+            f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_store_fk FOREIGN KEY (store_id) "
+            f"REFERENCES {Store._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+
+        # Rows are matched on id alone, as an update can move an item to another store
+        self.run(f"""
+            CREATE OR REPLACE FUNCTION {staging}_mirror() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {staging} WHERE id = OLD.id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {staging} ({columns}) VALUES ({new_columns});
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql""")
+        self.run(
+            f"CREATE TRIGGER {staging}_mirror AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {staging}_mirror()"
+        )
+
+        # FOR SHARE makes a live row's update or delete wait for the batch that
+        # copies it, so the trigger then replaces or removes the copy. A batch
+        # that waited on such an update copies the updated row, which the trigger
+        # may already have inserted after the batch's NOT EXISTS check was made:
+        # that insert is skipped rather than failing the whole batch
+        copy_sql = (
+            f"INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table} AS live "
+            f"WHERE live.id > %s AND live.id <= %s "
+            f"AND NOT EXISTS (SELECT 1 FROM {staging} AS copied WHERE copied.id = live.id) "
+            f"FOR SHARE OF live "
+            f"ON CONFLICT DO NOTHING"
+        )
+        if self.dry_run:
+            self.stdout.write(f"-- copied in batches of {batch_size} ids:")
+            self.run(copy_sql)
+        else:
+            max_id = self.run(f"SELECT COALESCE(MAX(id), 0) FROM {table}")[0]
+            for start in range(0, max_id, batch_size):
+                with transaction.atomic():
+                    self.run(copy_sql, [start, start + batch_size])
+                self.stdout.write(f"Copied ids up to {min(start + batch_size, max_id)} of {max_id}")
+
+        with transaction.atomic():
+            self.run(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+            self.run(f"DROP TRIGGER {staging}_mirror ON {table}")
+            self.run(f"DROP FUNCTION {staging}_mirror()")
+            self.run(
+                f"SELECT setval(pg_get_serial_sequence('{staging}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table}), false)"
+            )
+            self.run(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+            self.run(f"ALTER TABLE {staging} RENAME TO {table}")
+
+        if not self.dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"{table} is now partitioned into {partitions} partitions by store; "
+                f"drop {table}_unpartitioned once the new table is verified"
+            ))
+
+    def explain(self, store_pk):
+        """Report which partitions the seller order list and sales report queries scan"""
+        store = Store.objects.filter(pk=store_pk).first()
+        if store is None:
+            raise CommandError(f"Store {store_pk} does not exist")
+
+        today = date.today()
+        queries = {
+            'SellerOrderListView': OrderService.seller_orders(store.pk),
+            'SalesReport.generate_report': SalesReport.paid_order_items(store, today - timedelta(days=30), today),
+        }
+        partition = re.compile(rf"\b{re.escape(self.table)}_p\d+\b")
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            scanned = sorted(set(partition.findall(plan)))
+            if len(scanned) == 1:
+                self.stdout.write(self.style.SUCCESS(f"{name}: pruned to {scanned[0]}"))
+            else:
+                self.stdout.write(self.style.WARNING(f"{name}: scans {len(scanned)} partitions"))
+            if self.verbosity > 1 or len(scanned) != 1:
+                self.stdout.write(plan)
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_order_item_stores(apps, schema_editor):
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+
+    store = Product.objects.filter(product_id=OuterRef('product_id')).values('store_id')[:1]
+    OrderItem.objects.filter(store__isnull=True).update(store_id=Subquery(store))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('products', '0003_image_variants'),
+        ('stores', '0007_store_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='store',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='stores.store'),
+        ),
+        migrations.RunPython(backfill_order_item_stores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-19 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_archived_order_items(apps, schema_editor):
+    # From the snapshots of orders archived before items were kept as rows;
+    # the store comes from the product, as for order items in 0002
+    ArchivedOrder = apps.get_model('orders', 'ArchivedOrder')
+    ArchivedOrderItem = apps.get_model('orders', 'ArchivedOrderItem')
+    Product = apps.get_model('products', 'Product')
+
+    for archived in ArchivedOrder.objects.filter(items__isnull=True).iterator(chunk_size=500):
+        archived.payment_status = archived.data.get('payment_status') or 'PENDING'
+        archived.save(update_fields=['payment_status'])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(archived_order=archived, product_id=item['product_id'], quantity=item['quantity'], price=item['price'])
+            for item in archived.data.get('items', [])
+        ])
+    store = Product.objects.filter(product_id=OuterRef('product_id')).values('store_id')[:1]
+    ArchivedOrderItem.objects.filter(store__isnull=True).update(store_id=Subquery(store))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_hot_path_indexes'),
+        ('products', '0003_image_variants'),
+        ('stores', '0008_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='payment_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid'), ('FAILED', 'Failed'), ('REFUNDED', 'Refunded')], default='PENDING', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=50)),
+                ('quantity', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('archived_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.archivedorder')),
+                ('store', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_order_items', to='stores.store')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['store', 'archived_order'], name='orders_arch_store_i_486a21_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_archived_order_items, migrations.RunPython.noop),
+    ]
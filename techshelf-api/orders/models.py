@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from functools import cached_property
+from django.core.serializers.json import DjangoJSONEncoder
 from products.models import Product
 import uuid
 
@@ -34,6 +36,15 @@ class Cart(models.Model):
         from orders.services import OrderService
         return OrderService.create_order_from_cart(self)
     
+    @cached_property
+    def items_with_products(self):
+        """The cart's items with their products loaded in one query"""
+        items = list(self.items.all())
+        products = Product.objects.in_bulk([item.product_id for item in items], field_name='product_id')
+        for item in items:
+            item.__dict__['product'] = products.get(item.product_id)
+        return items
+    
     def __str__(self):
         return f"Cart {self.cart_id} - {'Authenticated' if self.user else 'Guest'}"
 
@@ -42,7 +53,12 @@ class CartItem(models.Model):
     product_id = models.CharField(max_length=50)
     quantity = models.PositiveIntegerField(default=1)
     
-    @property
+    class Meta:
+        indexes = [
+            models.Index(fields=['cart', 'product_id']),
+        ]
+    
+    @cached_property
     def product(self):
         try:
             return Product.objects.get(product_id=self.product_id)
@@ -94,6 +110,16 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            # Orders awaiting payment, a small slice of the table
+            models.Index(fields=['created_at'], condition=models.Q(payment_status='PENDING'),
+                         name='orders_order_pending_idx'),
+            # Status filters, and candidates for archive_orders
+            models.Index(fields=['order_status', 'created_at']),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.order_id:
             # Generate a unique ID in production
@@ -120,12 +146,70 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product_id = models.CharField(max_length=50)
+    # The selling store, copied from the product so seller queries need no
+    # product lookup; also the hash partitioning key (partition_order_items)
+    store = models.ForeignKey('stores.Store', on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product_id']),
+            models.Index(fields=['store', 'order']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.store_id is None and self.product_id:
+            # Items created without the product at hand (admin, scripts)
+            from products.models import Product
+            self.store_id = Product.objects.filter(product_id=self.product_id).values_list('store_id', flat=True).first()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.quantity} of {self.product_id} in order {self.order.order_id}"
 
+class ArchivedOrder(models.Model):
+    """
+    A delivered or cancelled order moved out of the order tables by archive_orders.
+
+    ``data`` is the order as OrderSerializer rendered it at archiving time,
+    items and shipping info included, plus its payment; order detail serves
+    it as is. Its items are also kept as ArchivedOrderItem rows, which is
+    how seller order lists and sales reports still find it.
+    """
+    order_id = models.CharField(max_length=50, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_orders')
+    order_status = models.CharField(max_length=20, choices=Order.ORDER_STATUS)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS, default='PENDING')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.order_id}"
+
+class ArchivedOrderItem(models.Model):
+    """An archived order's item, with its selling store as on OrderItem"""
+    archived_order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product_id = models.CharField(max_length=50)
+    store = models.ForeignKey('stores.Store', on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_order_items')
+    quantity = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'archived_order']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} of {self.product_id} in archived order {self.archived_order_id}"
+
 class Payment(models.Model):
     PAYMENT_STATUS = (
         ('PENDING', 'Pending'),
@@ -1,4 +1,8 @@
+from collections import defaultdict
+from types import SimpleNamespace
+
 from rest_framework import serializers
+from techshelf.serialization import ValuesSerializer
 from .models import Cart, CartItem, ShippingInfo, Order, OrderItem, Payment, Promotion
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -13,7 +17,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         return obj.product.name if obj.product else f"Unknown Product ({obj.product_id})"
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    items = CartItemSerializer(many=True, read_only=True, source='items_with_products')
     total = serializers.SerializerMethodField()
     
     class Meta:
@@ -22,7 +26,7 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['cart_id', 'user', 'created_at', 'updated_at']
     
     def get_total(self, obj):
-        return sum(item.total_price for item in obj.items.all())
+        return sum(item.total_price for item in obj.items_with_products)
 
 class ShippingInfoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,6 +70,61 @@ class OrderSerializer(serializers.ModelSerializer):
         # Fall back to username if no name available
         return obj.user.username
 
+class ShippingInfoValuesSerializer(ValuesSerializer):
+    serializer_class = ShippingInfoSerializer
+    columns = {
+        'id': 'id', 'shipping_address': 'shipping_address', 'city': 'city',
+        'country': 'country', 'postal_code': 'postal_code',
+    }
+
+class OrderItemValuesSerializer(ValuesSerializer):
+    serializer_class = OrderItemSerializer
+    columns = {'product_id': 'product_id', 'quantity': 'quantity', 'price': 'price'}
+
+class OrderValuesSerializer(ValuesSerializer):
+    """OrderSerializer output from values() rows; items are loaded in one query per page"""
+    serializer_class = OrderSerializer
+    columns = {
+        'order_id': 'order_id', 'user': 'user', 'total_amount': 'total_amount', 'tax_rate': 'tax_rate',
+        'shipping_cost': 'shipping_cost', 'payment_status': 'payment_status', 'order_status': 'order_status',
+        'created_at': 'created_at', 'updated_at': 'updated_at',
+    }
+    extra_lookups = ('id', 'user__username', 'user__first_name', 'user__last_name')
+    
+    def __init__(self, context=None, prefix=''):
+        super().__init__(context, prefix)
+        self.shipping_info = ShippingInfoValuesSerializer(self.context, prefix=f'{prefix}shipping_info__')
+        self.item = OrderItemValuesSerializer(self.context)
+        self.items_by_order = {}
+    
+    def lookups(self):
+        return super().lookups() + self.shipping_info.lookups()
+    
+    def prepare(self, rows):
+        self.items_by_order = defaultdict(list)
+        items = OrderItem.objects.filter(order_id__in=[self.value(row, 'id') for row in rows]).order_by('pk')
+        for item in items.values('order_id', *self.item.lookups()):
+            self.items_by_order[item['order_id']].append(self.item.map_row(item))
+    
+    def get_username(self, row):
+        return self.value(row, 'user__username')
+    
+    def get_customer_name(self, row):
+        user = SimpleNamespace(
+            username=self.value(row, 'user__username'),
+            first_name=self.value(row, 'user__first_name'),
+            last_name=self.value(row, 'user__last_name'),
+        )
+        return self.serializer.get_customer_name(SimpleNamespace(user=user))
+    
+    def get_shipping_info(self, row):
+        if self.value(row, 'shipping_info__id') is None:
+            return None
+        return self.shipping_info.map_row(row)
+    
+    def get_items(self, row):
+        return self.items_by_order.get(self.value(row, 'id'), [])
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
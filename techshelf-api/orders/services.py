@@ -1,7 +1,40 @@
-from .models import Order, OrderItem
+from django.db.models import BooleanField, Value
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
 from products.models import Product
 
 class OrderService:
+    @staticmethod
+    def seller_orders(store_pk):
+        """Orders containing at least one item sold by the store, newest first"""
+        order_ids = OrderItem.objects.filter(store_id=store_pk).values_list('order', flat=True).distinct()
+        return (
+            Order.objects.filter(id__in=order_ids)
+            .select_related('user', 'shipping_info')
+            .prefetch_related('items')
+            .order_by('-created_at')
+        )
+    
+    @staticmethod
+    def seller_archived_orders(store_pk):
+        """Archived orders containing at least one item sold by the store, newest first"""
+        order_ids = ArchivedOrderItem.objects.filter(store_id=store_pk).values_list('archived_order', flat=True).distinct()
+        return ArchivedOrder.objects.filter(id__in=order_ids).order_by('-created_at')
+    
+    @staticmethod
+    def with_archived(orders, archived_orders):
+        """
+        (pk, created_at, archived) rows across live and archived orders, newest
+        first; a page of them is then loaded from each table by pk
+        """
+        return orders.prefetch_related(None).order_by().annotate(
+            archived=Value(False, output_field=BooleanField())
+        ).values_list('pk', 'created_at', 'archived').union(
+            archived_orders.order_by().annotate(
+                archived=Value(True, output_field=BooleanField())
+            ).values_list('pk', 'created_at', 'archived'),
+            all=True,
+        ).order_by('-created_at')
+    
     @staticmethod
     def create_order_from_cart(cart):
         if not cart.user:
@@ -41,6 +74,7 @@ class OrderService:
             OrderItem.objects.create(
                 order=order,
                 product_id=item['product'].product_id,
+                store_id=item['product'].store_id,
                 quantity=item['quantity'],
                 price=item['price']
             )
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from stores.models import Store
+from techshelf.cache import bump_tags
+from .models import Order, OrderItem
+
+
+def bump_seller_orders(store_pks):
+    """Invalidate the seller order lists of these stores"""
+    store_ids = set(Store.objects.filter(pk__in=store_pks).values_list('store_id', flat=True))
+    if store_ids:
+        bump_tags(*[f"seller-orders:{store_id}" for store_id in store_ids])
+
+
+@receiver(post_save, sender=Order)
+def invalidate_seller_orders(sender, instance, **kwargs):
+    bump_seller_orders(instance.items.exclude(store=None).values_list('store_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_seller_orders_for_item(sender, instance, **kwargs):
+    if instance.store_id is not None:
+        bump_seller_orders([instance.store_id])
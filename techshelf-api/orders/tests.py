@@ -0,0 +1,259 @@
+import io
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from notifications.models import SalesReport
+from products.models import Product
+from stores.models import Store
+from techshelf.querycount import assert_query_budget
+from techshelf.serialization import render_both
+from users.models import User
+from users.tokens import RevocableAccessToken
+from .api_views import CartView, OrderListView, SellerOrderListView
+from .archive import archive_orders
+from .management.commands.partition_order_items import Command as PartitionCommand
+from .models import ArchivedOrder, Cart, Order, OrderItem, ShippingInfo
+from .serializers import OrderValuesSerializer
+from .views import order_detail_view, order_list_view
+
+
+class ValuesParityTests(TestCase):
+    def test_values_path_renders_the_same_json(self):
+        buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw', first_name='Ada', last_name='Lovelace')
+        shipped = Order.objects.create(
+            user=buyer, total_amount=Decimal('31.50'), tax_rate=Decimal('5.00'), shipping_cost=Decimal('1.50'),
+            shipping_info=ShippingInfo.objects.create(shipping_address='1 Main St', city='Paris', country='FR', postal_code='75001'),
+        )
+        OrderItem.objects.create(order=shipped, product_id='widget', quantity=2, price=Decimal('10.00'))
+        OrderItem.objects.create(order=shipped, product_id='lamp', quantity=1, price=Decimal('10.00'))
+        Order.objects.create(user=buyer, total_amount=0, order_status='CANCELLED')
+        request = Request(RequestFactory().get('/api/orders/'))
+        request.user = buyer
+
+        queryset = Order.objects.filter(user=buyer).order_by('-created_at')
+        values, regular = render_both(OrderValuesSerializer, queryset, {'request': request})
+
+        self.assertEqual(values, regular)
+
+
+class ArchivedOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'pw', role='SELLER')
+        self.store = Store.objects.create(store_name='Acme', user=self.seller)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.old = self.place_order(days_ago=400, order_status='DELIVERED')
+        self.recent = self.place_order(days_ago=1, order_status='PROCESSING')
+        self.assertEqual(archive_orders(365, batch_size=10), 1)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(self.seller)}")
+
+    def place_order(self, days_ago, order_status):
+        order = Order.objects.create(user=self.buyer, total_amount=Decimal('20.00'), payment_status='PAID', order_status=order_status)
+        OrderItem.objects.create(order=order, product_id='widget', store=self.store, quantity=2, price=Decimal('10.00'))
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_sales_report_counts_archived_orders(self):
+        today = timezone.now().date()
+        report = SalesReport.generate_report(self.store, today - timedelta(days=500), today)
+        self.assertEqual(report.total_sales, Decimal('40.00'))
+
+    def test_seller_order_list_includes_archived_orders(self):
+        results = self.client.get('/api/orders/seller-orders/').json()['results']
+        self.assertEqual([order['order_id'] for order in results], [self.recent.order_id, self.old.order_id])
+
+        delivered = self.client.get('/api/orders/seller-orders/', {'status': 'DELIVERED'}).json()
+        self.assertEqual((delivered['count'], delivered['results'][0]['order_id']), (1, self.old.order_id))
+
+    def test_order_history_includes_archived_orders(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(self.buyer)}")
+        response = self.client.get('/api/orders/orders/').json()
+        self.assertEqual(response['count'], 2)
+        self.assertEqual([order['order_id'] for order in response['results']], [self.recent.order_id, self.old.order_id])
+        self.assertEqual(response['results'][1]['items'][0]['product_id'], 'widget')
+
+    def test_order_list_page_includes_archived_orders(self):
+        request = RequestFactory().get('/orders/')
+        request.user = self.buyer
+        with mock.patch('orders.views.render') as render:
+            order_list_view(request)
+
+        orders = render.call_args.args[2]['orders']
+        self.assertEqual([order.order_id for order in orders], [self.recent.order_id, self.old.order_id])
+
+    def test_seller_order_detail_falls_back_to_the_archive(self):
+        response = self.client.get(f'/api/orders/seller-orders/{self.old.order_id}/')
+        self.assertEqual((response.status_code, response.json()['order_status']), (200, 'DELIVERED'))
+
+        other = User.objects.create_user('other', 'other@example.com', 'pw', role='SELLER')
+        Store.objects.create(store_name='Globex', user=other)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(other)}")
+        self.assertEqual(self.client.get(f'/api/orders/seller-orders/{self.old.order_id}/').status_code, 404)
+
+    def test_order_detail_page_falls_back_to_the_archive(self):
+        request = RequestFactory().get(f'/orders/{self.old.order_id}/')
+        request.user = self.buyer
+        with mock.patch('orders.views.render') as render:
+            order_detail_view(request, self.old.order_id)
+
+        context = render.call_args.args[2]
+        self.assertEqual(context['order']['order_id'], self.old.order_id)
+        self.assertEqual(context['subtotal'], Decimal('20.00'))
+        self.assertTrue(ArchivedOrder.objects.get(order_id=self.old.order_id).items.filter(store=self.store).exists())
+
+
+def seed_order_items(count):
+    """count items spread over two stores, plus one without a store"""
+    stores = [
+        Store.objects.create(store_name=name, user=User.objects.create_user(name, f"{name}@example.com", 'pw'))
+        for name in ('acme', 'globex')
+    ]
+    buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+    order = Order.objects.create(user=buyer, total_amount=0)
+    OrderItem.objects.bulk_create(
+        [OrderItem(order=order, product_id=f"p{n}", store=stores[n % 2], quantity=1, price=1) for n in range(count)]
+        + [OrderItem(order=order, product_id='gone', quantity=1, price=1)]
+    )
+    return stores
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('orders_orderitem')")
+        return cursor.fetchone() is not None
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Declarative partitioning needs PostgreSQL')
+class PartitionOrderItemsTests(TestCase):
+    def test_convert_keeps_every_row(self):
+        stores = seed_order_items(9)
+
+        call_command('partition_order_items', partitions=4, batch_size=2, stdout=io.StringIO())
+
+        self.assertTrue(is_partitioned())
+        self.assertEqual(OrderItem.objects.count(), 10)
+        self.assertEqual(OrderItem.objects.filter(store=stores[0]).count(), 5)
+        self.assertEqual(OrderItem.objects.filter(store=None).count(), 1)
+        # Ids carry on from the old table
+        item = OrderItem.objects.create(order=Order.objects.get(), product_id='new', store=stores[1], quantity=1, price=1)
+        self.assertGreater(item.pk, OrderItem.objects.exclude(pk=item.pk).order_by('-pk')[0].pk)
+
+        output = io.StringIO()
+        call_command('partition_order_items', explain=stores[0].pk, stdout=output)
+        self.assertIn('SellerOrderListView: pruned to orders_orderitem_p', output.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Declarative partitioning needs PostgreSQL')
+class PartitionOrderItemsRaceTests(TransactionTestCase):
+    """A row updated by another transaction while its batch is being copied"""
+
+    def tearDown(self):
+        # Back to the table the migrations made, for the tests that follow
+        with connection.cursor() as cursor:
+            if is_partitioned():
+                cursor.execute("DROP TABLE orders_orderitem CASCADE")
+                cursor.execute("ALTER TABLE orders_orderitem_unpartitioned RENAME TO orders_orderitem")
+            # Left behind by a conversion that failed
+            cursor.execute("DROP FUNCTION IF EXISTS orders_orderitem_partitioned_mirror() CASCADE")
+            cursor.execute("DROP TABLE IF EXISTS orders_orderitem_partitioned CASCADE")
+        super().tearDown()
+
+    def test_copy_waits_for_a_concurrent_update(self):
+        stores = seed_order_items(3)
+        item = OrderItem.objects.filter(store=stores[0]).first()
+        updated, release = threading.Event(), threading.Event()
+
+        def update_during_copy():
+            # The trigger puts the updated row in the copy before the batch commits
+            try:
+                with connections['default'].cursor() as cursor:
+                    cursor.execute("BEGIN")
+                    cursor.execute("UPDATE orders_orderitem SET quantity = 7 WHERE id = %s", [item.pk])
+                    updated.set()
+                    release.wait(5)
+                    cursor.execute("COMMIT")
+            finally:
+                connections['default'].close()
+
+        run = PartitionCommand.run
+
+        def run_copy_in_a_race(command, sql, params=None):
+            if sql.startswith(f"INSERT INTO {command.staging}") and not updated.is_set():
+                threading.Thread(target=update_during_copy).start()
+                updated.wait(5)
+                threading.Timer(0.5, release.set).start()
+            return run(command, sql, params)
+
+        with mock.patch.object(PartitionCommand, 'run', run_copy_in_a_race):
+            call_command('partition_order_items', partitions=4, batch_size=100, stdout=io.StringIO())
+
+        self.assertTrue(is_partitioned())
+        self.assertEqual(OrderItem.objects.count(), 4)
+        self.assertEqual(OrderItem.objects.get(pk=item.pk).quantity, 7)
+
+
+@override_settings(REVOCATION_SYNC_INTERVAL=3600)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'pw', role='SELLER')
+        self.store = Store.objects.create(store_name='Acme', user=self.seller)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client = APIClient()
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(user)}")
+        # Caches the principal, as every request after the first finds it
+        self.client.get('/api/users/profile/')
+
+    def fetch(self, url):
+        return lambda: self.assertEqual(self.client.get(url).status_code, 200)
+
+    def grow_orders(self, size):
+        for n in range(Order.objects.count() + ArchivedOrder.objects.count(), size):
+            shipping_info = ShippingInfo.objects.create(shipping_address=f'{n} Main St', city='Paris', country='FR', postal_code='75001')
+            order = Order.objects.create(
+                user=self.buyer, total_amount=10, payment_status='PAID',
+                order_status='DELIVERED' if n % 2 == 0 else 'PROCESSING', shipping_info=shipping_info,
+            )
+            for product_id in ('widget', 'lamp'):
+                OrderItem.objects.create(order=order, product_id=product_id, store=self.store, quantity=1, price=5)
+            # Old enough to archive once delivered, each newer than the last
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=1000 - n))
+
+    def test_cart(self):
+        cart = Cart.objects.create(user=self.buyer)
+
+        def grow(size):
+            for n in range(cart.items.count(), size):
+                product = Product.objects.create(product_id=f'product-{n}', name=f'Product {n}', price=5, category='tools', store=self.store)
+                cart.add_item(product, 1)
+
+        self.login(self.buyer)
+        assert_query_budget(CartView, self.fetch('/api/orders/cart/'), grow)
+
+    def grow_archived_orders(self, size):
+        # Every other order archived, so each page mixes both tables
+        self.grow_orders(size)
+        archive_orders(365, batch_size=size)
+
+    def test_order_list(self):
+        self.login(self.buyer)
+        assert_query_budget(OrderListView, self.fetch('/api/orders/orders/'), self.grow_archived_orders, sizes=(2, 10, 50))
+
+    def test_seller_order_list(self):
+        self.login(self.seller)
+        assert_query_budget(
+            SellerOrderListView, self.fetch('/api/orders/seller-orders/'), self.grow_archived_orders, sizes=(2, 10, 50),
+        )
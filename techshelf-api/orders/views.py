@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from .models import Cart, CartItem, ShippingInfo, Order, Promotion
+from .models import ArchivedOrder, Cart, CartItem, ShippingInfo, Order, Promotion
 from products.models import Product
 from notifications.models import Notification
 from decimal import Decimal
@@ -238,11 +238,16 @@ def payment_view(request):
 @login_required
 def order_list_view(request):
     orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    # Old delivered and cancelled orders live in the archive, with the same fields to list
+    archived = ArchivedOrder.objects.filter(user=request.user).order_by('-created_at')
+    orders = sorted([*orders, *archived], key=lambda order: order.created_at, reverse=True)
     return render(request, 'orders/order_list.html', {'orders': orders})
 
 @login_required
 def order_detail_view(request, order_id):
-    order = get_object_or_404(Order, order_id=order_id, user=request.user)
+    order = Order.objects.filter(order_id=order_id, user=request.user).first()
+    if order is None:
+        return archived_order_detail_view(request, order_id)
     
     # If cancelling the order
     if request.method == 'POST' and request.POST.get('action') == 'cancel':
@@ -268,7 +273,7 @@ def order_detail_view(request, order_id):
                     
                     # Restore stock
                     product.stock += item.quantity
-                    product.save()
+                    product.save(update_fields=['stock', 'updated_at'])
                 except Product.DoesNotExist:
                     continue
                     
@@ -289,6 +294,26 @@ def order_detail_view(request, order_id):
     }
     return render(request, 'orders/order_detail.html', context)
 
+def archived_order_detail_view(request, order_id):
+    """Old delivered and cancelled orders, from the archive; they can no longer be cancelled"""
+    archived = get_object_or_404(ArchivedOrder, order_id=order_id, user=request.user)
+    if request.method == 'POST' and request.POST.get('action') == 'cancel':
+        messages.error(request, 'This order cannot be cancelled.')
+        return redirect('orders:detail', order_id=order_id)
+    
+    # The order as it was rendered when archived
+    order = archived.data
+    subtotal = sum(Decimal(item['price']) * item['quantity'] for item in order['items'])
+    tax = subtotal * (Decimal(order['tax_rate']) / 100)
+    
+    context = {
+        'order': order,
+        'subtotal': subtotal,
+        'tax': tax,
+        'archived': True,
+    }
+    return render(request, 'orders/order_detail.html', context)
+
 @login_required
 def apply_promotion_view(request):
     if request.method == 'POST':
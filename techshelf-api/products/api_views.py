@@ -6,25 +6,46 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from .models import Product, ProductLike
-from .serializers import ProductSerializer, ProductCreateSerializer, LikeSerializer
+from .serializers import (
+    ProductSerializer, ProductCreateSerializer, LikeSerializer, ProductValuesSerializer, apply_user_likes
+)
 from django.db.models import Q, Count, F, OuterRef, Subquery, IntegerField, Sum
 from orders.models import OrderItem
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from stores.models import Store
+from techshelf.cache import CachedResponseMixin
+from techshelf.serialization import ValuesListMixin
+from techshelf.throttling import SearchThrottle
 import logging
 
 logger = logging.getLogger(__name__)
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(CachedResponseMixin, ValuesListMixin, generics.ListAPIView):
     """List all products with optional filtering"""
     serializer_class = ProductSerializer
+    values_serializer_class = ProductValuesSerializer
     permission_classes = [permissions.AllowAny]
+    read_replica = True
+    throttle_classes = [SearchThrottle]
+    # A signed-in search miss on the database shared cache: 2 data queries,
+    # 16 for the throttle and the response cache, 2 for a revocation sync
+    query_budget = 20
+    search_throttle_scope = 'search'
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description', 'category']
     ordering_fields = ['price', 'created_at']
     
+    def get_cache_tags(self, data):
+        return ['catalog'] + [f"product:{product['product_id']}" for product in data['results']]
+    
+    def personalize(self, request, data):
+        return dict(data, results=apply_user_likes(data['results'], request.user))
+    
+    def get_user_tags(self, request):
+        return [f"likes:{request.user.pk}"] if request.user.is_authenticated else []
+    
     def get_queryset(self):
-        queryset = Product.objects.all()
+        queryset = Product.objects.for_listing(self.request.user)
         
         # Filter by store if specified
         store_id = self.request.query_params.get('store')
@@ -71,12 +92,25 @@ class ProductListView(generics.ListAPIView):
             
         return queryset
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(CachedResponseMixin, generics.RetrieveAPIView):
     """Get details of a specific product"""
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('store')
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'product_id'
+    
+    def get_object(self):
+        self.product = super().get_object()
+        return self.product
+    
+    def get_cache_tags(self, data):
+        return [f"product:{self.product.product_id}", f"store:{self.product.store.store_id}"]
+    
+    def personalize(self, request, data):
+        return apply_user_likes([data], request.user)[0]
+    
+    def get_user_tags(self, request):
+        return [f"likes:{request.user.pk}"] if request.user.is_authenticated else []
 
 class ProductCreateView(generics.CreateAPIView):
     """Create a new product (requires seller role)"""
@@ -85,14 +119,14 @@ class ProductCreateView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         # Verify user is a seller and has a store
-        user = self.request.user
-        if user.role != 'SELLER':
+        seller = self.request.seller
+        if not seller.is_seller:
             raise PermissionDenied('You need to be a seller to create products.')
         
-        if not hasattr(user, 'store'):
+        if seller.store is None:
             raise ValidationError('You need to create a store first.')
             
-        product = serializer.save(store=user.store)
+        product = serializer.save(store=seller.store)
         return product
     
     def create(self, request, *args, **kwargs):
@@ -113,6 +147,7 @@ class ProductUpdateView(generics.UpdateAPIView):
 class ProductLikeView(APIView):
     """Like or unlike a product"""
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'like'
     
     def post(self, request, product_id):
         """Like a product"""
@@ -141,16 +176,17 @@ class UserLikedProductsView(generics.ListAPIView):
     serializer_class = ProductSerializer
     
     def get_queryset(self):
-        return Product.objects.filter(likes__user=self.request.user)
+        return Product.objects.for_listing(self.request.user).filter(likes__user=self.request.user)
 
-class CategoryProductsView(generics.ListAPIView):
+class CategoryProductsView(ValuesListMixin, generics.ListAPIView):
     """List all products in a specific category"""
     serializer_class = ProductSerializer
+    values_serializer_class = ProductValuesSerializer
     permission_classes = [permissions.AllowAny]
     
     def get_queryset(self):
         category = self.kwargs['category']
-        return Product.objects.filter(category=category)
+        return Product.objects.for_listing(self.request.user).filter(category=category)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -159,11 +195,10 @@ def get_user_liked_products(request):
     Get all products that the current user has liked
     """
     user = request.user
-    liked_products = Product.objects.filter(likes__user=user)
+    liked_products = Product.objects.for_listing(user).filter(likes__user=user)
     
     paginator = PageNumberPagination()
     paginator.page_size = 20
-    result_page = paginator.paginate_queryset(liked_products, request)
-    
-    serializer = ProductSerializer(result_page, many=True, context={'request': request})
-    return paginator.get_paginated_response(serializer.data)
+    values_serializer = ProductValuesSerializer(context={'request': request})
+    result_page = paginator.paginate_queryset(values_serializer.values(liked_products), request)
+    return paginator.get_paginated_response(values_serializer.to_representation(result_page))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from techshelf.query_plans import check_plans, hot_querysets
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot-path querysets and fail if any reads a large table in full'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=settings.QUERY_PLAN_SEQ_SCAN_ROWS,
+                            help='Only fail on full scans of tables with at least this many rows')
+
+    def handle(self, *args, **options):
+        querysets = hot_querysets()
+        failures = check_plans(options['min_rows'], querysets)
+
+        for name, table, rows, plan in failures:
+            self.stdout.write(self.style.ERROR(f"{name}: sequential scan of {table} ({rows} rows)"))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f"{len(failures)} sequential scans in {len(querysets)} hot-path queries")
+        self.stdout.write(self.style.SUCCESS(f"{len(querysets)} hot-path queries use indexes"))
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.models import Product
+from techshelf.imaging import get_executor
+
+
+def render(pk):
+    try:
+        return Product.render_image_variants(pk)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Render the thumbnail, card and detail variants for existing product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_WORKERS,
+                            help='Number of image worker processes')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render products whose variants are already up to date')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            queryset = queryset.exclude(image_status='READY')
+        pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+        self.stdout.write(f"Rendering image variants for {len(pks)} products")
+
+        # One thread per worker process keeps the pool busy while the
+        # threads read sources and write results
+        workers = max(1, options['workers'])
+        get_executor(workers)
+
+        rendered = failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            for pk, variants in zip(pks, threads.map(render, pks)):
+                if variants is None:
+                    failed += 1
+                    self.stderr.write(f"Could not render variants for product {pk}")
+                else:
+                    rendered += 1
+
+        self.stdout.write(f"Rendered variants for {rendered} products, {failed} failed")
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from techshelf.storage import ContentAddressedStorage, collect_garbage, dedup_report, scan_duplicates
+
+
+def megabytes(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = 'Delete unreferenced content-addressed media blobs and report deduplication savings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report unreferenced blobs without deleting them')
+        parser.add_argument('--grace', type=int, default=settings.CAS_GC_GRACE_SECONDS,
+                            help='Keep unreferenced blobs younger than this many seconds')
+        parser.add_argument('--report', action='store_true',
+                            help='Only report how many bytes deduplication saves')
+        parser.add_argument('--scan', action='store_true',
+                            help='Also hash files stored outside the content-addressed area and report duplicates')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not ContentAddressedStorage')
+
+        if not options['report']:
+            removed, freed = collect_garbage(default_storage, options['grace'], options['dry_run'])
+            verb = 'Found' if options['dry_run'] else 'Removed'
+            self.stdout.write(f"{verb} {removed} unreferenced blobs ({megabytes(freed)})")
+
+        report = dedup_report(default_storage)
+        self.stdout.write(
+            f"{report['blobs']} blobs, {megabytes(report['stored_bytes'])} stored, "
+            f"{megabytes(report['saved_bytes'])} saved by sharing"
+        )
+
+        if options['scan']:
+            files, total, duplicate = scan_duplicates(settings.MEDIA_ROOT)
+            self.stdout.write(
+                f"{files} files outside {settings.CAS_PREFIX}/ use {megabytes(total)}, "
+                f"{megabytes(duplicate)} of which are duplicates"
+            )
@@ -1,8 +1,30 @@
-from django.db import models
+import logging
+
+from django.db import models, transaction
+from django.db.models import Count, Exists, OuterRef
 from django.conf import settings
+from django.utils import timezone
 from django.utils.text import slugify
 
+logger = logging.getLogger(__name__)
+
+class ProductQuerySet(models.QuerySet):
+    def for_listing(self, user=None):
+        """Load the store, like count and the user's like flag alongside each product"""
+        queryset = self.select_related('store').annotate(like_total=Count('likes', distinct=True))
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(
+                liked_by_user=Exists(ProductLike.objects.filter(product=OuterRef('pk'), user=user))
+            )
+        return queryset
+
 class Product(models.Model):
+    IMAGE_STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('READY', 'Ready'),
+        ('FAILED', 'Failed'),
+    )
+    
     product_id = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -11,14 +33,95 @@ class Product(models.Model):
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='product_images/', null=True, blank=True)
     store = models.ForeignKey('stores.Store', on_delete=models.CASCADE, related_name='products')
+    # Resized copies of image keyed by size name (see PRODUCT_IMAGE_SIZES);
+    # image_source is the image they were last rendered, or tried to render, from
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_status = models.CharField(max_length=20, choices=IMAGE_STATUS_CHOICES, blank=True)
+    image_source = models.CharField(max_length=255, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', '-created_at']),
+            models.Index(fields=['store', '-created_at']),
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['price']),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.product_id:
             # Generate a unique ID in production
             self.product_id = f"prod_{slugify(self.name)}"
+        
+        update_fields = kwargs.get('update_fields')
+        image_changed = (
+            (self.image.name or '') != self.image_source
+            and (update_fields is None or 'image' in update_fields)
+        )
+        if image_changed:
+            # Listings fall back to the placeholder until the new variants exist
+            self.image_status = 'PENDING' if self.image else ''
+            # Recorded now so later saves, even after a failed render, do not schedule it again
+            self.image_source = self.image.name or ''
+            if not self.image:
+                self.image_variants = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'image_status', 'image_variants', 'image_source'}
+        
         super().save(*args, **kwargs)
+        
+        if image_changed and self.image:
+            self.schedule_image_variants()
+    
+    def schedule_image_variants(self):
+        """Render the image variants on a background thread once the upload is committed"""
+        from techshelf.imaging import run_in_background
+        pk = self.pk
+        transaction.on_commit(lambda: run_in_background(Product.render_image_variants, pk))
+    
+    @staticmethod
+    def render_image_variants(pk):
+        """Render every configured size of a product's current image and record the result"""
+        from stores.storefront import invalidate_storefront
+        from techshelf.imaging import read_source, render_variant_sets
+        
+        product = Product.objects.filter(pk=pk).first()
+        if product is None or not product.image:
+            return None
+        
+        source_name = product.image.name
+        sizes = settings.PRODUCT_IMAGE_SIZES
+        # Only write back if the image was not replaced while we were rendering;
+        # a newer upload schedules its own job
+        current = Product.objects.filter(pk=pk, image=source_name)
+        # Uploads are stored by content, so another product with the same
+        # image name has the same bytes and its variants can be reused
+        variants = (
+            Product.objects.filter(image_source=source_name, image_status='READY')
+            .exclude(pk=pk).values_list('image_variants', flat=True).first()
+        )
+        if not variants or set(variants) != set(sizes):
+            try:
+                sets = render_variant_sets(read_source(product.image), sorted(set(sizes.values())), 'products')
+            except Exception:
+                logger.exception(f"Failed to render image variants for product {product.product_id}")
+                current.update(image_status='FAILED', updated_at=timezone.now())
+                invalidate_storefront(product.store_id)
+                return None
+            variants = {size: sets[width] for size, width in sizes.items()}
+        
+        updated = current.update(
+            image_variants=variants,
+            image_source=source_name,
+            image_status='READY',
+            updated_at=timezone.now(),
+        )
+        if updated:
+            invalidate_storefront(product.store_id)
+        return variants
     
     @property
     def likes(self):
@@ -35,7 +138,7 @@ class Product(models.Model):
     def decrement_stock(self, quantity):
         if self.stock >= quantity:
             self.stock -= quantity
-            self.save()
+            self.save(update_fields=['stock', 'updated_at'])
             return True
         return False
     
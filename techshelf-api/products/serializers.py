@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Product, Like
+from techshelf.imaging import variant_urls
+from techshelf.serialization import ValuesSerializer
+from .models import Product, Like, ProductLike
 
 class ProductSerializer(serializers.ModelSerializer):
     store = serializers.StringRelatedField()
@@ -7,14 +10,16 @@ class ProductSerializer(serializers.ModelSerializer):
     store_subdomain = serializers.SerializerMethodField()  # Add this field
     like_count = serializers.SerializerMethodField(read_only=True)
     is_liked = serializers.SerializerMethodField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
+    image_placeholder = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = ['product_id', 'name', 'price', 'stock', 'category', 'description', 
-                 'image', 'store', 'store_name', 'store_subdomain',  # Include store_subdomain
+                 'image', 'image_variants', 'image_status', 'image_placeholder', 'store', 'store_name', 'store_subdomain',  # Include store_subdomain
                  'created_at', 'updated_at',
                  'like_count', 'is_liked']
-        read_only_fields = ['product_id', 'store', 'created_at', 'updated_at', 
+        read_only_fields = ['product_id', 'store', 'created_at', 'updated_at', 'image_status',
                            'store_name', 'store_subdomain', 'like_count', 'is_liked']
     
     def get_store_name(self, obj):
@@ -24,15 +29,81 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_store_subdomain(self, obj):
         return obj.store.subdomain_name if obj.store else None
 
+    def get_image_variants(self, obj):
+        # Empty until the background render has finished; clients show image_placeholder meanwhile
+        if obj.image_status != 'READY':
+            return {}
+        request = self.context.get('request')
+        return {size: variant_urls(variants, request) for size, variants in obj.image_variants.items()}
+    
+    def get_image_placeholder(self, obj):
+        if not obj.image or obj.image_status == 'READY':
+            return None
+        return settings.PRODUCT_IMAGE_PLACEHOLDER_URL or None
+    
     def get_like_count(self, obj):
+        # Use the annotation from Product.objects.for_listing() when present
+        if hasattr(obj, 'like_total'):
+            return obj.like_total
         return obj.likes.count()
         
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'liked_by_user'):
+                return obj.liked_by_user
             return obj.likes.filter(user=request.user).exists()
         return False
 
+class ProductValuesSerializer(ValuesSerializer):
+    """ProductSerializer output from values() rows of Product.objects.for_listing()"""
+    serializer_class = ProductSerializer
+    columns = {
+        'product_id': 'product_id', 'name': 'name', 'price': 'price', 'stock': 'stock',
+        'category': 'category', 'description': 'description', 'image': 'image',
+        'image_status': 'image_status', 'created_at': 'created_at', 'updated_at': 'updated_at',
+    }
+    extra_lookups = ('image_variants', 'store__store_name', 'store__subdomain_name', 'like_total')
+    
+    def lookups(self):
+        lookups = super().lookups()
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            lookups.append('liked_by_user')
+        return lookups
+    
+    def get_image_variants(self, row):
+        return self.serializer.get_image_variants(self.row_object(row, 'image_status', 'image_variants'))
+    
+    def get_image_placeholder(self, row):
+        return self.serializer.get_image_placeholder(self.row_object(row, 'image', 'image_status'))
+    
+    def get_store(self, row):
+        # StringRelatedField renders str(store), which is the store name
+        return row['store__store_name']
+    
+    def get_store_name(self, row):
+        return row['store__store_name']
+    
+    def get_store_subdomain(self, row):
+        return row['store__subdomain_name']
+    
+    def get_like_count(self, row):
+        return row['like_total']
+    
+    def get_is_liked(self, row):
+        return row.get('liked_by_user', False)
+
+def apply_user_likes(products, user):
+    """Copies of serialized products with is_liked filled in for the given user, in one query"""
+    liked = set()
+    if user.is_authenticated:
+        liked = set(
+            ProductLike.objects.filter(user=user, product__product_id__in=[product['product_id'] for product in products])
+            .values_list('product__product_id', flat=True)
+        )
+    return [dict(product, is_liked=product['product_id'] in liked) for product in products]
+
 class ProductCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -40,7 +111,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         # Get the store from the context
-        store = self.context['request'].user.store
+        store = self.context['request'].seller.store
         
         # Remove store from validated_data if it exists to prevent duplicate
         if 'store' in validated_data:
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from stores.storefront import invalidate_storefront
+from techshelf.cache import bump_tags
+from .models import Product, ProductLike
+
+
+# Saves that only move stock leave list membership and order alone
+STOCK_FIELDS = frozenset({'stock', 'updated_at'})
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_cached_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and update_fields <= STOCK_FIELDS:
+        # Only the lists and pages showing this product carry its stock
+        bump_tags(f"product:{instance.product_id}")
+    else:
+        bump_tags(f"product:{instance.product_id}", 'catalog')
+
+
+@receiver(post_save, sender=ProductLike)
+@receiver(post_delete, sender=ProductLike)
+def invalidate_liked_product(sender, instance, **kwargs):
+    # Like counts are part of the shared product data, storefront pages included
+    product = Product.objects.filter(pk=instance.product_id).values_list('product_id', 'store_id').first()
+    if product:
+        product_id, store_pk = product
+        bump_tags(f"product:{product_id}")
+        invalidate_storefront(store_pk)
+    bump_tags(f"likes:{instance.user_id}")
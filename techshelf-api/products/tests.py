@@ -0,0 +1,299 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from stores.models import Store
+from techshelf.cache import bump_tags, lock_key, response_cache_key, shared_cache
+from techshelf.querycount import assert_query_budget
+from techshelf.serialization import render_both
+from techshelf.storage import ContentAddressedStorage, collect_garbage
+from users.models import User
+from .api_views import ProductListView
+from .models import Product, ProductLike
+from .serializers import ProductValuesSerializer
+
+
+class ProductTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pw', role='SELLER')
+        self.store = Store.objects.create(store_name='Acme', user=owner)
+
+    def product(self, product_id, **fields):
+        fields = {'name': product_id, 'price': 5, 'stock': 10, 'category': 'tools', **fields}
+        return Product.objects.create(product_id=product_id, store=self.store, **fields)
+
+
+class ResponseCacheTests(ProductTestCase):
+    def list(self, query=''):
+        return self.client.get(f'/api/products/{query}')
+
+    def test_stock_change_only_invalidates_lists_showing_the_product(self):
+        widget = self.product('widget')
+        self.product('lamp', category='lighting')
+        self.assertEqual(self.list()['X-Cache'], 'MISS')
+        self.assertEqual(self.list('?category=lighting')['X-Cache'], 'MISS')
+
+        widget.decrement_stock(3)
+
+        response = self.list()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        stock = {product['product_id']: product['stock'] for product in response.json()['results']}
+        self.assertEqual(stock['widget'], 7)
+        self.assertEqual(self.list('?category=lighting')['X-Cache'], 'HIT')
+
+    def test_other_changes_invalidate_every_list(self):
+        widget = self.product('widget')
+        self.product('lamp', category='lighting')
+        self.list('?category=lighting')
+
+        widget.name = 'Widget Pro'
+        widget.save()
+
+        self.assertEqual(self.list('?category=lighting')['X-Cache'], 'MISS')
+
+
+class ValuesParityTests(ProductTestCase):
+    VARIANTS = {
+        size: [{'name': f'variants/products/{size}.webp', 'width': width, 'height': width, 'format': 'webp'}]
+        for size, width in (('thumbnail', 160), ('card', 400), ('detail', 1024))
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        widget = self.product('widget', image='cas/ab/cd/widget.png', description='With variants')
+        # Rendered: variant URLs; still rendering: the placeholder
+        Product.objects.filter(pk=widget.pk).update(image_status='READY', image_variants=self.VARIANTS)
+        self.product('lamp', price='12.50', image='cas/ab/cd/lamp.png', stock=0)
+        self.product('cable', description=None)
+        ProductLike.objects.create(user=self.buyer, product=widget)
+
+    def request(self, user=None):
+        request = Request(RequestFactory().get('/api/products/'))
+        if user is not None:
+            request.user = user
+        return request
+
+    def test_values_path_renders_the_same_json(self):
+        for user in (None, self.buyer):
+            with self.subTest(user=user):
+                request = self.request(user)
+                queryset = Product.objects.for_listing(request.user).order_by('-created_at')
+                values, regular = render_both(ProductValuesSerializer, queryset, {'request': request})
+                self.assertEqual(values, regular)
+
+    def test_values_path_serializes_more_rows_per_second(self):
+        rows = 500
+        Product.objects.bulk_create([
+            Product(product_id=f'bulk-{n}', name=f'Bulk {n}', price=n, category='bulk', store=self.store)
+            for n in range(rows)
+        ])
+        request = self.request(self.buyer)
+        context = {'request': request}
+        queryset = Product.objects.for_listing(request.user).order_by('-created_at')
+
+        def rate(render, runs=5):
+            # Best of several runs, so one slow run does not decide it
+            best = float('inf')
+            for _ in range(runs):
+                start = time.perf_counter()
+                render()
+                best = min(best, time.perf_counter() - start)
+            return rows / best
+
+        values_serializer = ProductValuesSerializer(context=context)
+        values_rate = rate(lambda: values_serializer.to_representation(values_serializer.values(queryset)))
+        regular_rate = rate(lambda: ProductValuesSerializer.serializer_class(queryset, many=True, context=context).data)
+        self.assertGreater(values_rate, regular_rate, f"{values_rate:.0f} rows/s from values(), {regular_rate:.0f} from instances")
+
+    def test_values_path_costs_less_cpu_per_page(self):
+        Product.objects.bulk_create([
+            Product(product_id=f'bulk-{n}', name=f'Bulk {n}', price=n, category='bulk', store=self.store, description='x' * 200)
+            for n in range(200)
+        ])
+        request = self.request(self.buyer)
+        context = {'request': request}
+        queryset = Product.objects.for_listing(request.user).order_by('-created_at')
+
+        def cpu_per_page(render, repeats=5, runs=5):
+            # Best of several runs; process time leaves out waiting on the database
+            best = float('inf')
+            for _ in range(runs):
+                start = time.process_time()
+                for _ in range(repeats):
+                    render()
+                best = min(best, (time.process_time() - start) / repeats)
+            return best * 1000
+
+        report = []
+        for size in (10, 50, 200):
+            values_serializer = ProductValuesSerializer(context=context)
+            values_ms = cpu_per_page(lambda: values_serializer.to_representation(values_serializer.values(queryset)[:size]))
+            regular_ms = cpu_per_page(lambda: ProductValuesSerializer.serializer_class(queryset[:size], many=True, context=context).data)
+            report.append(f"{size} items: {values_ms:.2f}ms from values(), {regular_ms:.2f}ms from instances")
+            self.assertLess(values_ms, regular_ms, '; '.join(report))
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pw', role='SELLER')
+        self.store = Store.objects.create(store_name='Acme', user=owner)
+
+    def test_failed_render_is_not_rescheduled_by_later_saves(self):
+        with self.captureOnCommitCallbacks() as scheduled:
+            product = Product.objects.create(
+                product_id='widget', name='Widget', price=5, stock=3, category='tools',
+                store=self.store, image='product_images/missing.png',
+            )
+        self.assertEqual(len(scheduled), 1)
+
+        # The source file is missing, so rendering fails
+        with self.assertLogs('products.models', 'ERROR'):
+            self.assertIsNone(Product.render_image_variants(product.pk))
+        product.refresh_from_db()
+        self.assertEqual((product.image_status, product.image_source), ('FAILED', 'product_images/missing.png'))
+
+        with self.captureOnCommitCallbacks() as scheduled:
+            product.description = 'Now with a description'
+            product.save()
+            self.assertTrue(product.decrement_stock(1))
+        self.assertEqual(scheduled, [])
+        product.refresh_from_db()
+        self.assertEqual((product.image_status, product.stock), ('FAILED', 2))
+
+
+class MediaGCTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = ContentAddressedStorage(location=location)
+
+    def age(self, name, seconds):
+        path = self.storage.path(name)
+        mtime = os.stat(path).st_mtime - seconds
+        os.utime(path, (mtime, mtime))
+
+    def test_unreferenced_blob_is_collected_after_the_grace_period(self):
+        name = self.storage.save('a.png', ContentFile(b'image bytes'))
+        self.assertEqual(collect_garbage(self.storage, grace_seconds=60)[0], 0)
+        self.age(name, 120)
+        self.assertEqual(collect_garbage(self.storage, grace_seconds=60)[0], 1)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_reused_blob_gets_a_new_grace_period(self):
+        name = self.storage.save('a.png', ContentFile(b'image bytes'))
+        self.age(name, 120)
+
+        # Another upload of the same bytes, whose row is not committed yet
+        self.assertEqual(self.storage.save('b.png', ContentFile(b'image bytes')), name)
+
+        self.assertEqual(collect_garbage(self.storage, grace_seconds=60)[0], 0)
+        self.assertTrue(self.storage.exists(name))
+
+
+class ThunderingHerdTests(TransactionTestCase):
+    """Concurrent misses on one key run the view once"""
+    CLIENTS = 10
+    COMPUTE_SECONDS = 0.3
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pw', role='SELLER')
+        store = Store.objects.create(store_name='Acme', user=owner)
+        Product.objects.create(product_id='widget', name='Widget', price=5, category='tools', store=store)
+        self.computed = 0
+        get_queryset = ProductListView.get_queryset
+
+        def slow_get_queryset(view):
+            self.computed += 1
+            time.sleep(self.COMPUTE_SECONDS)
+            return get_queryset(view)
+
+        patcher = mock.patch.object(ProductListView, 'get_queryset', slow_get_queryset)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stampede(self):
+        barrier = threading.Barrier(self.CLIENTS)
+
+        def fetch(_):
+            barrier.wait()
+            try:
+                return self.client_class().get('/api/products/')['X-Cache']
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.CLIENTS) as pool:
+            outcomes = Counter(pool.map(fetch, range(self.CLIENTS)))
+        return outcomes, time.perf_counter() - start
+
+    def test_cold_cache_is_computed_once(self):
+        outcomes, elapsed = self.stampede()
+        self.assertEqual(self.computed, 1, f"{self.CLIENTS} clients took {elapsed:.2f}s")
+        self.assertEqual(outcomes, {'MISS': 1, 'COALESCED': self.CLIENTS - 1})
+        self.assertLess(elapsed, 2 * self.COMPUTE_SECONDS)
+
+    def test_invalidated_entry_is_served_stale_while_one_request_recomputes(self):
+        self.client.get('/api/products/')
+        bump_tags('catalog')
+        self.computed = 0
+
+        outcomes, elapsed = self.stampede()
+
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(outcomes, {'MISS': 1, 'STALE': self.CLIENTS - 1})
+
+    def test_other_workers_lock_is_waited_for(self):
+        key = response_cache_key(RequestFactory().get('/api/products/'), 'ProductListView')
+        shared_cache.add(lock_key(key), 'another worker', 60)
+        threading.Timer(self.COMPUTE_SECONDS, shared_cache.delete, [lock_key(key)]).start()
+
+        start = time.perf_counter()
+        response = self.client.get('/api/products/')
+
+        self.assertGreaterEqual(time.perf_counter() - start, self.COMPUTE_SECONDS)
+        # The other worker released the lock without storing a response, so this request computes it
+        self.assertEqual((response['X-Cache'], self.computed), ('MISS', 1))
+
+
+class QueryBudgetTests(ProductTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client = APIClient()
+        # Cached pages for the new products to invalidate, as in production
+        for query in ({}, {'search': 'tools'}):
+            self.client.get('/api/products/', query)
+
+    def grow(self, size):
+        for n in range(Product.objects.count(), size):
+            ProductLike.objects.create(user=self.buyer, product=self.product(f'product-{n}'))
+
+    def fetch(self, query):
+        # Each new product invalidates the cached lists, so every fetch is built
+        response = self.client.get('/api/products/', query)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+
+    def test_product_list(self):
+        assert_query_budget(ProductListView, lambda: self.fetch({}), self.grow)
+
+    def test_product_search(self):
+        assert_query_budget(ProductListView, lambda: self.fetch({'search': 'tools'}), self.grow)
+
+    def test_product_list_with_likes(self):
+        self.client.force_authenticate(self.buyer)
+        assert_query_budget(ProductListView, lambda: self.fetch({'search': 'tools'}), self.grow)
@@ -5,6 +5,8 @@ class StoreAdmin(admin.ModelAdmin):
     list_display = ('store_name', 'subdomain_name', 'user', 'created_at')
     search_fields = ('store_name', 'subdomain_name', 'user__username')
     prepopulated_fields = {'subdomain_name': ('store_name',)}
+    # Maintained by Store.apply_rating/retract_rating, never by saves
+    readonly_fields = Store.RATING_FIELDS
 
 class StoreThemeAdmin(admin.ModelAdmin):
     list_display = ('theme_id', 'primary_color', 'secondary_color', 'font')
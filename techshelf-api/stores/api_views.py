@@ -1,30 +1,64 @@
 from rest_framework import generics, permissions, status, filters
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
+from django import forms
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import Http404
 from .models import Store, StoreTheme, Rating
-from .serializers import StoreSerializer, StoreCreateSerializer, StoreThemeSerializer, RatingSerializer
+from .serializers import (
+    StoreSerializer, StoreCreateSerializer, StoreThemeSerializer, RatingSerializer, StoreValuesSerializer
+)
+from .resolver import get_request_store
+from .storefront import get_storefront_page
+from techshelf.cache import CachedResponseMixin
+from techshelf.imaging import run_in_background
+from techshelf.serialization import ValuesListMixin
+from techshelf.uploads import render_theme_variants
 import logging
 import traceback
 
+User = get_user_model()
+
 # Configure logger
 logger = logging.getLogger(__name__)
 
-class StoreListView(generics.ListAPIView):
+class StoreListView(CachedResponseMixin, ValuesListMixin, generics.ListAPIView):
     """List all stores with optional filtering"""
-    queryset = Store.objects.all()
+    queryset = Store.objects.select_related('theme', 'user')
     serializer_class = StoreSerializer
+    values_serializer_class = StoreValuesSerializer
     permission_classes = [permissions.AllowAny]
+    read_replica = True
+    # A miss on the database shared cache: 2 data queries, 7 for the response
+    # cache, 2 for a revocation sync
+    query_budget = 11
     filter_backends = [filters.SearchFilter]
     search_fields = ['store_name', 'subdomain_name']
+    
+    def get_cache_tags(self, data):
+        return ['catalog'] + [f"store:{store['store_id']}" for store in data['results']]
 
-class StoreDetailView(generics.RetrieveAPIView):
+class StoreDetailView(CachedResponseMixin, generics.RetrieveAPIView):
     """Get details of a specific store by subdomain"""
     serializer_class = StoreSerializer
     permission_classes = [permissions.AllowAny]
-    lookup_field = 'subdomain_name'
-    lookup_url_kwarg = 'subdomain'
-    queryset = Store.objects.all()
+    
+    def get_object(self):
+        # Cached for RESPONSE_CACHE_TIMEOUT, so built from the row rather than request.store
+        store = get_request_store(self.request)
+        return generics.get_object_or_404(Store.objects.select_related('theme', 'user'), pk=store.pk)
+    
+    def get_cache_tags(self, data):
+        return [f"store:{data['store_id']}"]
+
+class StorefrontPageView(APIView):
+    """Store, theme, first page of products and recent ratings in one response"""
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request, subdomain):
+        store = get_request_store(request)
+        return Response(get_storefront_page(store, request))
 
 class StoreCreateView(APIView):
     """Create a new store (requires seller role)"""
@@ -50,44 +84,17 @@ class StoreCreateView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Update user to seller if not already
-            if user.role != 'SELLER':
-                user.role = 'SELLER'
-                user.save()
-                
-            # Create store manually instead of using serializer
-            store = Store(
-                store_name=store_name,
-                subdomain_name=subdomain_name if subdomain_name else None,
-                user=user
-            )
-            store.save() 
-
-            primary_color = request.data.get('primary_color', '#3498db')
-            secondary_color = request.data.get('secondary_color', '#2ecc71')
-            font = request.data.get('font', 'Roboto')
+            # Reject broken images before anything is saved
+            uploaded = [field for field in ('logo_url', 'banner_url') if field in request.FILES]
+            for field in uploaded:
+                try:
+                    forms.ImageField().clean(request.FILES[field])
+                except forms.ValidationError as e:
+                    return Response({'error': f"{field}: {' '.join(e.messages)}"}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Create theme manually
-            theme = StoreTheme(
-                theme_id=f"theme_{store.store_id}",
-                primary_color=primary_color,
-                secondary_color=secondary_color,
-                font=font
-            )
+            with transaction.atomic():
+                store = self.create_store(request, user, store_name, subdomain_name, uploaded)
             
-            if 'logo_url' in request.FILES:
-                theme.logo_url = request.FILES['logo_url']
-                print(f"Logo image received: {theme.logo_url}")
-            
-            if 'banner_url' in request.FILES:
-                theme.banner_url = request.FILES['banner_url']
-                print(f"Banner image received: {theme.banner_url}")
-                
-            theme.save()
-            
-            store.theme = theme
-            store.save()
-
             serializer = StoreSerializer(store)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
@@ -99,6 +106,51 @@ class StoreCreateView(APIView):
                 {'error': f'Failed to create store: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    def create_store(self, request, user, store_name, subdomain_name, uploaded):
+        """Seller role, store and theme, all or nothing; variants render once committed"""
+        # Update user to seller if not already; request.user is a read-only cached copy
+        user = User.objects.select_for_update().get(pk=user.pk)
+        if user.role != 'SELLER':
+            user.role = 'SELLER'
+            user.save(update_fields=['role'])
+            
+        # Create store manually instead of using serializer
+        store = Store(
+            store_name=store_name,
+            subdomain_name=subdomain_name if subdomain_name else None,
+            user=user
+        )
+        store.save() 
+
+        primary_color = request.data.get('primary_color', '#3498db')
+        secondary_color = request.data.get('secondary_color', '#2ecc71')
+        font = request.data.get('font', 'Roboto')
+        
+        # Create theme manually
+        theme = StoreTheme(
+            theme_id=f"theme_{store.store_id}",
+            primary_color=primary_color,
+            secondary_color=secondary_color,
+            font=font
+        )
+        
+        if 'logo_url' in request.FILES:
+            theme.logo_url = request.FILES['logo_url']
+            print(f"Logo image received: {theme.logo_url}")
+        
+        if 'banner_url' in request.FILES:
+            theme.banner_url = request.FILES['banner_url']
+            print(f"Banner image received: {theme.banner_url}")
+            
+        theme.save()
+        
+        # A render failure after this point only leaves the theme without variants
+        for field in uploaded:
+            transaction.on_commit(lambda field=field: run_in_background(render_theme_variants, theme.pk, field))
+        
+        store.update_theme(theme)
+        return store
 
 class StoreUpdateView(generics.UpdateAPIView):
     """Update store details if owner"""
@@ -116,9 +168,9 @@ class StoreThemeView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        store = get_object_or_404(Store, 
-                                 subdomain_name=self.kwargs['subdomain'],
-                                 user=self.request.user)
+        store = get_request_store(self.request)
+        if store.user_id != self.request.user.id:
+            raise Http404('Store not found.')
         
         theme, created = StoreTheme.objects.get_or_create(
             id=store.theme.id if store.theme else None,
@@ -131,10 +183,17 @@ class StoreThemeView(generics.RetrieveUpdateAPIView):
         )
         
         if created:
-            store.theme = theme
-            store.save()
+            # request.store is the resolver's cached copy, never saved
+            Store.objects.get(pk=store.pk).update_theme(theme)
             
         return theme
+    
+    def perform_update(self, serializer):
+        theme = serializer.save()
+        uploaded = [field for field in ('logo_url', 'banner_url') if field in self.request.FILES]
+        # Rendered in the background like on create, so the response does not wait for it
+        for field in uploaded:
+            transaction.on_commit(lambda field=field: run_in_background(render_theme_variants, theme.pk, field))
 
 class StoreRatingListView(generics.ListAPIView):
     """List all ratings for a specific store"""
@@ -142,17 +201,17 @@ class StoreRatingListView(generics.ListAPIView):
     permission_classes = [permissions.AllowAny]
     
     def get_queryset(self):
-        store = get_object_or_404(Store, subdomain_name=self.kwargs['subdomain'])
-        return Rating.objects.filter(store=store).order_by('-timestamp')
+        store = get_request_store(self.request)
+        return Rating.objects.filter(store=store).select_related('user').order_by('-timestamp')
 
 class StoreRatingCreateView(APIView):
     """Create a rating for a store"""
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, subdomain):
-        store = get_object_or_404(Store, subdomain_name=subdomain)
+        store = get_request_store(request)
         
-        if store.user == request.user:
+        if store.user_id == request.user.id:
             return Response(
                 {'detail': 'You cannot rate your own store.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -162,23 +221,27 @@ class StoreRatingCreateView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
-        # Check if the user already rated this store
-        existing_rating = Rating.objects.filter(user=request.user, store=store).first()
-        
-        if existing_rating:
-            # Update existing rating
-            existing_rating.score = serializer.validated_data['score']
-            existing_rating.comment = serializer.validated_data.get('comment', '')
-            existing_rating.save()
+        with transaction.atomic():
+            # Check if the user already rated this store
+            existing_rating = Rating.objects.select_for_update().filter(user=request.user, store=store).first()
             
-            # Return updated rating data
-            return Response(RatingSerializer(existing_rating).data, status=status.HTTP_200_OK)
-        else:
-            # Create new rating
-            rating = serializer.save(
-                user=request.user,
-                store=store,
-                rating_id=f"rating_{request.user.id}_{store.store_id}"
-            )
-            
-            return Response(RatingSerializer(rating).data, status=status.HTTP_201_CREATED)
+            if existing_rating:
+                # Update existing rating
+                previous_score = existing_rating.score
+                existing_rating.score = serializer.validated_data['score']
+                existing_rating.comment = serializer.validated_data.get('comment', '')
+                existing_rating.save()
+                store.apply_rating(existing_rating.score, previous_score=previous_score)
+                
+                # Return updated rating data
+                return Response(RatingSerializer(existing_rating).data, status=status.HTTP_200_OK)
+            else:
+                # Create new rating
+                rating = serializer.save(
+                    user=request.user,
+                    store=store,
+                    rating_id=f"rating_{request.user.id}_{store.store_id}"
+                )
+                store.apply_rating(rating.score)
+                
+                return Response(RatingSerializer(rating).data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q, Sum
+
+from stores.models import RATING_SCORES, Rating, Store
+from stores.resolver import invalidate_store
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized rating aggregates on every store from the Rating table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted stores without fixing them')
+
+    def handle(self, *args, **options):
+        aggregates = {
+            row.pop('store'): row
+            for row in Rating.objects.values('store').annotate(
+                rating_sum=Sum('score'),
+                rating_count=Count('id'),
+                **{f'score_{score}_count': Count('id', filter=Q(score=score)) for score in RATING_SCORES}
+            )
+        }
+        empty = {field: 0 for field in Store.RATING_FIELDS}
+
+        fixed = 0
+        for store in Store.objects.only('pk', 'store_name', *Store.RATING_FIELDS).iterator():
+            expected = aggregates.get(store.pk, empty)
+            current = {field: getattr(store, field) for field in Store.RATING_FIELDS}
+            if current == expected:
+                continue
+
+            fixed += 1
+            self.stdout.write(f"{store.store_name}: {current} -> {expected}")
+            if not options['dry_run']:
+                Store.objects.filter(pk=store.pk).update(**expected)
+                invalidate_store(store.pk)
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(f"{verb} {fixed} stores with drifted rating aggregates")
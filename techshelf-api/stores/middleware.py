@@ -0,0 +1,32 @@
+from .resolver import resolve_store, subdomain_from_host
+from .seller import SellerContext
+
+
+class StoreResolverMiddleware:
+    """
+    Attach the storefront being requested to request.store.
+
+    The store comes from the ``subdomain`` URL kwarg when the route has one,
+    otherwise from a ``<subdomain>.<STOREFRONT_DOMAIN>`` Host header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        subdomain = view_kwargs.get('subdomain') or subdomain_from_host(request.META.get('HTTP_HOST', ''))
+        request.store = resolve_store(subdomain) if subdomain else None
+
+
+class SellerContextMiddleware:
+    """Attach a lazily resolved SellerContext to request.seller"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.seller = SellerContext(request)
+        return self.get_response(request)
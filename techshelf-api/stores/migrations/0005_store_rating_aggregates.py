@@ -0,0 +1,64 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:20
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Store = apps.get_model('stores', 'Store')
+    Rating = apps.get_model('stores', 'Rating')
+
+    aggregates = Rating.objects.values('store').annotate(
+        rating_sum=Sum('score'),
+        rating_count=Count('id'),
+        **{f'score_{score}_count': Count('id', filter=Q(score=score)) for score in range(1, 6)}
+    )
+    for row in aggregates:
+        store_id = row.pop('store')
+        Store.objects.filter(pk=store_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0004_remove_store_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='score_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='score_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='score_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='score_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='score_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
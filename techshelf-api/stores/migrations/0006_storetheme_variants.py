@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0005_store_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storetheme',
+            name='banner_variants',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='storetheme',
+            name='logo_variants',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 16:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0006_storetheme_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from techshelf.cache_backends import CreateCacheTable
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0007_store_updated_at'),
+    ]
+
+    operations = [
+        # The shared cache with SHARED_CACHE_BACKEND=db (techshelf.settings)
+        CreateCacheTable('techshelf_shared_cache'),
+    ]
@@ -1,7 +1,16 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.conf import settings
+from django.utils import timezone
 from django.utils.text import slugify
 
+RATING_SCORES = range(1, 6)
+
+# Leave room for a "-N" suffix within the 50 character SlugField
+SUBDOMAIN_BASE_LENGTH = 40
+SUBDOMAIN_ALLOCATION_ATTEMPTS = 5
+
 class StoreTheme(models.Model):
     theme_id = models.CharField(max_length=50, unique=True)
     primary_color = models.CharField(max_length=20, default='#3498db')
@@ -9,6 +18,22 @@ class StoreTheme(models.Model):
     font = models.CharField(max_length=50, default='Roboto')
     logo_url = models.ImageField(upload_to='store_logos/', null=True, blank=True)
     banner_url = models.ImageField(upload_to='store_banners/', null=True, blank=True)
+    logo_variants = models.JSONField(default=list, blank=True)
+    banner_variants = models.JSONField(default=list, blank=True)
+    
+    def generate_variants(self, fields=('logo_url', 'banner_url')):
+        """Render resized, content-hashed copies of the uploaded logo and/or banner"""
+        from techshelf.imaging import generate_variants
+        widths = {
+            'logo_url': settings.STORE_LOGO_WIDTHS,
+            'banner_url': settings.STORE_BANNER_WIDTHS,
+        }
+        update_fields = []
+        for field in fields:
+            variants_field = field.replace('_url', '_variants')
+            setattr(self, variants_field, generate_variants(getattr(self, field), widths[field], 'stores'))
+            update_fields.append(variants_field)
+        self.save(update_fields=update_fields)
     
     def __str__(self):
         return self.theme_id
@@ -20,26 +45,83 @@ class Store(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='store')
     theme = models.ForeignKey(StoreTheme, on_delete=models.SET_NULL, null=True, blank=True, related_name='stores')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped when the theme, owner or rating aggregates change, since
+    # serialized stores include them (see touch())
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Rating aggregates, maintained by apply_rating/retract_rating
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    score_1_count = models.PositiveIntegerField(default=0)
+    score_2_count = models.PositiveIntegerField(default=0)
+    score_3_count = models.PositiveIntegerField(default=0)
+    score_4_count = models.PositiveIntegerField(default=0)
+    score_5_count = models.PositiveIntegerField(default=0)
+    
+    RATING_FIELDS = ['rating_sum', 'rating_count'] + [f'score_{score}_count' for score in RATING_SCORES]
     
     def save(self, *args, **kwargs):
+        if getattr(self, 'from_store_cache', False):
+            # Up to STORE_CACHE_TTL seconds old; saving it would write stale columns back
+            raise RuntimeError('Stores from the resolver cache are read-only, fetch the row to save it')
+        if getattr(self, 'from_principal_cache', False):
+            # Up to AUTH_USER_CACHE_TTL seconds old, for the same reason
+            raise RuntimeError('Stores from the principal cache are read-only, fetch the row to save it')
+        
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # The rating aggregates only move through F() updates; a full save
+            # would write back whatever this instance last read over them
+            excluded = set(self.RATING_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in excluded
+            ]
+        
         # Generate subdomain_name from store_name if not provided
-        if not self.subdomain_name and self.store_name:
-            base_slug = slugify(self.store_name)
-            slug = base_slug
-            
-            # Make sure slugified name is unique
-            counter = 1
-            while Store.objects.filter(subdomain_name=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-                
-            self.subdomain_name = slug
+        generated = not self.subdomain_name and bool(self.store_name)
+        if generated:
+            base_slug = slugify(self.store_name)[:SUBDOMAIN_BASE_LENGTH] or 'store'
+            self.subdomain_name = Store.allocate_subdomain(base_slug)
         
         # Generate store_id if not provided
-        if not self.store_id and self.subdomain_name:
+        generated_id = not self.store_id and bool(self.subdomain_name)
+        if generated_id:
             self.store_id = f"store_{self.subdomain_name}"
-            
-        super().save(*args, **kwargs)
+        
+        if not generated:
+            super().save(*args, **kwargs)
+            return
+        
+        # Another store may grab the same slug between allocation and insert;
+        # the unique constraint catches that and we allocate again
+        for attempt in range(SUBDOMAIN_ALLOCATION_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                slug = Store.allocate_subdomain(base_slug)
+                if slug == self.subdomain_name or attempt == SUBDOMAIN_ALLOCATION_ATTEMPTS - 1:
+                    # The conflict was not on the subdomain, or we keep losing the race
+                    raise
+                self.subdomain_name = slug
+                if generated_id:
+                    self.store_id = f"store_{slug}"
+    
+    @staticmethod
+    def allocate_subdomain(base_slug):
+        """Return base_slug or the first free base_slug-N, using a single prefix query"""
+        taken = set(
+            Store.objects.filter(subdomain_name__startswith=base_slug)
+            .values_list('subdomain_name', flat=True)
+        )
+        if base_slug not in taken:
+            return base_slug
+        
+        counter = 1
+        while f"{base_slug}-{counter}" in taken:
+            counter += 1
+        return f"{base_slug}-{counter}"
     
     def add_product(self, product):
         product.store = self
@@ -56,11 +138,61 @@ class Store(models.Model):
     
     def set_subdomain(self, subdomain):
         self.subdomain_name = slugify(subdomain)
-        self.save()
+        self.save(update_fields=['subdomain_name', 'updated_at'])
     
     def update_theme(self, theme):
         self.theme = theme
-        self.save()
+        self.save(update_fields=['theme', 'updated_at'])
+    
+    @property
+    def average_rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+    
+    @property
+    def rating_histogram(self):
+        return {score: getattr(self, f'score_{score}_count') for score in RATING_SCORES}
+    
+    def apply_rating(self, score, previous_score=None):
+        """Fold a new rating, or a changed score of an existing one, into the aggregates"""
+        if previous_score is None:
+            updates = {
+                'rating_sum': F('rating_sum') + score,
+                'rating_count': F('rating_count') + 1,
+                f'score_{score}_count': F(f'score_{score}_count') + 1,
+            }
+        elif previous_score != score:
+            updates = {
+                'rating_sum': Greatest(F('rating_sum') + (score - previous_score), 0),
+                f'score_{previous_score}_count': Greatest(F(f'score_{previous_score}_count') - 1, 0),
+                f'score_{score}_count': F(f'score_{score}_count') + 1,
+            }
+        else:
+            return
+        self._update_rating_fields(updates)
+    
+    def retract_rating(self, score):
+        """Remove a deleted rating from the aggregates"""
+        # Clamped at zero: a PositiveIntegerField going negative is an IntegrityError
+        self._update_rating_fields({
+            'rating_sum': Greatest(F('rating_sum') - score, 0),
+            'rating_count': Greatest(F('rating_count') - 1, 0),
+            f'score_{score}_count': Greatest(F(f'score_{score}_count') - 1, 0),
+        })
+    
+    @staticmethod
+    def touch(**filters):
+        """Bump updated_at on the matching stores without firing save signals"""
+        return Store.objects.filter(**filters).update(updated_at=timezone.now())
+    
+    def _update_rating_fields(self, updates):
+        from .resolver import invalidate_store
+        from .storefront import invalidate_storefront
+        if Store.objects.filter(pk=self.pk).update(updated_at=timezone.now(), **updates):
+            self.refresh_from_db(fields=self.RATING_FIELDS + ['updated_at'])
+        invalidate_store(self.pk)
+        invalidate_storefront(self.pk)
     
     def __str__(self):
         return self.store_name
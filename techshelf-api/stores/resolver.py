@@ -0,0 +1,56 @@
+import copy
+
+from django.conf import settings
+from django.http import Http404
+
+from techshelf.lru import TTLCache
+from .models import Store
+
+# Per-process cache of subdomain -> Store (with theme and owner loaded).
+# Writes in this process invalidate it through signals. Other workers are not
+# told: they keep serving a renamed, re-themed or deleted store for up to
+# STORE_CACHE_TTL seconds, until their entry expires. That bound is accepted
+# for reads only; the copies are marked read-only (see Store.save), so code
+# that writes a store must fetch the row first.
+store_cache = TTLCache(maxsize=settings.STORE_CACHE_SIZE, ttl=settings.STORE_CACHE_TTL)
+
+RESERVED_SUBDOMAINS = {'www', 'api', 'admin'}
+
+
+def subdomain_from_host(host):
+    """Extract the storefront subdomain from a Host header like acme.techshelf.com:8000"""
+    host = host.split(':', 1)[0].lower().rstrip('.')
+    suffix = '.' + settings.STOREFRONT_DOMAIN
+    if not host.endswith(suffix):
+        return None
+
+    subdomain = host[:-len(suffix)]
+    if not subdomain or '.' in subdomain or subdomain in RESERVED_SUBDOMAINS:
+        return None
+    return subdomain
+
+
+def resolve_store(subdomain):
+    """Return a private copy of the store for a subdomain, or None if it does not exist"""
+    store = store_cache.get(subdomain)
+    if store is None:
+        store = Store.objects.select_related('theme', 'user').filter(subdomain_name=subdomain).first()
+        if store is None:
+            return None
+        store_cache.set(subdomain, store)
+    # Callers may modify the instance, so never hand out the shared one
+    store = copy.deepcopy(store)
+    store.from_store_cache = True
+    return store
+
+
+def invalidate_store(store_pk):
+    store_cache.delete_where(lambda store: store.pk == store_pk)
+
+
+def get_request_store(request):
+    """The store resolved by StoreResolverMiddleware, or 404"""
+    store = getattr(request, 'store', None)
+    if store is None:
+        raise Http404('Store not found.')
+    return store
@@ -0,0 +1,41 @@
+from functools import cached_property
+
+
+class SellerContext:
+    """
+    The requesting user's seller status and store, resolved once per request.
+
+    Attached to every request as request.seller by SellerContextMiddleware.
+    Nothing is looked up until first use, which for API views is after DRF
+    has authenticated the request, and each value is then memoized.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def user(self):
+        return self.request.user
+
+    @cached_property
+    def is_seller(self):
+        return self.user.is_authenticated and self.user.role == 'SELLER'
+
+    @cached_property
+    def store(self):
+        """The user's store whatever their role, or None"""
+        if not self.user.is_authenticated:
+            return None
+        return getattr(self.user, 'store', None)
+
+    @property
+    def store_pk(self):
+        return self.store.pk if self.store is not None else None
+
+    @property
+    def store_id(self):
+        return self.store.store_id if self.store is not None else None
+
+    def __bool__(self):
+        """True for a seller who has a store"""
+        return self.is_seller and self.store is not None
@@ -1,30 +1,77 @@
 from rest_framework import serializers
+from techshelf.imaging import variant_urls
+from techshelf.serialization import ValuesSerializer
 from .models import Store, StoreTheme, Rating
 
 class StoreThemeSerializer(serializers.ModelSerializer):
+    logo_variants = serializers.SerializerMethodField()
+    banner_variants = serializers.SerializerMethodField()
+    
     class Meta:
         model = StoreTheme
-        fields = ['theme_id', 'primary_color', 'secondary_color', 'font', 'logo_url', 'banner_url']
+        fields = ['theme_id', 'primary_color', 'secondary_color', 'font', 'logo_url', 'banner_url',
+                  'logo_variants', 'banner_variants']
+    
+    def get_logo_variants(self, obj):
+        return variant_urls(obj.logo_variants, self.context.get('request'))
+    
+    def get_banner_variants(self, obj):
+        return variant_urls(obj.banner_variants, self.context.get('request'))
 
 class StoreSerializer(serializers.ModelSerializer):
     theme = StoreThemeSerializer(read_only=True)
     user = serializers.StringRelatedField()
-    average_rating = serializers.SerializerMethodField()
-    rating_count = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(read_only=True)
     
     class Meta:
         model = Store
         fields = ['store_id', 'store_name', 'subdomain_name', 'user', 'theme', 'created_at', 'average_rating', 'rating_count']
         read_only_fields = ['store_id', 'user', 'created_at', 'average_rating', 'rating_count']
+
+class StoreThemeValuesSerializer(ValuesSerializer):
+    """StoreThemeSerializer output from values() rows, usually nested under prefix='theme__'"""
+    serializer_class = StoreThemeSerializer
+    columns = {
+        'theme_id': 'theme_id', 'primary_color': 'primary_color', 'secondary_color': 'secondary_color',
+        'font': 'font', 'logo_url': 'logo_url', 'banner_url': 'banner_url',
+    }
+    extra_lookups = ('logo_variants', 'banner_variants')
+    
+    def get_logo_variants(self, row):
+        return self.serializer.get_logo_variants(self.row_object(row, 'logo_variants'))
+    
+    def get_banner_variants(self, row):
+        return self.serializer.get_banner_variants(self.row_object(row, 'banner_variants'))
+
+class StoreValuesSerializer(ValuesSerializer):
+    """StoreSerializer output from values() rows"""
+    serializer_class = StoreSerializer
+    columns = {
+        'store_id': 'store_id', 'store_name': 'store_name', 'subdomain_name': 'subdomain_name',
+        'created_at': 'created_at', 'rating_count': 'rating_count',
+    }
+    extra_lookups = ('user__username', 'rating_sum')
+    
+    def __init__(self, context=None, prefix=''):
+        super().__init__(context, prefix)
+        self.theme = StoreThemeValuesSerializer(self.context, prefix=f'{prefix}theme__')
+        self.average_rating = self.serializer.fields['average_rating']
+    
+    def lookups(self):
+        return super().lookups() + self.theme.lookups()
+    
+    def get_user(self, row):
+        # StringRelatedField renders str(user), which is the username
+        return self.value(row, 'user__username')
     
-    def get_average_rating(self, obj):
-        ratings = obj.ratings.all()
-        if not ratings.exists():
+    def get_theme(self, row):
+        if self.value(row, 'theme__theme_id') is None:
             return None
-        return sum(rating.score for rating in ratings) / ratings.count()
+        return self.theme.map_row(row)
     
-    def get_rating_count(self, obj):
-        return obj.ratings.count()
+    def get_average_rating(self, row):
+        average = Store.average_rating.fget(self.row_object(row, 'rating_sum', 'rating_count'))
+        return None if average is None else self.average_rating.to_representation(average)
 
 class StoreCreateSerializer(serializers.ModelSerializer):
     class Meta:
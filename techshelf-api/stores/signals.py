@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Product
+from techshelf.cache import bump_tags
+from .models import Rating, Store, StoreTheme
+from .resolver import invalidate_store, store_cache
+from .storefront import invalidate_storefront
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_cached_store(sender, instance, **kwargs):
+    invalidate_store(instance.pk)
+    invalidate_storefront(instance.pk)
+    bump_tags(f"store:{instance.store_id}", 'catalog')
+
+
+@receiver(post_save, sender=StoreTheme)
+@receiver(post_delete, sender=StoreTheme)
+def invalidate_cached_theme(sender, instance, **kwargs):
+    store_cache.delete_where(lambda store: store.theme_id == instance.pk)
+    Store.touch(theme_id=instance.pk)
+    for store_pk, store_id in Store.objects.filter(theme_id=instance.pk).values_list('pk', 'store_id'):
+        invalidate_storefront(store_pk)
+        bump_tags(f"store:{store_id}")
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_owner(sender, instance, **kwargs):
+    store_cache.delete_where(lambda store: store.user_id == instance.pk)
+    # Store responses include the owner's username
+    Store.touch(user_id=instance.pk)
+    store_ids = list(Store.objects.filter(user_id=instance.pk).values_list('store_id', flat=True))
+    if store_ids:
+        bump_tags(*[f"store:{store_id}" for store_id in store_ids])
+
+
+@receiver(post_delete, sender=Rating)
+def retract_deleted_rating(sender, instance, **kwargs):
+    Store(pk=instance.store_id).retract_rating(instance.score)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_rated_store(sender, instance, **kwargs):
+    store_id = Store.objects.filter(pk=instance.store_id).values_list('store_id', flat=True).first()
+    if store_id:
+        bump_tags(f"store:{store_id}")
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_storefront_page(sender, instance, **kwargs):
+    invalidate_storefront(instance.store_id)
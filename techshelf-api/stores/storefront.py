@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from products.models import Product
+from products.serializers import ProductValuesSerializer, apply_user_likes
+from .models import Rating, Store
+from .serializers import RatingSerializer, StoreSerializer
+
+
+def storefront_cache_key(store_pk):
+    return f"storefront_page:{store_pk}"
+
+
+def invalidate_storefront(store_pk):
+    cache.delete(storefront_cache_key(store_pk))
+
+
+def build_storefront_page(store):
+    """
+    Everything a storefront page renders, independent of who is viewing it.
+
+    Costs one count and one select for products plus one select for ratings;
+    the caller loads the store.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    products = Product.objects.for_listing().filter(store=store).order_by('-created_at')
+    product_count = Product.objects.filter(store=store).count()
+
+    next_url = None
+    if product_count > page_size:
+        query = urlencode({'store': store.store_id, 'page': 2})
+        next_url = f"{reverse('api_product_list')}?{query}"
+
+    ratings = (
+        Rating.objects.filter(store=store)
+        .select_related('user')
+        .order_by('-timestamp')[:settings.STOREFRONT_PAGE_RATINGS]
+    )
+
+    # Serialized without a request so the payload can be shared between users
+    # and hosts: media URLs stay relative and is_liked is filled in per user
+    product_serializer = ProductValuesSerializer()
+    return {
+        'store': StoreSerializer(store).data,
+        'products': {
+            'count': product_count,
+            'next': next_url,
+            'results': product_serializer.to_representation(product_serializer.values(products)[:page_size]),
+        },
+        'rating_summary': {
+            'average_rating': store.average_rating,
+            'rating_count': store.rating_count,
+            'histogram': store.rating_histogram,
+        },
+        'recent_ratings': RatingSerializer(ratings, many=True).data,
+    }
+
+
+def get_storefront_page(store, request):
+    """Cached storefront payload with the current user's likes filled in"""
+    key = storefront_cache_key(store.pk)
+    data = cache.get(key)
+    if data is None:
+        # request.store may be STORE_CACHE_TTL old; what is cached comes from the row
+        store = Store.objects.select_related('theme', 'user').filter(pk=store.pk).first() or store
+        data = build_storefront_page(store)
+        cache.set(key, data, settings.STOREFRONT_PAGE_CACHE_TIMEOUT)
+
+    if request.user.is_authenticated:
+        results = apply_user_likes(data['products']['results'], request.user)
+        data = dict(data, products=dict(data['products'], results=results))
+
+    return data
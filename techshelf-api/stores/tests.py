@@ -0,0 +1,294 @@
+import io
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from products.models import Product, ProductLike
+from techshelf.cache import bump_tags
+from techshelf.querycount import assert_query_budget, record_queries
+from techshelf.serialization import render_both
+from orders.models import Order, OrderItem
+from users.authentication import principal_cache
+from users.models import User
+from users.tokens import RevocableAccessToken
+from .api_views import StoreListView
+from .models import Store, StoreTheme
+from .resolver import resolve_store, store_cache
+from .serializers import StoreValuesSerializer
+
+
+class StoreTestCase(TestCase):
+    def setUp(self):
+        store_cache.clear()
+        cache.clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pw', role='SELLER')
+        self.store = Store.objects.create(store_name='Acme', user=self.owner)
+        self.client = APIClient()
+
+
+class SubdomainAllocationTests(TestCase):
+    STORES = 1000
+
+    def test_same_name_stores_cost_one_allocation_query_each(self):
+        User.objects.bulk_create([User(username=f'seller{n}', email=f'seller{n}@example.com') for n in range(self.STORES)])
+        users = list(User.objects.order_by('pk'))
+
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            for user in users:
+                Store.objects.create(store_name='Tech Store', user=user)
+        elapsed = time.perf_counter() - start
+
+        selects = sum(count for shape, count in recorder.shapes.items() if shape.startswith('SELECT') and 'stores_store' in shape)
+        self.assertEqual(selects, self.STORES, f"{self.STORES} stores created in {elapsed:.2f}s")
+        subdomains = set(Store.objects.values_list('subdomain_name', flat=True))
+        self.assertEqual(len(subdomains), self.STORES)
+        self.assertIn(f'tech-store-{self.STORES - 1}', subdomains)
+
+    def test_lost_race_is_retried_through_the_unique_constraint(self):
+        first = User.objects.create_user('first', 'first@example.com', 'pw')
+        second = User.objects.create_user('second', 'second@example.com', 'pw')
+        Store.objects.create(store_name='Tech Store', user=first)
+        # Allocation saw no conflict, as if the other insert committed just after it
+        with mock.patch.object(Store, 'allocate_subdomain', side_effect=['tech-store', 'tech-store-1']):
+            store = Store.objects.create(store_name='Tech Store', user=second)
+        self.assertEqual(store.subdomain_name, 'tech-store-1')
+
+
+class ResolverTests(StoreTestCase):
+    def test_cached_copies_cannot_be_saved(self):
+        store = resolve_store('acme')
+        with self.assertRaises(RuntimeError):
+            store.save()
+
+    def test_theme_created_on_the_row_not_the_cached_copy(self):
+        resolve_store('acme')
+        Store.objects.filter(pk=self.store.pk).update(store_name='Renamed')
+        self.client.force_authenticate(self.owner)
+
+        response = self.client.get('/api/stores/acme/theme/')
+
+        self.assertEqual(response.status_code, 200)
+        store = Store.objects.get(pk=self.store.pk)
+        self.assertEqual(store.theme.theme_id, 'theme_store_acme')
+        # The cached name was not written back over the rename
+        self.assertEqual(store.store_name, 'Renamed')
+
+
+    def test_store_detail_is_cached_from_the_row_not_the_cached_copy(self):
+        resolve_store('acme')
+        # Renamed by another worker: the bump is shared, this process's copy is not invalidated
+        Store.objects.filter(pk=self.store.pk).update(store_name='Renamed')
+        bump_tags('store:store_acme')
+
+        response = self.client.get('/api/stores/acme/')
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['store_name'], 'Renamed')
+
+
+class RatingAggregateTests(StoreTestCase):
+    def test_full_save_keeps_concurrent_rating_updates(self):
+        stale = Store.objects.get(pk=self.store.pk)
+        self.store.apply_rating(5)
+        self.store.apply_rating(3)
+
+        stale.store_name = 'Acme Tools'
+        stale.save()
+
+        store = Store.objects.get(pk=self.store.pk)
+        self.assertEqual(store.store_name, 'Acme Tools')
+        self.assertEqual((store.rating_sum, store.rating_count), (8, 2))
+        self.assertEqual(store.rating_histogram[5], 1)
+
+    def test_retracting_from_drifted_aggregates_stops_at_zero(self):
+        self.store.retract_rating(4)
+        store = Store.objects.get(pk=self.store.pk)
+        self.assertEqual((store.rating_sum, store.rating_count, store.score_4_count), (0, 0, 0))
+
+
+class ValuesParityTests(StoreTestCase):
+    def test_values_path_renders_the_same_json(self):
+        theme = StoreTheme.objects.create(
+            theme_id='theme_store_acme', logo_url='cas/ab/cd/logo.png',
+            logo_variants=[{'name': 'variants/stores/logo.webp', 'width': 64, 'height': 64, 'format': 'webp'}],
+        )
+        Store.objects.get(pk=self.store.pk).update_theme(theme)
+        self.store.apply_rating(4)
+        seller = User.objects.create_user('seller', 'seller@example.com', 'pw', role='SELLER')
+        Store.objects.create(store_name='No Theme', user=seller)
+        request = Request(RequestFactory().get('/api/stores/'))
+
+        queryset = Store.objects.select_related('theme', 'user').order_by('pk')
+        values, regular = render_both(StoreValuesSerializer, queryset, {'request': request})
+
+        self.assertEqual(values, regular)
+
+
+class StorefrontPageTests(StoreTestCase):
+    def test_like_count_is_fresh_after_a_like(self):
+        product = Product.objects.create(product_id='widget', name='Widget', price=5, category='tools', store=self.store)
+        self.client.get('/api/stores/acme/page/')
+
+        ProductLike.objects.create(user=self.owner, product=product)
+        self.client.force_authenticate(self.owner)
+        result = self.client.get('/api/stores/acme/page/').json()['products']['results'][0]
+
+        self.assertEqual((result['like_count'], result['is_liked']), (1, True))
+
+
+class StoreCreateTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('maker', 'maker@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def png(self):
+        output = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(output, 'PNG')
+        return SimpleUploadedFile('logo.png', output.getvalue(), content_type='image/png')
+
+    def test_corrupt_image_is_rejected_before_anything_is_saved(self):
+        corrupt = SimpleUploadedFile('logo.png', b'\x89PNG not really', content_type='image/png')
+
+        response = self.client.post('/api/stores/create/', {'store_name': 'Acme', 'logo_url': corrupt})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Store.objects.exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.role, 'BUYER')
+
+    def test_store_is_created_after_a_failed_attempt(self):
+        self.client.post('/api/stores/create/', {'store_name': 'Acme', 'logo_url': SimpleUploadedFile('logo.png', b'junk')})
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/stores/create/', {'store_name': 'Acme', 'logo_url': self.png()})
+
+        self.assertEqual(response.status_code, 201)
+        store = Store.objects.select_related('theme').get()
+        self.assertTrue(store.theme.logo_url)
+        # Variants render in the background once the store is committed
+        self.assertEqual(len(callbacks), 1)
+
+    def test_theme_images_are_rendered_after_the_update(self):
+        self.client.post('/api/stores/create/', {'store_name': 'Acme', 'logo_url': self.png()})
+        store = Store.objects.get()
+
+        with mock.patch.object(StoreTheme, 'generate_variants') as generate_variants, \
+                self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(f'/api/stores/{store.subdomain_name}/theme/', {'banner_url': self.png()})
+            self.assertEqual(response.status_code, 200)
+            generate_variants.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        with mock.patch('stores.api_views.run_in_background', lambda task, *args: task(*args)), \
+                mock.patch.object(StoreTheme, 'generate_variants') as generate_variants:
+            callbacks[0]()
+        generate_variants.assert_called_once_with(['banner_url'])
+
+
+class SellerEndpointQueryTests(TestCase):
+    """
+    Queries per seller endpoint once the authentication principal is cached.
+
+    The seller's store comes from request.seller, so no endpoint loads the
+    store row except UserStoreView, which renders it.
+    """
+
+    def setUp(self):
+        cache.clear()
+        principal_cache.clear()
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'pw', role='SELLER')
+        self.store = Store.objects.create(store_name='Acme', user=self.seller)
+        Store.objects.get(pk=self.store.pk).update_theme(StoreTheme.objects.create(theme_id='theme_store_acme'))
+        Product.objects.create(product_id='widget', name='Widget', price=5, stock=10, category='tools', store=self.store)
+        buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        for _ in range(3):
+            self.order = Order.objects.create(user=buyer, total_amount=5, payment_status='PAID')
+            OrderItem.objects.create(order=self.order, product_id='widget', store=self.store, quantity=1, price=5)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(self.seller)}")
+        # Caches the principal, the user and their store
+        self.client.get('/api/users/profile/')
+
+    def assertQueries(self, expected, method, url, data=None, status=200, store_loads=0):
+        with record_queries() as recorder:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, response.content)
+        self.assertEqual(recorder.count, expected, recorder.report())
+        loads = sum(count for shape, count in recorder.shapes.items() if shape.startswith('SELECT "stores_store"."id"'))
+        self.assertEqual(loads, store_loads, recorder.report())
+        return response
+
+    def test_seller_order_list(self):
+        # Count and page across live and archived orders, the page's orders
+        # with their buyers, their items
+        response = self.assertQueries(4, 'get', '/api/orders/seller-orders/')
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_seller_order_detail(self):
+        # Order with its buyer, its items
+        self.assertQueries(2, 'get', f'/api/orders/seller-orders/{self.order.order_id}/')
+
+    def test_seller_order_update_status(self):
+        # Order, ownership check, update, stores to invalidate, buyer and
+        # their notification, then the items to render
+        self.assertQueries(
+            7, 'put', f'/api/orders/seller-orders/{self.order.order_id}/update-status/', {'status': 'SHIPPED'},
+        )
+
+    def test_sales_report_list(self):
+        self.assertQueries(1, 'get', '/api/notifications/reports/')
+
+    def test_generate_report(self):
+        self.assertQueries(1, 'post', '/api/notifications/reports/generate/', {}, status=201)
+
+    def test_product_create(self):
+        self.assertQueries(
+            1, 'post', '/api/products/create/',
+            {'name': 'Lamp', 'price': '9.99', 'stock': 3, 'category': 'lighting'}, status=201,
+        )
+
+    def test_user_store(self):
+        response = self.assertQueries(1, 'get', '/api/users/profile/store/', store_loads=1)
+        self.assertEqual(response.json()['theme']['theme_id'], 'theme_store_acme')
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        store_cache.clear()
+        cache.clear()
+        self.client = APIClient()
+        # Cached pages for the new stores to invalidate, as in production
+        for query in ({}, {'search': 'store'}):
+            self.client.get('/api/stores/', query)
+
+    def grow(self, size):
+        for n in range(Store.objects.count(), size):
+            seller = User.objects.create(username=f'seller{n}', email=f'seller{n}@example.com', role='SELLER')
+            store = Store.objects.create(store_name=f'Store {n}', user=seller)
+            Store.objects.get(pk=store.pk).update_theme(StoreTheme.objects.create(theme_id=f'theme_store_{n}'))
+
+    def fetch(self, query):
+        # Each new store invalidates the cached lists, so every fetch is built
+        response = self.client.get('/api/stores/', query)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+
+    def test_store_list(self):
+        assert_query_budget(StoreListView, lambda: self.fetch({}), self.grow)
+
+    def test_store_search(self):
+        assert_query_budget(StoreListView, lambda: self.fetch({'search': 'store'}), self.grow)
@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from .models import Store, StoreTheme, Rating
 from .forms import StoreCreationForm, StoreEditForm, StoreThemeForm, RatingForm
 
@@ -56,6 +57,9 @@ def create_store_view(request):
                 theme.banner_url = request.FILES['banner_url']
             
             theme.save()
+            uploaded = [field for field in ('logo_url', 'banner_url') if field in request.FILES]
+            if uploaded:
+                theme.generate_variants(uploaded)
             store.theme = theme
             store.save()
             
@@ -123,7 +127,10 @@ def store_theme_view(request, subdomain):
     if request.method == 'POST':
         form = StoreThemeForm(request.POST, request.FILES, instance=theme)
         if form.is_valid():
-            form.save()
+            theme = form.save()
+            uploaded = [field for field in ('logo_url', 'banner_url') if field in request.FILES]
+            if uploaded:
+                theme.generate_variants(uploaded)
             messages.success(request, 'Store theme updated successfully.')
             return redirect('stores:detail', subdomain=subdomain)
         else:
@@ -149,6 +156,7 @@ def rate_store_view(request, subdomain):
     
     # Check if user already rated this store
     existing_rating = Rating.objects.filter(user=request.user, store=store).first()
+    previous_score = existing_rating.score if existing_rating else None
     
     if request.method == 'POST':
         if existing_rating:
@@ -161,7 +169,9 @@ def rate_store_view(request, subdomain):
             rating.user = request.user
             rating.store = store
             rating.rating_id = f"rating_{request.user.id}_{store.store_id}"
-            rating.save()
+            with transaction.atomic():
+                rating.save()
+                store.apply_rating(rating.score, previous_score=previous_score)
             messages.success(request, 'Rating submitted successfully.')
             return redirect('stores:ratings', subdomain=subdomain)
         else:
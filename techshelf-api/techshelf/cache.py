@@ -0,0 +1,257 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.connection import ConnectionProxy
+from rest_framework.response import Response
+
+from .conditional import apply_validators, is_not_modified, not_modified_response, validators
+from .replicas import reading_from_replica, use_primary
+
+# Tag versions and recompute locks live in the shared cache, which every
+# worker sees; the responses themselves stay in the default cache
+shared_cache = ConnectionProxy(caches, 'shared')
+
+# Tag keys never expire on their own; each holds the time the tag was last bumped
+TAG_PREFIX = 'tag:'
+RESPONSE_PREFIX = 'response:'
+LOCK_PREFIX = 'lock:'
+# When any tag was last bumped
+LAST_BUMP_KEY = 'tags:last-bump'
+
+# Response cache keys being recomputed by a thread of this process
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class CacheStats:
+    """Per-process hit/miss counters, keyed by view name"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, name, outcome):
+        with self._lock:
+            self._counts[(name, outcome)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        result = {}
+        for (name, outcome), count in sorted(counts.items()):
+            result.setdefault(name, {})[outcome] = count
+        return result
+
+
+response_cache_stats = CacheStats()
+
+
+def tag_key(tag):
+    return f"{TAG_PREFIX}{tag}"
+
+
+def bump_tags(*tags):
+    """Invalidate every cached response carrying any of the given tags"""
+    now = time.time()
+    shared_cache.set_many({tag_key(tag): now for tag in tags}, None)
+    shared_cache.set(LAST_BUMP_KEY, now, None)
+
+
+def bumped_recently(seconds):
+    last_bump = shared_cache.get(LAST_BUMP_KEY)
+    return last_bump is not None and time.time() - last_bump < seconds
+
+
+def tag_versions(tags, default=None):
+    """
+    When each tag was last bumped.
+
+    Unknown tags are recorded as bumped at ``default`` (now if not given);
+    add() keeps the first value written across workers.
+    """
+    keys = {tag_key(tag): tag for tag in tags}
+    found = shared_cache.get_many(list(keys))
+    versions = {}
+    for key, tag in keys.items():
+        if key not in found:
+            shared_cache.add(key, default if default is not None else time.time(), None)
+            found[key] = shared_cache.get(key)
+        versions[tag] = found[key]
+    return versions
+
+
+def lock_key(key):
+    return f"{LOCK_PREFIX}{key}"
+
+
+def response_cache_key(request, name):
+    # Responses contain absolute URLs, so the host is part of the key
+    digest = hashlib.md5(f"{request.get_host()}{request.get_full_path()}".encode()).hexdigest()
+    return f"{RESPONSE_PREFIX}{name}:{digest}"
+
+
+class CachedResponseMixin:
+    """
+    Cache a view's GET response data until one of its tags is bumped.
+
+    Views return their tags from get_cache_tags(data), e.g. 'catalog' and
+    'product:<id>', and model signals call bump_tags(). An entry is fresh if
+    no tag has been bumped since it was computed. Cached data is shared by
+    all users, so per-user fields are filled in by personalize() on hits.
+
+    Misses are computed once: one request per key recomputes (a threading
+    Event within the process, an add() lock in the shared cache across
+    workers) while the others serve the stale entry if there is one, or wait
+    for the result. Entries live for RESPONSE_CACHE_TIMEOUT unless bumped, so
+    views must build them from the database, not from per-process copies
+    such as request.store.
+
+    Responses carry an ETag derived from the entry and the user's tags
+    (get_user_tags), so a matching If-None-Match is answered with 304
+    straight from the cache entry.
+    """
+    cache_timeout = None
+
+    def get_cache_tags(self, data):
+        return ['catalog']
+
+    def get_user_tags(self, request):
+        """Tags covering the per-user fields that personalize() fills in"""
+        return []
+
+    def personalize(self, request, data):
+        return data
+
+    def get_cache_name(self):
+        return self.__class__.__name__
+
+    def entry_is_fresh(self, entry):
+        if entry['expires_at'] <= time.time():
+            return False
+        # A tag missing here was evicted and may have been bumped since, so it
+        # counts as bumped now and the entry is recomputed
+        versions = tag_versions(entry['tags'])
+        return all(version is not None and version < entry['created_at'] for version in versions.values())
+
+    def entry_validators(self, request, created_at, user_versions=None):
+        if user_versions is None:
+            user_versions = tag_versions(self.get_user_tags(request))
+        return validators(request, dict(user_versions, response=created_at))
+
+    def cached_response(self, request, entry, outcome):
+        response_cache_stats.record(self.get_cache_name(), outcome)
+        etag, last_modified = self.entry_validators(request, entry['created_at'])
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        response = Response(self.personalize(request, entry['data']))
+        response['X-Cache'] = outcome.upper()
+        return apply_validators(response, etag, last_modified)
+
+    def get(self, request, *args, **kwargs):
+        key = response_cache_key(request, self.get_cache_name())
+        entry = cache.get(key)
+        if entry is not None and self.entry_is_fresh(entry):
+            return self.cached_response(request, entry, 'hit')
+
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = threading.Event()
+
+        if not leader:
+            # Another thread in this worker is already recomputing
+            if entry is not None:
+                return self.cached_response(request, entry, 'stale')
+            flight.wait(settings.RESPONSE_CACHE_LOCK_TIMEOUT)
+            return self.get_after_wait(request, key, *args, **kwargs)
+
+        try:
+            lock = lock_key(key)
+            token = uuid.uuid4().hex
+            if shared_cache.add(lock, token, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+                try:
+                    return self.compute_response(request, key, *args, **kwargs)
+                finally:
+                    if shared_cache.get(lock) == token:
+                        shared_cache.delete(lock)
+
+            # Another worker holds the lock
+            if entry is not None:
+                return self.cached_response(request, entry, 'stale')
+            deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+            while time.monotonic() < deadline and shared_cache.get(lock) is not None:
+                time.sleep(settings.RESPONSE_CACHE_POLL_INTERVAL)
+            return self.get_after_wait(request, key, *args, **kwargs)
+        finally:
+            with _flights_lock:
+                _flights.pop(key, None)
+            flight.set()
+
+    def get_after_wait(self, request, key, *args, **kwargs):
+        entry = cache.get(key)
+        if entry is not None and self.entry_is_fresh(entry):
+            return self.cached_response(request, entry, 'coalesced')
+        # The other computation failed or timed out
+        return self.compute_response(request, key, *args, **kwargs)
+
+    def compute_response(self, request, key, *args, **kwargs):
+        response_cache_stats.record(self.get_cache_name(), 'miss')
+        # Read before computing, so the ETag never claims newer per-user state than the body has
+        user_versions = tag_versions(self.get_user_tags(request))
+        created_at = time.time()
+        if reading_from_replica() and bumped_recently(settings.REPLICA_MAX_LAG):
+            # A replica may not have the write behind the bump yet, and the
+            # entry would keep its stale data until the next bump
+            with use_primary():
+                response = super().get(request, *args, **kwargs)
+        else:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            apply_validators(response, *self.entry_validators(request, created_at, user_versions))
+            timeout = self.cache_timeout if self.cache_timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+            tags = list(self.get_cache_tags(response.data))
+            # Tags nobody has bumped yet did not change while this response was built
+            tag_versions(tags, default=created_at - 0.001)
+            # Kept past its expiry so it can be served stale while being recomputed
+            cache.set(key, {
+                'data': response.data,
+                'tags': tags,
+                'created_at': created_at,
+                'expires_at': created_at + timeout,
+            }, timeout + settings.RESPONSE_CACHE_STALE_SECONDS)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs from tag versions before the view does any work.
+
+    get_etag_tags() names the tags covering everything in the response,
+    including per-user state. Returning None skips conditional handling,
+    e.g. when the object does not exist.
+    """
+
+    def get_etag_tags(self, request, *args, **kwargs):
+        return None
+
+    def get(self, request, *args, **kwargs):
+        tags = self.get_etag_tags(request, *args, **kwargs)
+        if not tags:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = validators(request, tag_versions(tags))
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            apply_validators(response, etag, last_modified)
+        return response
+
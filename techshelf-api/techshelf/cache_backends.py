@@ -0,0 +1,75 @@
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connections, models, router
+from django.db.migrations.operations.base import Operation
+
+
+class NonEvictingDatabaseCache(DatabaseCache):
+    """
+    Database cache that only ever deletes expired entries.
+
+    DatabaseCache culls a fraction of the live entries once the table holds
+    more than MAX_ENTRIES; here MAX_ENTRIES only decides when expired rows
+    are purged, and live ones stay until they expire, however many there are.
+    """
+
+    def _cull(self, db, cursor, now, num):
+        connection = connections[db]
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(self._table)} WHERE {connection.ops.quote_name('expires')} < %s",
+            [connection.ops.adapt_datetimefield_value(now)],
+        )
+
+
+class CreateCacheTable(Operation):
+    """
+    Migration operation creating a DatabaseCache table named in the migration.
+
+    Unlike calling createcachetable, the schema does not depend on CACHES at
+    migrate time and the operation can be reversed. The layout is the one
+    createcachetable uses; a table that already exists, e.g. one created by
+    hand with createcachetable, is left alone.
+    """
+    reversible = True
+
+    def __init__(self, table):
+        self.table = table
+
+    def deconstruct(self):
+        return self.__class__.__name__, [self.table], {}
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def fields(self):
+        return (
+            models.CharField(name='cache_key', max_length=255, primary_key=True),
+            models.TextField(name='value'),
+            models.DateTimeField(name='expires'),
+        )
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if not router.allow_migrate(connection.alias, app_label):
+            return
+        if self.table in connection.introspection.table_names():
+            return
+        quote = schema_editor.quote_name
+        columns = ', '.join(
+            f"{quote(field.name)} {field.db_type(connection)} NOT NULL{' PRIMARY KEY' if field.primary_key else ''}"
+            for field in self.fields()
+        )
+        schema_editor.execute(f"CREATE TABLE {quote(self.table)} ({columns})")
+        schema_editor.execute(f"CREATE INDEX {quote(f'{self.table}_expires')} ON {quote(self.table)} ({quote('expires')})")
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if not router.allow_migrate(connection.alias, app_label):
+            return
+        schema_editor.execute(f"DROP TABLE IF EXISTS {schema_editor.quote_name(self.table)}")
+
+    def describe(self):
+        return f"Create cache table {self.table}"
+
+    @property
+    def migration_name_fragment(self):
+        return f"create_{self.table}"
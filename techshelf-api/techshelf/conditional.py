@@ -0,0 +1,55 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+# HTTP validators (ETag / Last-Modified) computed from version timestamps,
+# such as the tag versions kept by techshelf.cache
+
+
+def validators(request, versions):
+    """
+    ETag and Last-Modified for a response built from data at the given tag versions.
+
+    The requesting user and URL are part of the ETag, so a validator
+    obtained by one user never matches another user's response. So is the
+    current CONDITIONAL_GET_MAX_AGE period: validators expire with it, and a
+    change whose tag bump was lost (an evicted version) is sent in full by
+    the next period at the latest.
+    """
+    period = settings.CONDITIONAL_GET_MAX_AGE
+    period_start = time.time() // period * period
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    state = repr((user, request.get_full_path(), sorted(versions.items()), period_start))
+    etag = f'"{hashlib.md5(state.encode()).hexdigest()}"'
+    return etag, max(max(versions.values()), period_start)
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        return etag in {tag.strip() for tag in if_none_match.split(',')}
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    # HTTP dates have one-second resolution, so a change in the same second
+    # as the client's copy must not count as unmodified
+    return if_modified_since is not None and math.floor(last_modified) < if_modified_since
+
+
+def apply_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(math.floor(last_modified))
+    # Responses depend on the user, and clients must revalidate before reuse
+    patch_vary_headers(response, ('Authorization',))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    return apply_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
@@ -0,0 +1,148 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# (file extension, Pillow format)
+VARIANT_FORMATS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+_executor = None
+_background = None
+
+
+def get_executor(max_workers=None):
+    """Process pool shared by all image work in this process, created on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max_workers or settings.IMAGE_WORKERS)
+    return _executor
+
+
+def run_in_background(func, *args):
+    """
+    Run func(*args) on a background thread of this process.
+
+    Jobs are lost if the process exits before they finish, so anything
+    scheduled here must also be recoverable by a backfill command.
+    """
+    global _background
+    if _background is None:
+        _background = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix='imaging')
+
+    def job():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception(f"Background image job {func.__name__} failed")
+        finally:
+            connections.close_all()
+
+    return _background.submit(job)
+
+
+def render_variant(source, width, image_format, quality):
+    """
+    Resize an encoded image to at most ``width`` pixels wide and re-encode it.
+
+    Runs in a worker process, so it only deals in bytes. Returns
+    ``(width, height, data)`` of the rendered variant.
+    """
+    with Image.open(io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            # JPEG has no alpha channel; flatten onto white
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        output = io.BytesIO()
+        image.save(output, image_format, quality=quality, optimize=True)
+        return image.width, image.height, output.getvalue()
+
+
+def store_variant(prefix, extension, data):
+    """Save variant bytes under their content hash so the URL never changes meaning"""
+    digest = hashlib.sha256(data).hexdigest()[:24]
+    name = f"{settings.IMAGE_VARIANT_PREFIX}/{prefix}/{digest}.{extension}"
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def read_source(field_file):
+    """Encoded bytes of a stored image"""
+    field_file.open('rb')
+    try:
+        return field_file.read()
+    finally:
+        field_file.close()
+
+
+def render_variant_sets(source, widths, prefix):
+    """
+    Render encoded image bytes at each width in every variant format.
+
+    Resizing is spread over the process pool. Returns ``{width: [variant, ...]}``
+    where each variant is a ``{'name', 'width', 'height', 'format'}`` dict.
+    """
+    executor = get_executor()
+    jobs = [
+        (target, extension, executor.submit(render_variant, source, target, image_format, settings.IMAGE_VARIANT_QUALITY))
+        for target in widths
+        for extension, image_format in VARIANT_FORMATS
+    ]
+
+    sets = {target: [] for target in widths}
+    for target, extension, future in jobs:
+        width, height, data = future.result()
+        sets[target].append({
+            'name': store_variant(prefix, extension, data),
+            'width': width,
+            'height': height,
+            'format': extension,
+        })
+    return sets
+
+
+def generate_variants(field_file, widths, prefix):
+    """Flat list of an uploaded image's variants at the given widths, sorted by width"""
+    if not field_file:
+        return []
+
+    variants = {}
+    for variant_set in render_variant_sets(read_source(field_file), widths, prefix).values():
+        # Sources narrower than several target widths render identical variants
+        for variant in variant_set:
+            variants[variant['name']] = variant
+
+    return sorted(variants.values(), key=lambda variant: (variant['width'], variant['format']))
+
+
+def variant_urls(variants, request=None):
+    """Public representation of stored variants: URL plus width/height hints"""
+    result = []
+    for variant in variants or []:
+        url = default_storage.url(variant['name'])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        result.append({
+            'url': url,
+            'width': variant['width'],
+            'height': variant['height'],
+            'format': variant['format'],
+        })
+    return result
@@ -0,0 +1,96 @@
+import json
+import re
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connections
+from django.utils import timezone
+
+# SQLite reports a full table scan as "SCAN <table>"; "SCAN <table> USING INDEX"
+# walks an index in order and stops at the LIMIT
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)\s*$')
+
+
+def hot_querysets():
+    """The querysets behind the busiest endpoints and jobs, by name"""
+    from notifications.models import Notification, SalesReport
+    from orders.archive import archivable_orders
+    from orders.models import ArchivedOrder, CartItem, Order, OrderItem
+    from orders.services import OrderService
+    from products.models import Product
+    from stores.models import Store
+
+    # Plans do not depend on whether these rows exist
+    user_pk, store = 0, Store(pk=0)
+    today = date.today()
+    return {
+        'product list': Product.objects.order_by('-created_at')[:10],
+        'product list by category': Product.objects.filter(category='').order_by('-created_at')[:10],
+        'product list by price': Product.objects.order_by('price')[:10],
+        'store products': Product.objects.filter(store=store).order_by('-created_at')[:10],
+        'order history': Order.objects.filter(user_id=user_pk).order_by('-created_at')[:10],
+        'archived order history': ArchivedOrder.objects.filter(user_id=user_pk).order_by('-created_at')[:10],
+        'orders to archive': archivable_orders(settings.ORDER_ARCHIVE_AFTER_DAYS).order_by('pk')[:500],
+        'pending orders': Order.objects.filter(payment_status='PENDING').order_by('created_at')[:10],
+        'seller orders': OrderService.seller_orders(store.pk)[:10],
+        'seller archived orders': OrderService.seller_archived_orders(store.pk)[:10],
+        'order items by product': OrderItem.objects.filter(product_id=''),
+        'sales report items': SalesReport.paid_order_items(store, today - timedelta(days=30), today),
+        'sales report archived items': SalesReport.paid_archived_order_items(store, today - timedelta(days=30), today),
+        'sales reports': SalesReport.objects.filter(store=store).order_by('-report_date')[:10],
+        'cart item lookup': CartItem.objects.filter(cart_id=0, product_id=''),
+        'notifications': Notification.objects.filter(user_id=user_pk).order_by('-created_at')[:10],
+        'unread notifications': Notification.objects.filter(user_id=user_pk, is_read=False).order_by('-created_at')[:10],
+        'notifications to prune': Notification.objects.filter(
+            is_read=True, created_at__lt=timezone.now() - timedelta(days=90)
+        ).order_by('created_at')[:1000],
+    }
+
+
+def _postgresql_scans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield node['Relation Name']
+    for child in node.get('Plans', []):
+        yield from _postgresql_scans(child)
+
+
+def sequential_scans(queryset):
+    """Tables the database would read in full to run the queryset, and its plan"""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        plan = queryset.explain(format='json')
+        tables = set(_postgresql_scans(json.loads(plan)[0]['Plan']))
+    elif vendor == 'sqlite':
+        plan = queryset.explain()
+        tables = {match.group(1) for line in plan.splitlines() if (match := SQLITE_SCAN.search(line))}
+    else:
+        raise CommandError(f"Query plans are not checked on {vendor}")
+    return tables, plan
+
+
+def estimated_rows(table, using):
+    """Row count of a table: the planner's estimate on PostgreSQL, an exact count elsewhere"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        else:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def check_plans(min_rows, querysets=None):
+    """
+    (name, table, rows, plan) for every hot queryset that would read a
+    table of at least min_rows rows in full.
+    """
+    failures = []
+    for name, queryset in (querysets or hot_querysets()).items():
+        tables, plan = sequential_scans(queryset)
+        for table in sorted(tables):
+            rows = estimated_rows(table, queryset.db)
+            if rows >= min_rows:
+                failures.append((name, table, rows, plan))
+    return failures
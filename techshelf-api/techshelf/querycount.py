@@ -0,0 +1,181 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.db import BaseDatabaseCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# IN lists differ in length from one call to the next but are the same query
+IN_LIST = re.compile(r'IN \(%s(?:, %s)*\)')
+# Transaction bookkeeping, e.g. around the database cache backend's writes,
+# which only shows up as SQL inside an outer transaction such as a test's
+SAVEPOINT = re.compile(r'(?:RELEASE |ROLLBACK TO )?SAVEPOINT ')
+
+
+def query_shape(sql):
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def cache_tables():
+    """Tables of the database cache aliases, whose queries are cache lookups rather than data access"""
+    return tuple(
+        config['LOCATION'] for config in settings.CACHES.values()
+        if issubclass(import_string(config['BACKEND']), BaseDatabaseCache)
+    )
+
+
+class QueryRecorder:
+    """
+    Count, time and group by shape the SQL run on every database connection.
+
+    Used as an execute_wrapper, so it sees queries after the ORM has built
+    them and before the backend runs them. Parameters stay out of the SQL,
+    so a query run once per row shows up as one shape run many times.
+    Queries made by the database cache backend are counted and timed apart,
+    in cache_count and cache_duration: they are round trips to the database
+    all the same, but not data access, so they have no shapes. Savepoints
+    are not recorded, so a request counts the same inside a test's transaction.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.cache_count = 0
+        self.cache_duration = 0.0
+        self.shapes = Counter()
+        self.cache_tables = cache_tables()
+
+    @property
+    def total(self):
+        """Every query run, data and cache"""
+        return self.count + self.cache_count
+
+    def __call__(self, execute, sql, params, many, context):
+        if SAVEPOINT.match(sql):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.cache_tables and any(table in sql for table in self.cache_tables):
+                self.cache_duration += elapsed
+                self.cache_count += 1
+            else:
+                self.duration += elapsed
+                self.count += 1
+                self.shapes[query_shape(sql)] += 1
+
+    def duplicates(self, threshold=2):
+        """Shapes run at least threshold times, most repeated first"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def report(self):
+        lines = [
+            f"{self.count} queries in {self.duration * 1000:.1f}ms, "
+            f"and {self.cache_count} cache queries in {self.cache_duration * 1000:.1f}ms"
+        ]
+        lines += [f"  {count}x {shape}" for shape, count in self.duplicates()]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries():
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(budget):
+    """Fail if the block runs more than budget queries, cache queries included"""
+    with record_queries() as recorder:
+        yield recorder
+    if recorder.total > budget:
+        raise QueryBudgetExceeded(f"Query budget of {budget} exceeded: {recorder.report()}")
+
+
+def assert_query_budget(view_class, fetch, grow, sizes=(1, 10, 50)):
+    """
+    Check a view stays within its ``query_budget`` however much data there is.
+
+    For each size, grow(size) brings the fixtures up to that many rows and
+    fetch() requests the view, e.g. ``lambda: client.get(url)``. Fails when
+    a request exceeds the budget, or when the query count grows with the
+    data, which is how an N+1 query shows up before it hits the budget.
+    """
+    budget = view_class.query_budget
+    counts = []
+    for size in sizes:
+        grow(size)
+        with query_budget(budget) as recorder:
+            fetch()
+        counts.append(recorder.total)
+        if recorder.total > counts[0]:
+            raise QueryBudgetExceeded(
+                f"{view_class.__name__} ran {counts[0]} queries with {sizes[0]} rows "
+                f"but {recorder.total} with {size}: {recorder.report()}"
+            )
+    return counts
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Report each request's SQL in Server-Timing and X-Query-Count headers.
+
+    Enabled with QUERY_INSTRUMENTATION (on when DEBUG is). Query shapes run
+    QUERY_DUPLICATE_THRESHOLD or more times in one request are logged as
+    likely N+1 queries and counted in X-Duplicate-Queries, and requests
+    over their view's ``query_budget`` are logged too.
+
+    Server-Timing times data queries (db) and database cache queries (cache)
+    apart; X-Query-Count and the budget count both, each being a round trip.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        duplicates = recorder.duplicates(settings.QUERY_DUPLICATE_THRESHOLD)
+        for shape, count in duplicates:
+            logger.warning(f"{request.method} {request.path} ran the same query {count} times: {shape}")
+        if request.query_budget is not None and recorder.total > request.query_budget:
+            logger.warning(
+                f"{request.method} {request.path} ran {recorder.total} queries, "
+                f"over its budget of {request.query_budget}"
+            )
+
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+            f'cache;dur={recorder.cache_duration * 1000:.1f};desc="{recorder.cache_count} queries", '
+            f'total;dur={total * 1000:.1f}'
+        )
+        response['X-Query-Count'] = str(recorder.total)
+        response['X-Duplicate-Queries'] = str(len(duplicates))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request.query_budget = getattr(view_class, 'query_budget', None)
+        return None
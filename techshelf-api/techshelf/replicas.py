@@ -0,0 +1,184 @@
+import contextvars
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+STICKY_PREFIX = 'sticky:'
+
+# Whether reads in the current request (or block) may go to a replica, and
+# whether it has written anything yet
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+@contextmanager
+def use_read_replica(enabled=True):
+    """Send reads inside the block to a replica (or, with enabled=False, to the primary)"""
+    token = _routing.set(RoutingState(enabled))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def use_primary():
+    return use_read_replica(False)
+
+
+def reading_from_replica():
+    state = _routing.get()
+    return state is not None and state.use_replica and not state.wrote
+
+
+class ReplicaHealth:
+    """
+    Per-process view of which replicas are usable.
+
+    A replica is checked at most every REPLICA_HEALTH_CHECK_INTERVAL seconds:
+    it must answer, and on PostgreSQL its replay lag must stay under
+    REPLICA_MAX_LAG. Replicas failing the check are skipped until the next
+    check, and with none left reads fall back to the primary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}
+
+    def check(self, alias):
+        try:
+            with connections[alias].cursor() as cursor:
+                if connections[alias].vendor == 'postgresql':
+                    # Time since the last replayed transaction, counted only while WAL
+                    # is waiting to be replayed (an idle primary sends none)
+                    cursor.execute(
+                        "SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                        "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END, 0)"
+                    )
+                    lag = float(cursor.fetchone()[0])
+                else:
+                    cursor.execute("SELECT 1")
+                    lag = 0.0
+        except Exception as e:
+            logger.warning(f"Replica {alias} failed its health check: {e}")
+            return False
+        if lag > settings.REPLICA_MAX_LAG:
+            logger.warning(f"Replica {alias} is {lag:.1f}s behind, reading from the primary")
+            return False
+        return True
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        healthy, checked_at = self._status.get(alias, (True, None))
+        if checked_at is None or now - checked_at >= settings.REPLICA_HEALTH_CHECK_INTERVAL:
+            # One thread checks; the others use the previous result meanwhile
+            if self._lock.acquire(blocking=False):
+                try:
+                    healthy = self.check(alias)
+                    self._status[alias] = (healthy, now)
+                finally:
+                    self._lock.release()
+        return healthy
+
+    def healthy_replicas(self):
+        return [alias for alias in settings.DATABASE_REPLICAS if self.is_healthy(alias)]
+
+
+replica_health = ReplicaHealth()
+
+
+def is_cache_model(model):
+    # DatabaseCache's stand-in model
+    return model._meta.app_label == 'django_cache'
+
+
+class ReplicaRouter:
+    """
+    Reads go to a healthy replica inside use_read_replica(); everything else uses the primary.
+
+    A write pins the rest of the request to the primary, so it reads its
+    own writes. Migrations only run on the primary, as do the database
+    caches (SHARED_CACHE_BACKEND and REVOCATION_CACHE_BACKEND=db), whose
+    writes do not pin anything.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not reading_from_replica() or is_cache_model(model):
+            return DEFAULT_DB_ALIAS
+        replicas = replica_health.healthy_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None and not is_cache_model(model):
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def sticky_key(request):
+    """Cache key identifying the client, or None for anonymous requests"""
+    credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return f"{STICKY_PREFIX}{hashlib.sha256(credentials.encode()).hexdigest()}"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Route safe requests to views marked ``read_replica = True`` to a replica.
+
+    After a client's unsafe request succeeds, its reads stay on the primary
+    for REPLICA_STICKY_SECONDS, so they see its own writes however far the
+    replicas lag. Clients are told apart by their Authorization header or
+    session cookie, since the middleware runs before DRF authentication. The
+    flag is kept in the shared cache, as the client's next request may go
+    to another worker.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _routing.set(RoutingState())
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if settings.DATABASE_REPLICAS and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            key = sticky_key(request)
+            if key is not None:
+                caches['shared'].set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.DATABASE_REPLICAS or request.method not in ('GET', 'HEAD'):
+            return None
+        view_class = getattr(view_func, 'view_class', None)
+        if not getattr(view_class, 'read_replica', False):
+            return None
+        key = sticky_key(request)
+        if key is not None and caches['shared'].get(key):
+            return None
+        _routing.get().use_replica = True
+        return None
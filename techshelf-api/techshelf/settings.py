@@ -1,7 +1,9 @@
 from pathlib import Path
 from datetime import timedelta
+import importlib.util
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -35,12 +37,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'techshelf.querycount.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'stores.middleware.StoreResolverMiddleware',
+    'stores.middleware.SellerContextMiddleware',
+    'techshelf.replicas.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -92,16 +98,26 @@ if 'DATABASE_URL' not in os.environ:
         'PORT': os.environ.get('DB_PORT', '5432'),
     }
 
+# Read replicas, as a comma-separated list of database URLs (techshelf.replicas)
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    # Tests use the primary for replica reads
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['techshelf.replicas.ReplicaRouter']
+
 AUTH_USER_MODEL = 'users.User'
 
+# EmailBackend also accepts usernames, so no second backend (and query) is needed
 AUTHENTICATION_BACKENDS = [
     'users.backends.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -112,6 +128,20 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Reverse proxies in front of the app. Anonymous requests are throttled per
+    # client IP, which DRF takes from the address this many proxies back in
+    # X-Forwarded-For; with 0 it is REMOTE_ADDR, as the header can be forged
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
+    # Only views with a throttle_scope are limited (techshelf.throttling)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'techshelf.throttling.ScopedSlidingWindowThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '10/min'),
+        'checkout': os.environ.get('THROTTLE_CHECKOUT_RATE', '10/min'),
+        'like': os.environ.get('THROTTLE_LIKE_RATE', '60/min'),
+        'search': os.environ.get('THROTTLE_SEARCH_RATE', '60/min'),
+    },
 }
 
 # JWT settings
@@ -133,7 +163,9 @@ SIMPLE_JWT = {
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
 
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    # Revocable through users.revocation instead of the blacklist app
+    'AUTH_TOKEN_CLASSES': ('users.tokens.RevocableAccessToken',),
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.TokenRefreshSerializer',
     'TOKEN_TYPE_CLAIM': 'token_type',
 
     'JTI_CLAIM': 'jti',
@@ -167,4 +199,230 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+# Uploads are stored once per distinct content under MEDIA_ROOT/CAS_PREFIX
+# (python manage.py media_gc removes blobs nothing references)
+# MEDIA_STORAGE=s3 keeps media in an S3-compatible bucket instead (needs boto3)
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'local')
+STORAGES = {
+    'default': {
+        'BACKEND': 'techshelf.storage.S3Storage' if MEDIA_STORAGE == 's3'
+        else 'techshelf.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+CAS_PREFIX = 'cas'
+CAS_GC_GRACE_SECONDS = 3600
+
+# S3 / MinIO; AWS_S3_ENDPOINT_URL points at a local MinIO, e.g. http://localhost:9000
+AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', 'techshelf-media')
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL', '')
+AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', '')
+AWS_S3_PUBLIC_URL = os.environ.get('AWS_S3_PUBLIC_URL', '')  # bucket URL or CDN; presigned GETs if empty
+AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID', '')
+AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
+AWS_PRESIGNED_EXPIRY = 900  # seconds
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', str(10 * 1024 * 1024)))  # bytes
+UPLOAD_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Email
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = 'noreply@techshelf.com'
+
+# Outbox worker (python manage.py send_outbox --loop)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '100'))
+EMAIL_OUTBOX_RATE_LIMIT = float(os.environ.get('EMAIL_OUTBOX_RATE_LIMIT', '10'))  # messages per second
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF_SECONDS = 60
+EMAIL_OUTBOX_MAX_BACKOFF_SECONDS = 3600
+# How long a worker's claim on a batch lasts; must cover sending a whole batch
+EMAIL_OUTBOX_LEASE_SECONDS = 600
+
+# Notification retention (python manage.py prune_notifications)
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '90'))
+NOTIFICATION_MAX_PER_USER = int(os.environ.get('NOTIFICATION_MAX_PER_USER', '500'))
+NOTIFICATION_PRUNE_BATCH_SIZE = 1000
+
+# Storefronts are served from <subdomain>.STOREFRONT_DOMAIN
+STOREFRONT_DOMAIN = os.environ.get('STOREFRONT_DOMAIN', 'techshelf.com')
+STORE_CACHE_SIZE = 1024
+STORE_CACHE_TTL = int(os.environ.get('STORE_CACHE_TTL', '60'))  # seconds
+STOREFRONT_PAGE_CACHE_TIMEOUT = 30  # seconds
+STOREFRONT_PAGE_RATINGS = 50
+
+# Resized image variants, stored under MEDIA_ROOT/IMAGE_VARIANT_PREFIX by content hash
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+IMAGE_VARIANT_PREFIX = 'variants'
+IMAGE_VARIANT_QUALITY = 82
+STORE_LOGO_WIDTHS = (64, 128, 256)
+STORE_BANNER_WIDTHS = (640, 1280, 1920)
+PRODUCT_IMAGE_SIZES = {'thumbnail': 160, 'card': 400, 'detail': 1024}
+# Shown while a product's variants are being rendered; empty means use the original image
+PRODUCT_IMAGE_PLACEHOLDER_URL = os.environ.get('PRODUCT_IMAGE_PLACEHOLDER_URL', '')
+
+# Shared cache; use the file backend (or another shared backend) when running
+# several workers so response cache invalidation reaches all of them
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache' if CACHE_BACKEND == 'file'
+        else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', '/var/tmp/techshelf_cache' if CACHE_BACKEND == 'file' else 'techshelf'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))},
+    }
+}
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))  # seconds
+RESPONSE_CACHE_STALE_SECONDS = 60  # served stale for this long past expiry while one request recomputes
+RESPONSE_CACHE_LOCK_TIMEOUT = 10  # seconds
+RESPONSE_CACHE_POLL_INTERVAL = 0.05  # seconds
+CONDITIONAL_GET_MAX_AGE = int(os.environ.get('CONDITIONAL_GET_MAX_AGE', '300'))  # seconds an ETag stays valid at most
+if MEDIA_STORAGE == 's3' and not AWS_S3_PUBLIC_URL:
+    # Cached responses then hold presigned image URLs and can be served for
+    # RESPONSE_CACHE_TIMEOUT + RESPONSE_CACHE_STALE_SECONDS; that must pass
+    # well before the URLs expire
+    if RESPONSE_CACHE_TIMEOUT + RESPONSE_CACHE_STALE_SECONDS >= AWS_PRESIGNED_EXPIRY * 2 // 3:
+        raise ImproperlyConfigured('RESPONSE_CACHE_TIMEOUT is too long for presigned media URLs (AWS_PRESIGNED_EXPIRY)')
+
+# State every worker must see the same way: response cache tag versions and
+# recompute locks. 'db' (the default) is a database cache table, created by
+# migrate; 'redis' uses SHARED_CACHE_URL. 'locmem' keeps it per process, which
+# is only correct with a single worker (WEB_CONCURRENCY, as read by gunicorn).
+SHARED_CACHE_BACKEND = os.environ.get('SHARED_CACHE_BACKEND', 'db')
+SHARED_CACHE_URL = os.environ.get('SHARED_CACHE_URL', 'redis://127.0.0.1:6379/1')
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+_SHARED_CACHE_BACKENDS = {
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+if SHARED_CACHE_BACKEND not in _SHARED_CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"SHARED_CACHE_BACKEND must be one of {', '.join(_SHARED_CACHE_BACKENDS)}")
+if SHARED_CACHE_BACKEND == 'redis' and importlib.util.find_spec('redis') is None:
+    raise ImproperlyConfigured("SHARED_CACHE_BACKEND 'redis' requires redis (pip install redis)")
+if SHARED_CACHE_BACKEND == 'locmem' and WEB_CONCURRENCY > 1:
+    raise ImproperlyConfigured('SHARED_CACHE_BACKEND=locmem cannot be shared by several workers; use db or redis')
+CACHES['shared'] = {
+    'BACKEND': _SHARED_CACHE_BACKENDS[SHARED_CACHE_BACKEND],
+    'LOCATION': {'db': 'techshelf_shared_cache', 'redis': SHARED_CACHE_URL, 'locmem': 'techshelf-shared'}[SHARED_CACHE_BACKEND],
+    'KEY_PREFIX': 'shared',
+    # Mostly small, long-lived keys; culling them only costs extra recomputes
+    'OPTIONS': {} if SHARED_CACHE_BACKEND == 'redis' else {'MAX_ENTRIES': 100000},
+}
+
+# Per-process cache of authenticated users and their stores (users.authentication)
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', '4096'))
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', '60'))  # seconds
+
+# Password hashing profile: 'pbkdf2' (Django's default), 'scrypt' or 'argon2'
+# (needs argon2-cffi). The other hashers stay listed so existing hashes keep
+# verifying; check_password() rehashes them with the preferred one at login.
+PASSWORD_HASHER_PROFILE = os.environ.get('PASSWORD_HASHER_PROFILE', 'pbkdf2')
+_PROFILE_HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+}
+if PASSWORD_HASHER_PROFILE not in _PROFILE_HASHERS:
+    raise ImproperlyConfigured(f"PASSWORD_HASHER_PROFILE must be one of {', '.join(_PROFILE_HASHERS)}")
+if PASSWORD_HASHER_PROFILE == 'argon2' and importlib.util.find_spec('argon2') is None:
+    raise ImproperlyConfigured("PASSWORD_HASHER_PROFILE 'argon2' requires argon2-cffi (pip install argon2-cffi)")
+PASSWORD_HASHERS = [_PROFILE_HASHERS[PASSWORD_HASHER_PROFILE]] + [
+    hasher for profile, hasher in _PROFILE_HASHERS.items() if profile != PASSWORD_HASHER_PROFILE
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# Token revocation (users.revocation): how often each worker pulls revocations
+# made by other workers, and the size of its Bloom filters
+REVOCATION_SYNC_INTERVAL = int(os.environ.get('REVOCATION_SYNC_INTERVAL', '5'))  # seconds
+REVOCATION_FILTER_CAPACITY = 100000
+REVOCATION_FILTER_ERROR_RATE = 0.001
+# Revoked token IDs and their journal must outlive every token they revoke, so
+# they get their own cache that never evicts: 'db' (the default) is a table
+# created by migrate that only drops expired rows; 'redis' uses
+# REVOCATION_CACHE_URL, whose server must run with maxmemory-policy noeviction;
+# 'locmem' is per process and only correct with a single worker.
+REVOCATION_CACHE_BACKEND = os.environ.get('REVOCATION_CACHE_BACKEND', 'db')
+REVOCATION_CACHE_URL = os.environ.get('REVOCATION_CACHE_URL', SHARED_CACHE_URL)
+_REVOCATION_CACHE_BACKENDS = {
+    'db': 'techshelf.cache_backends.NonEvictingDatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+if REVOCATION_CACHE_BACKEND not in _REVOCATION_CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"REVOCATION_CACHE_BACKEND must be one of {', '.join(_REVOCATION_CACHE_BACKENDS)}")
+if REVOCATION_CACHE_BACKEND == 'redis' and importlib.util.find_spec('redis') is None:
+    raise ImproperlyConfigured("REVOCATION_CACHE_BACKEND 'redis' requires redis (pip install redis)")
+if REVOCATION_CACHE_BACKEND == 'locmem' and WEB_CONCURRENCY > 1:
+    raise ImproperlyConfigured('REVOCATION_CACHE_BACKEND=locmem cannot be shared by several workers; use db or redis')
+CACHES['revocations'] = {
+    'BACKEND': _REVOCATION_CACHE_BACKENDS[REVOCATION_CACHE_BACKEND],
+    'LOCATION': {'db': 'techshelf_revocations', 'redis': REVOCATION_CACHE_URL, 'locmem': 'techshelf-revocations'}[REVOCATION_CACHE_BACKEND],
+    'KEY_PREFIX': 'revocations',
+    # db: purge expired rows past this many; locmem: high enough never to cull
+    'OPTIONS': {} if REVOCATION_CACHE_BACKEND == 'redis' else {
+        'MAX_ENTRIES': 100000 if REVOCATION_CACHE_BACKEND == 'db' else 10 ** 9,
+    },
+}
+
+# Admission control (techshelf.throttling.AdmissionControlMixin): concurrent
+# requests per scope across all workers; the rest wait briefly, then get 429
+ADMISSION_LIMITS = {
+    'checkout': int(os.environ.get('CHECKOUT_MAX_CONCURRENT', '8')),
+}
+ADMISSION_WAIT = 2  # seconds a request waits for a free slot
+ADMISSION_LEASE = 30  # seconds before a slot held by a crashed worker frees itself
+ADMISSION_RETRY_AFTER = 5  # seconds, sent as Retry-After
+# Slots are taken with cache add(), which must be atomic across workers and
+# cheap enough for waiting requests to retry: 'redis' or 'memcached' (a
+# host:port), at ADMISSION_CACHE_URL. The database cache is refused, its add()
+# being three queries on the primary and not exclusive on an expired key;
+# 'locmem' is only correct with a single worker. Defaults to redis when the
+# shared cache is redis, so several workers on the database cache must set it.
+ADMISSION_CACHE_BACKEND = os.environ.get('ADMISSION_CACHE_BACKEND', 'redis' if SHARED_CACHE_BACKEND == 'redis' else 'locmem')
+ADMISSION_CACHE_URL = os.environ.get('ADMISSION_CACHE_URL', SHARED_CACHE_URL)
+_ADMISSION_CACHE_BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+if ADMISSION_CACHE_BACKEND not in _ADMISSION_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"ADMISSION_CACHE_BACKEND must be one of {', '.join(_ADMISSION_CACHE_BACKENDS)}, whose add() is atomic"
+    )
+if ADMISSION_CACHE_BACKEND == 'redis' and importlib.util.find_spec('redis') is None:
+    raise ImproperlyConfigured("ADMISSION_CACHE_BACKEND 'redis' requires redis (pip install redis)")
+if ADMISSION_CACHE_BACKEND == 'memcached' and importlib.util.find_spec('pymemcache') is None:
+    raise ImproperlyConfigured("ADMISSION_CACHE_BACKEND 'memcached' requires pymemcache (pip install pymemcache)")
+if ADMISSION_CACHE_BACKEND == 'locmem' and WEB_CONCURRENCY > 1:
+    raise ImproperlyConfigured('ADMISSION_CACHE_BACKEND=locmem cannot be shared by several workers; use redis or memcached')
+CACHES['admission'] = {
+    'BACKEND': _ADMISSION_CACHE_BACKENDS[ADMISSION_CACHE_BACKEND],
+    'LOCATION': ADMISSION_CACHE_URL if ADMISSION_CACHE_BACKEND != 'locmem' else 'techshelf-admission',
+    'KEY_PREFIX': 'admission',
+}
+
+# Replica reads: a client's reads stay on the primary this long after it writes,
+# and replicas further behind than REPLICA_MAX_LAG are skipped
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', '5'))  # seconds
+REPLICA_HEALTH_CHECK_INTERVAL = 10  # seconds
+
+# Order archive (orders.archive): delivered and cancelled orders older than
+# this are moved out of the order tables by the archive_orders command. Seller
+# order lists and sales reports read the archive too.
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', '365'))
+ORDER_ARCHIVE_BATCH_SIZE = 500
+
+# check_query_plans fails on a full scan of any table with at least this many rows
+QUERY_PLAN_SEQ_SCAN_ROWS = int(os.environ.get('QUERY_PLAN_SEQ_SCAN_ROWS', '1000'))
+
+# Per-request SQL counts and timings in response headers (techshelf.querycount);
+# query shapes repeated this often in one request are logged as likely N+1s
+QUERY_INSTRUMENTATION = DEBUG
+QUERY_DUPLICATE_THRESHOLD = 3
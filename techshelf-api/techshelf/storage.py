@@ -0,0 +1,348 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db import models
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+# JSON fields holding lists/dicts of {'name': ...} variant entries that point into storage
+VARIANT_FIELDS = (
+    ('products.Product', 'image_variants'),
+    ('stores.StoreTheme', 'logo_variants'),
+    ('stores.StoreTheme', 'banner_variants'),
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that keeps every distinct file once, named by its SHA-256.
+
+    Uploads are hashed while they are streamed to a temporary file and then
+    moved to CAS_PREFIX/ab/cd/<digest><ext>; identical uploads end up with
+    the same name. Blobs can be shared by many rows, so delete() leaves them
+    alone and collect_garbage() removes the ones nothing references.
+    Files saved before this storage was enabled keep working as before.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content has been hashed
+        return name
+
+    def blob_name(self, digest, extension):
+        prefix = settings.CAS_PREFIX
+        return f"{prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def _save(self, name, content):
+        temp_dir = self.path(f"{settings.CAS_PREFIX}/tmp")
+        os.makedirs(temp_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+
+            final_name = self.blob_name(digest.hexdigest(), os.path.splitext(name)[1].lower())
+            final_path = self.path(final_name)
+            if self.touch(final_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                # Atomic, so concurrent uploads of the same bytes cannot see a partial blob
+                os.replace(temp_path, final_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return final_name
+
+    def touch(self, path):
+        """
+        Refresh an existing blob's mtime before reusing it, so collect_garbage
+        sees a fresh upload and keeps it for the grace period while the new
+        row is committed. False if there is no blob (any more).
+        """
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete(self, name):
+        if self.is_blob(name):
+            return
+        super().delete(name)
+
+    def is_blob(self, name):
+        return bool(name) and name.startswith(f"{settings.CAS_PREFIX}/") and not name.startswith(f"{settings.CAS_PREFIX}/tmp/")
+
+
+@deconstructible
+class S3Storage(Storage):
+    """
+    Storage on an S3-compatible object store (AWS S3, MinIO, ...).
+
+    Needs boto3, which is only imported when this backend is configured.
+    Besides the regular Storage API it can presign direct browser uploads
+    so image bytes never pass through the app workers, and claim() moves a
+    finished upload to CAS_PREFIX, where blobs may be shared by many rows
+    and delete() leaves them alone.
+    """
+
+    def __init__(self, bucket_name=None, endpoint_url=None, public_url=None):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImproperlyConfigured('S3Storage requires boto3 (pip install boto3)')
+
+        self.bucket_name = bucket_name or settings.AWS_STORAGE_BUCKET_NAME
+        self.endpoint_url = endpoint_url or settings.AWS_S3_ENDPOINT_URL or None
+        self.public_url = (public_url or settings.AWS_S3_PUBLIC_URL or '').rstrip('/')
+        self.client = boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            region_name=settings.AWS_S3_REGION_NAME or None,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY or None,
+            # MinIO and most local stand-ins only support path-style addressing
+            config=Config(signature_version='s3v4', s3={'addressing_style': 'path'}),
+        )
+
+    def _open(self, name, mode='rb'):
+        body = self.client.get_object(Bucket=self.bucket_name, Key=name)['Body']
+        return File(tempfile_from_stream(body), name=name)
+
+    def _save(self, name, content):
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        extra = {}
+        content_type = getattr(content, 'content_type', None)
+        if content_type:
+            extra['ContentType'] = content_type
+        self.client.upload_fileobj(content, self.bucket_name, name, ExtraArgs=extra)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Keys are generated from uuids or content hashes, so overwriting is not a concern
+        return name
+
+    def delete(self, name):
+        if self.is_blob(name):
+            return
+        self.client.delete_object(Bucket=self.bucket_name, Key=name)
+
+    def is_blob(self, name):
+        return bool(name) and name.startswith(f"{settings.CAS_PREFIX}/")
+
+    def exists(self, name):
+        return self.head(name) is not None
+
+    def size(self, name):
+        return self.head(name)['ContentLength']
+
+    def url(self, name):
+        if self.public_url:
+            return f"{self.public_url}/{name}"
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': name},
+            ExpiresIn=settings.AWS_PRESIGNED_EXPIRY,
+        )
+
+    def head(self, name):
+        """Object metadata, or None if the key does not exist"""
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket_name, Key=name)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def claim(self, name, etag):
+        """
+        Copy an upload to its content-addressed name inside the bucket and
+        remove the upload; the blob's name, or None if the object no longer
+        has the given ETag.
+
+        A single-part upload's ETag is the MD5 of its bytes, so identical
+        uploads share a blob without the app reading them. The copy is
+        conditional on the ETag, so bytes posted again with the same presigned
+        form after they were checked are never attached.
+        """
+        from botocore.exceptions import ClientError
+        digest = etag.strip('"')
+        blob = f"{settings.CAS_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{os.path.splitext(name)[1].lower()}"
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket_name,
+                Key=blob,
+                CopySource={'Bucket': self.bucket_name, 'Key': name},
+                CopySourceIfMatch=etag,
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('412', 'PreconditionFailed'):
+                return None
+            raise
+        self.client.delete_object(Bucket=self.bucket_name, Key=name)
+        return blob
+
+    def presigned_upload(self, name, content_type, max_size):
+        """Form fields for a browser POST straight to the bucket, limited to one key, type and size"""
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=name,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_size],
+            ],
+            ExpiresIn=settings.AWS_PRESIGNED_EXPIRY,
+        )
+
+
+def tempfile_from_stream(body, chunk_size=64 * 1024):
+    """Spool a streaming response body into a seekable temporary file"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    for chunk in iter(lambda: body.read(chunk_size), b''):
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def variant_names(value):
+    """Storage names inside a variants JSON value, however it is nested"""
+    if isinstance(value, dict):
+        if 'name' in value and isinstance(value['name'], str):
+            yield value['name']
+        else:
+            for item in value.values():
+                yield from variant_names(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from variant_names(item)
+
+
+def reference_counts():
+    """How many database values point at each stored file name"""
+    counts = Counter()
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                names = model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                counts.update(names.values_list(field.name, flat=True).iterator())
+
+    for label, field_name in VARIANT_FIELDS:
+        model = apps.get_model(label)
+        for value in model._default_manager.values_list(field_name, flat=True).iterator():
+            counts.update(variant_names(value))
+    return counts
+
+
+def iter_blobs(storage):
+    """(name, size, mtime) for every blob in the content-addressed area"""
+    root = storage.path(settings.CAS_PREFIX)
+    for directory, dirnames, filenames in os.walk(root):
+        if directory == root:
+            dirnames[:] = [dirname for dirname in dirnames if dirname != 'tmp']
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+            yield name, stat.st_size, stat.st_mtime
+
+
+def collect_garbage(storage, grace_seconds=None, dry_run=False):
+    """
+    Mark and sweep: delete blobs that no row references any more.
+
+    Blobs written or reused within the grace period are kept, since an upload
+    is stored before the row that points at it is committed; reusing a blob
+    refreshes its mtime (see ContentAddressedStorage.touch). Returns
+    (removed, bytes).
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.CAS_GC_GRACE_SECONDS
+    cutoff = time.time() - grace_seconds
+    counts = reference_counts()
+
+    removed = freed = 0
+    for name, size, mtime in iter_blobs(storage):
+        if counts[name] or mtime > cutoff:
+            continue
+        removed += 1
+        freed += size
+        if not dry_run:
+            os.remove(storage.path(name))
+
+    # Temporary files left behind by interrupted uploads
+    temp_dir = storage.path(f"{settings.CAS_PREFIX}/tmp")
+    if not dry_run and os.path.isdir(temp_dir):
+        for filename in os.listdir(temp_dir):
+            path = os.path.join(temp_dir, filename)
+            if os.stat(path).st_mtime <= cutoff:
+                os.remove(path)
+
+    logger.info(f"Garbage collection {'found' if dry_run else 'removed'} {removed} unreferenced blobs ({freed} bytes)")
+    return removed, freed
+
+
+def dedup_report(storage):
+    """Blob count, stored bytes and bytes saved by sharing blobs between rows"""
+    counts = reference_counts()
+    blobs = stored = saved = 0
+    for name, size, _ in iter_blobs(storage):
+        blobs += 1
+        stored += size
+        saved += max(counts[name] - 1, 0) * size
+    return {'blobs': blobs, 'stored_bytes': stored, 'saved_bytes': saved}
+
+
+def file_digest(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_duplicates(root):
+    """
+    Hash every file under root outside the content-addressed area.
+
+    Returns (files, total_bytes, duplicate_bytes) where duplicate_bytes is
+    what storing each distinct file once would save.
+    """
+    seen = set()
+    files = total = duplicate = 0
+    for directory, dirnames, filenames in os.walk(root):
+        if directory == str(root):
+            dirnames[:] = [dirname for dirname in dirnames if dirname != settings.CAS_PREFIX]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            size = os.path.getsize(path)
+            files += 1
+            total += size
+            key = (size, file_digest(path))
+            if key in seen:
+                duplicate += size
+            else:
+                seen.add(key)
+    return files, total, duplicate
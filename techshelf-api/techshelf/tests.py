@@ -0,0 +1,392 @@
+import base64
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from notifications.models import Notification, SalesReport
+from orders.models import ArchivedOrder, ArchivedOrderItem, Cart, Order, OrderItem
+from products.models import Product
+from stores.models import Store
+from users.models import User
+from users.tokens import RevocableAccessToken
+from .cache_backends import CreateCacheTable
+from .query_plans import check_plans, hot_querysets
+from .querycount import record_queries
+from .replicas import replica_health
+from .storage import S3Storage
+from .throttling import AdmissionSlots, ScopedSlidingWindowThrottle, admission_cache
+
+# A replica as DATABASE_REPLICA_URLS configures one, a TEST MIRROR of the
+# primary. Added on import, before the test runner sets up the databases
+if 'replica_0' not in settings.DATABASES:
+    settings.DATABASES['replica_0'] = {**settings.DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+
+@mock.patch.object(ScopedSlidingWindowThrottle, 'THROTTLE_RATES', {'search': '2/min'})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, forwarded_for):
+        return self.client.get('/api/products/', {'search': 'lamp'}, HTTP_X_FORWARDED_FOR=forwarded_for)
+
+    def test_forged_forwarded_for_is_ignored(self):
+        self.search('203.0.113.1')
+        self.search('203.0.113.2')
+        self.assertEqual(self.search('203.0.113.3').status_code, 429)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_clients_behind_a_proxy_are_counted_apart(self):
+        # The proxy appends the address it saw to whatever the client sent
+        self.search('198.51.100.7, 203.0.113.1')
+        self.search('198.51.100.8, 203.0.113.1')
+        self.assertEqual(self.search('203.0.113.1').status_code, 429)
+        self.assertEqual(self.search('203.0.113.2').status_code, 200)
+
+    def test_counts_are_shared_not_per_process(self):
+        self.search('203.0.113.1')
+        self.search('203.0.113.1')
+        # Another worker has its own default cache, but the same shared one
+        cache.clear()
+        self.assertEqual(self.search('203.0.113.1').status_code, 429)
+
+
+@override_settings(QUERY_INSTRUMENTATION=True)
+class QueryInstrumentationTests(TestCase):
+    def test_database_cache_queries_are_counted(self):
+        cache.clear()
+        client = APIClient()
+        for expected in ('MISS', 'HIT'):
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get('/api/products/')
+            ran = [query for query in captured.captured_queries if 'SAVEPOINT' not in query['sql']]
+            self.assertEqual(response['X-Cache'], expected)
+            # A hit still reads the tag versions from the shared cache table
+            self.assertGreater(len(ran), 0)
+            self.assertEqual(int(response['X-Query-Count']), len(ran))
+        self.assertIn('cache;dur=', response['Server-Timing'])
+
+
+class AdmissionSlotsTests(TestCase):
+    def setUp(self):
+        admission_cache.clear()
+
+    def test_slots_are_shared_not_per_process(self):
+        slot = AdmissionSlots('checkout', 1, lease=30).try_acquire()
+        self.assertIsNotNone(slot)
+        cache.clear()
+
+        other_worker = AdmissionSlots('checkout', 1, lease=30)
+        self.assertIsNone(other_worker.try_acquire())
+        AdmissionSlots('checkout', 1, lease=30).release(slot)
+        self.assertIsNotNone(other_worker.try_acquire())
+
+    def test_waiting_costs_a_few_round_trips_and_no_queries(self):
+        slots = AdmissionSlots('checkout', 8, lease=30)
+        for _ in range(8):
+            slots.try_acquire()
+
+        with mock.patch.object(admission_cache, 'get_many', wraps=admission_cache.get_many) as get_many, \
+                mock.patch.object(admission_cache, 'add', wraps=admission_cache.add) as add, \
+                record_queries() as recorder:
+            self.assertIsNone(slots.acquire(timeout=1))
+
+        # Backing off from 10ms to 250ms: a dozen reads a second, where polling
+        # every 50ms tried all eight slots twenty times
+        self.assertLessEqual(get_many.call_count, 15)
+        self.assertEqual(add.call_count, 0)
+        self.assertEqual(recorder.count, 0)
+
+    def test_freed_slot_is_taken_while_waiting(self):
+        slots = AdmissionSlots('checkout', 1, lease=30)
+        held = slots.try_acquire()
+        with mock.patch('techshelf.throttling.time.sleep', side_effect=lambda seconds: slots.release(held)):
+            self.assertIsNotNone(slots.acquire(timeout=1))
+
+    def check(self, **env):
+        return subprocess.run(
+            [sys.executable, 'manage.py', 'check'], env={**os.environ, **env}, capture_output=True, text=True,
+            cwd=settings.BASE_DIR,
+        )
+
+    def test_database_cache_is_refused(self):
+        result = self.check(ADMISSION_CACHE_BACKEND='db')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('whose add() is atomic', result.stderr)
+
+    def test_several_workers_need_redis_or_memcached(self):
+        result = self.check(SHARED_CACHE_BACKEND='db', REVOCATION_CACHE_BACKEND='db', WEB_CONCURRENCY='2')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ADMISSION_CACHE_BACKEND=locmem cannot be shared', result.stderr)
+
+
+class CreateCacheTableTests(TransactionTestCase):
+    TABLE = 'techshelf_test_cache'
+
+    def migrate(self, direction):
+        operation = CreateCacheTable(self.TABLE)
+        with connection.schema_editor() as schema_editor:
+            getattr(operation, f'database_{direction}')('techshelf', schema_editor, None, None)
+        return self.TABLE in connection.introspection.table_names()
+
+    def test_table_is_created_and_dropped(self):
+        self.assertTrue(self.migrate('forwards'))
+        self.addCleanup(self.migrate, 'backwards')
+        table_cache = DatabaseCache(self.TABLE, {})
+        table_cache.set('key', 'value')
+        self.assertEqual(table_cache.get('key'), 'value')
+
+        # Already there, e.g. from createcachetable: left alone
+        self.assertTrue(self.migrate('forwards'))
+        self.assertEqual(table_cache.get('key'), 'value')
+
+        self.assertFalse(self.migrate('backwards'))
+
+    def test_tables_do_not_depend_on_caches(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertTrue(self.migrate('forwards'))
+        self.migrate('backwards')
+
+
+@skipUnless(importlib.util.find_spec('moto') and importlib.util.find_spec('boto3'), 'moto and boto3 are not installed')
+@override_settings(
+    AWS_STORAGE_BUCKET_NAME='techshelf-test', AWS_S3_ENDPOINT_URL='', AWS_S3_PUBLIC_URL='', AWS_S3_REGION_NAME='us-east-1',
+    AWS_ACCESS_KEY_ID='testing', AWS_SECRET_ACCESS_KEY='testing', UPLOAD_MAX_SIZE=1024,
+)
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        from moto import mock_aws
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.storage = S3Storage()
+        self.storage.client.create_bucket(Bucket='techshelf-test')
+        patcher = mock.patch('techshelf.uploads.default_storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.seller = User.objects.create_user('seller', 'seller@example.com', 'pw', role='SELLER')
+        store = Store.objects.create(store_name='Acme', user=self.seller)
+        self.product = Product.objects.create(product_id='widget', name='Widget', price=5, category='tools', store=store)
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def presign(self, **data):
+        return self.client.post('/api/uploads/presign/', {'target': 'product', 'content_type': 'image/png', **data}, format='json')
+
+    def upload(self, body=b'png bytes', content_type='image/png', user=None):
+        key = f"uploads/{(user or self.seller).id}/upload.png"
+        self.storage.client.put_object(Bucket='techshelf-test', Key=key, Body=body, ContentType=content_type)
+        return key
+
+    def finalize(self, key, **data):
+        return self.client.post('/api/uploads/finalize/', {'target': 'product', 'product_id': 'widget', 'key': key, **data}, format='json')
+
+    def test_presigned_post_is_limited_to_one_key_type_and_size(self):
+        response = self.presign(filename='photo.PNG')
+
+        self.assertEqual(response.status_code, 200)
+        key = response.data['key']
+        self.assertTrue(key.startswith(f"uploads/{self.seller.id}/") and key.endswith('.png'))
+        self.assertEqual(response.data['fields']['key'], key)
+        # What S3 enforces is the signed policy, so check the conditions in it
+        policy = json.loads(base64.b64decode(response.data['fields']['policy']))
+        self.assertIn({'key': key}, policy['conditions'])
+        self.assertIn({'Content-Type': 'image/png'}, policy['conditions'])
+        self.assertIn(['content-length-range', 1, 1024], policy['conditions'])
+
+    def test_presign_refuses_other_content_types(self):
+        response = self.presign(content_type='text/html')
+        self.assertEqual(response.status_code, 400)
+
+    def test_extension_follows_the_content_type(self):
+        key = self.presign(content_type='image/webp', filename='photo.html').data['key']
+        self.assertTrue(key.endswith('.webp'), key)
+
+    def test_finalize_moves_the_upload_to_its_content_address(self):
+        key = self.upload()
+
+        response = self.finalize(key)
+
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        name = self.product.image.name
+        self.assertRegex(name, r'^cas/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}\.png$')
+        self.assertIsNone(self.storage.head(key))
+        self.assertEqual(self.storage.head(name)['ContentType'], 'image/png')
+
+    def test_identical_uploads_share_a_blob(self):
+        self.finalize(self.upload())
+        first = Product.objects.get(pk=self.product.pk).image.name
+        Product.objects.create(product_id='lamp', name='Lamp', price=5, category='tools', store=self.product.store)
+
+        self.finalize(self.upload(), product_id='lamp')
+
+        self.assertEqual(Product.objects.get(product_id='lamp').image.name, first)
+        # Shared blobs outlive any one row
+        self.storage.delete(first)
+        self.assertIsNotNone(self.storage.head(first))
+
+    def test_copy_is_conditional_on_the_checked_etag(self):
+        key = self.upload()
+        etag = self.storage.head(key)['ETag']
+        with mock.patch.object(self.storage.client, 'copy_object', wraps=self.storage.client.copy_object) as copy:
+            self.finalize(key)
+        self.assertEqual(copy.call_args.kwargs['CopySourceIfMatch'], etag)
+
+    def test_upload_replaced_after_the_check_is_not_attached(self):
+        from botocore.exceptions import ClientError
+        key = self.upload()
+        changed = ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'CopyObject')
+
+        with mock.patch.object(self.storage.client, 'copy_object', side_effect=changed):
+            response = self.finalize(key)
+
+        self.assertEqual(response.status_code, 409)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+
+    def test_missing_upload_is_refused(self):
+        response = self.finalize(f"uploads/{self.seller.id}/never-uploaded.png")
+        self.assertEqual(response.status_code, 400)
+
+    def test_oversized_or_non_image_upload_is_refused_and_removed(self):
+        for body, content_type in ((b'x' * 1025, 'image/png'), (b'<html>', 'text/html')):
+            with self.subTest(content_type=content_type, size=len(body)):
+                key = self.upload(body, content_type)
+
+                response = self.finalize(key)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIsNone(self.storage.head(key))
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+
+    def test_uploads_of_other_users_cannot_be_attached(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        key = self.upload(user=other)
+
+        for bad_key in (key, f"uploads/{self.seller.id}/../{other.id}/upload.png"):
+            with self.subTest(key=bad_key):
+                self.assertEqual(self.finalize(bad_key).status_code, 400)
+        self.assertIsNotNone(self.storage.head(key))
+
+    def test_products_of_other_stores_cannot_be_targeted(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw', role='SELLER')
+        Store.objects.create(store_name='Other', user=other)
+        self.client.force_authenticate(other)
+
+        response = self.finalize(self.upload(user=other))
+
+        self.assertEqual(response.status_code, 404)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+
+    def test_theme_upload_is_attached_to_the_store_theme(self):
+        with self.captureOnCommitCallbacks() as scheduled:
+            response = self.finalize(self.upload(), target='store_logo')
+
+        self.assertEqual(response.status_code, 200)
+        store = Store.objects.select_related('theme').get(user=self.seller)
+        self.assertTrue(store.theme.logo_url.name.startswith('cas/'))
+        self.assertEqual(len(scheduled), 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # Transactions, so the replica's connection sees the primary's rows
+    databases = {'default', 'replica_0'}
+
+    def setUp(self):
+        cache.clear()
+        replica_health._status.clear()
+        self.clients = []
+        for name in ('ada', 'bob'):
+            user = User.objects.create_user(name, f"{name}@example.com", 'pw', role='SELLER')
+            Store.objects.create(store_name=name, user=user)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(user)}")
+            self.clients.append(client)
+
+    def reads_from_replica(self, client):
+        with CaptureQueriesContext(connections['replica_0']) as replica:
+            response = client.get('/api/notifications/reports/')
+        self.assertEqual(response.status_code, 200)
+        return any('notifications_salesreport' in query['sql'] for query in replica.captured_queries)
+
+    def test_writer_reads_its_own_writes_from_the_primary(self):
+        ada, bob = self.clients
+        self.assertTrue(self.reads_from_replica(ada))
+
+        self.assertEqual(ada.post('/api/notifications/reports/generate/', {}, format='json').status_code, 201)
+
+        self.assertFalse(self.reads_from_replica(ada))
+        self.assertTrue(self.reads_from_replica(bob))
+
+    def test_stickiness_is_shared_by_workers(self):
+        ada = self.clients[0]
+        ada.post('/api/notifications/reports/generate/', {}, format='json')
+        # The next request lands on a worker with an empty default cache
+        cache.clear()
+        self.assertFalse(self.reads_from_replica(ada))
+
+
+class QueryPlanTests(TestCase):
+    ROWS = 20
+
+    def setUp(self):
+        user = User.objects.create_user('seller', 'seller@example.com', 'pw', role='SELLER')
+        store = Store.objects.create(store_name='Acme', user=user)
+        old = timezone.now() - timedelta(days=400)
+        cart = Cart.objects.create(user=user)
+        for n in range(self.ROWS):
+            product = Product.objects.create(product_id=f'p{n}', name=f'Product {n}', price=n, category='tools', store=store)
+            order = Order.objects.create(user=user, total_amount=n, payment_status='PAID', order_status='DELIVERED')
+            OrderItem.objects.create(order=order, product_id=product.product_id, store=store, quantity=1, price=n)
+            archived = ArchivedOrder.objects.create(
+                order_id=f'archived{n}', user=user, order_status='DELIVERED', payment_status='PAID',
+                total_amount=n, created_at=old, data={},
+            )
+            ArchivedOrderItem.objects.create(archived_order=archived, product_id=product.product_id, store=store, quantity=1, price=n)
+            cart.add_item(product, 1)
+            Notification.objects.create(user=user, message=f'note {n}', is_read=n % 2 == 0)
+            SalesReport.objects.create(store=store, start_date=old.date(), end_date=old.date())
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Row estimates for the seeded tables, and index plans for
+                # tables this small, which are otherwise scanned whatever
+                # their indexes
+                cursor.execute('ANALYZE')
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_hot_querysets_use_indexes(self):
+        failures = check_plans(1)
+        self.assertEqual(failures, [], '\n\n'.join(plan for *_, plan in failures))
+
+    def test_full_scan_is_reported(self):
+        querysets = {'products by name': Product.objects.filter(name='Product 1')}
+
+        [(name, table, rows, plan)] = check_plans(1, querysets)
+
+        self.assertEqual((name, table, rows), ('products by name', 'products_product', self.ROWS))
+        self.assertEqual(check_plans(self.ROWS + 1, querysets), [])
+
+    def test_unsupported_database_is_a_command_error(self):
+        with mock.patch.object(connections['default'], 'vendor', 'mysql'):
+            with self.assertRaises(CommandError):
+                check_plans(1, {'product list': hot_querysets()['product list']})
@@ -0,0 +1,169 @@
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import ScopedRateThrottle, SimpleRateThrottle
+
+from .cache import shared_cache
+
+# Admission slots need an atomic add() (ADMISSION_CACHE_BACKEND)
+admission_cache = ConnectionProxy(caches, 'admission')
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Rate limit with a sliding window counter instead of DRF's request log.
+
+    Requests are counted per fixed window with cache.incr(); the rate is
+    estimated as this window's count plus the previous window's count
+    weighted by how much of it still overlaps the sliding window. That is
+    two cache reads and one increment per request, however high the rate.
+
+    Counts live in the shared cache, so a limit holds across workers. On the
+    database cache incr() is a read and a write, so concurrent requests can
+    be undercounted by a few; Redis counts exactly.
+    """
+    cache = shared_cache
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+        current_key, previous_key = f"{self.key}:{window}", f"{self.key}:{window - 1}"
+
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current = counts.get(current_key, 0)
+        self.previous = counts.get(previous_key, 0)
+        estimate = self.previous * (1 - self.elapsed / self.duration) + self.current
+        if estimate >= self.num_requests:
+            return self.throttle_failure()
+
+        # Kept for two windows, while it is the current or the previous one
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(current_key, 1, self.duration * 2)
+        return True
+
+    def wait(self):
+        if self.current >= self.num_requests:
+            # Wait for the next window, then for enough of this one to slide out
+            return (self.duration - self.elapsed) + self.duration * (1 - self.num_requests / self.current)
+        # Wait until enough of the previous window has slid out
+        return max(0.0, self.duration * (1 - (self.num_requests - self.current) / self.previous) - self.elapsed)
+
+
+class ScopedSlidingWindowThrottle(ScopedRateThrottle, SlidingWindowRateThrottle):
+    """
+    Per-endpoint sliding window limits, per user or per IP for anonymous requests.
+
+    Views opt in with a ``throttle_scope``; the rate for each scope comes
+    from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'].
+    """
+
+
+class SearchThrottle(ScopedSlidingWindowThrottle):
+    """Limit only requests that run a ?search= query, under the view's search_throttle_scope"""
+    scope_attr = 'search_throttle_scope'
+
+    def allow_request(self, request, view):
+        if not request.query_params.get('search'):
+            return True
+        return super().allow_request(request, view)
+
+
+class AdmissionSlots:
+    """
+    At most ``limit`` concurrent holders across all workers.
+
+    Each slot is a key in the admission cache taken with add(). Slots are
+    leased for ``lease`` seconds, so one held by a crashed worker frees
+    itself. An attempt reads every slot in one get_many() and only adds
+    the free ones, and waiting requests retry with jittered exponential
+    backoff, so a full scope costs a handful of round trips per request.
+    """
+
+    def __init__(self, name, limit, lease, initial_backoff=0.01, max_backoff=0.25):
+        self.name = name
+        self.limit = limit
+        self.lease = lease
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+    def slot_key(self, index):
+        return f"admission:{self.name}:{index}"
+
+    def try_acquire(self):
+        keys = [self.slot_key(index) for index in range(self.limit)]
+        held = admission_cache.get_many(keys)
+        token = uuid.uuid4().hex
+        for index, key in enumerate(keys):
+            # Another request may still take it first, then add() fails
+            if key not in held and admission_cache.add(key, token, self.lease):
+                return index, token
+        return None
+
+    def acquire(self, timeout):
+        """A (slot, token) pair, waiting up to timeout seconds for a free slot, or None"""
+        deadline = time.monotonic() + timeout
+        backoff = self.initial_backoff
+        while True:
+            slot = self.try_acquire()
+            remaining = deadline - time.monotonic()
+            if slot is not None or remaining <= 0:
+                return slot
+            # Half fixed, half random, so waiting requests do not retry in step
+            time.sleep(min(remaining, backoff / 2 + random.uniform(0, backoff / 2)))
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def release(self, slot):
+        index, token = slot
+        key = self.slot_key(index)
+        if admission_cache.get(key) == token:
+            admission_cache.delete(key)
+
+
+class AdmissionControlMixin:
+    """
+    Cap how many requests to a view's unsafe methods run at once.
+
+    A request waits up to ADMISSION_WAIT seconds for a slot and is then
+    answered with 429 and a Retry-After header, rather than queueing on
+    database connections. Views set admission_scope and an
+    ADMISSION_LIMITS entry for it.
+    """
+    admission_scope = None
+
+    def get_admission_slots(self):
+        return AdmissionSlots(
+            self.admission_scope,
+            settings.ADMISSION_LIMITS[self.admission_scope],
+            settings.ADMISSION_LEASE,
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.admission_slot = None
+        if self.admission_scope and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            self.admission_slot = self.get_admission_slots().acquire(settings.ADMISSION_WAIT)
+            if self.admission_slot is None:
+                raise Throttled(wait=settings.ADMISSION_RETRY_AFTER)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(self, 'admission_slot', None) is not None:
+            self.get_admission_slots().release(self.admission_slot)
+            self.admission_slot = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,126 @@
+import logging
+import mimetypes
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from products.models import Product
+from products.serializers import ProductSerializer
+from stores.models import Store, StoreTheme
+from stores.serializers import StoreThemeSerializer
+from .imaging import run_in_background
+
+logger = logging.getLogger(__name__)
+
+# Upload target -> StoreTheme field, for theme images
+THEME_TARGETS = {'store_logo': 'logo_url', 'store_banner': 'banner_url'}
+TARGETS = ('product',) + tuple(THEME_TARGETS)
+
+
+def user_upload_prefix(user):
+    return f"uploads/{user.id}/"
+
+
+def direct_uploads_enabled():
+    return hasattr(default_storage, 'presigned_upload')
+
+
+def render_theme_variants(theme_pk, field):
+    theme = StoreTheme.objects.filter(pk=theme_pk).first()
+    if theme is not None:
+        theme.generate_variants([field])
+
+
+class UploadPresignView(APIView):
+    """Get a presigned form to upload an image straight to object storage"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if not direct_uploads_enabled():
+            return Response({'error': 'Direct uploads are not enabled'}, status=status.HTTP_400_BAD_REQUEST)
+
+        target = request.data.get('target')
+        content_type = request.data.get('content_type', '')
+        if target not in TARGETS:
+            return Response({'error': f"target must be one of {', '.join(TARGETS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        if content_type not in settings.UPLOAD_CONTENT_TYPES:
+            return Response({'error': 'Unsupported content type'}, status=status.HTTP_400_BAD_REQUEST)
+        if target in THEME_TARGETS and request.seller.store is None:
+            return Response({'error': 'You need to create a store first.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        extension = os.path.splitext(request.data.get('filename', ''))[1].lower()
+        if not extension or mimetypes.guess_type(f"file{extension}")[0] != content_type:
+            extension = mimetypes.guess_extension(content_type) or ''
+        key = f"{user_upload_prefix(request.user)}{uuid.uuid4().hex}{extension}"
+
+        upload = default_storage.presigned_upload(key, content_type, settings.UPLOAD_MAX_SIZE)
+        return Response({
+            'key': key,
+            'url': upload['url'],
+            'fields': upload['fields'],
+            'max_size': settings.UPLOAD_MAX_SIZE,
+        })
+
+
+class UploadFinalizeView(APIView):
+    """Attach an uploaded object to a product or the store theme"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        if not direct_uploads_enabled():
+            return Response({'error': 'Direct uploads are not enabled'}, status=status.HTTP_400_BAD_REQUEST)
+
+        key = request.data.get('key', '')
+        target = request.data.get('target')
+        if target not in TARGETS:
+            return Response({'error': f"target must be one of {', '.join(TARGETS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        # Users may only attach objects under their own prefix
+        if not key.startswith(user_upload_prefix(request.user)) or '..' in key:
+            return Response({'error': 'Invalid upload key'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if target == 'product':
+            product = get_object_or_404(
+                Product, product_id=request.data.get('product_id'), store__user=request.user
+            )
+        elif request.seller.store is None:
+            return Response({'error': 'You need to create a store first.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Only metadata is fetched; the object itself stays in the bucket
+        head = default_storage.head(key)
+        if head is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_400_BAD_REQUEST)
+        if head['ContentLength'] > settings.UPLOAD_MAX_SIZE or head.get('ContentType') not in settings.UPLOAD_CONTENT_TYPES:
+            default_storage.delete(key)
+            return Response({'error': 'Upload is too large or not an image'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The presigned form stays valid after this, so attach a copy the user cannot overwrite
+        name = default_storage.claim(key, head['ETag'])
+        if name is None:
+            return Response({'error': 'Upload changed while it was being attached'}, status=status.HTTP_409_CONFLICT)
+
+        if target == 'product':
+            # Saving schedules the product's variant rendering in the background
+            product.image.name = name
+            product.save()
+            return Response(ProductSerializer(product, context={'request': request}).data)
+
+        # request.seller.store is the principal cache's copy, up to a minute old
+        store = Store.objects.select_related('theme').get(pk=request.seller.store_pk)
+        theme = store.theme
+        if theme is None:
+            theme = StoreTheme.objects.create(theme_id=f"theme_{store.store_id}")
+            store.update_theme(theme)
+
+        field = THEME_TARGETS[target]
+        getattr(theme, field).name = name
+        theme.save()
+        transaction.on_commit(lambda: run_in_background(render_theme_variants, theme.pk, field))
+        logger.info(f"Attached upload {key} as {name} to {field} of theme {theme.theme_id}")
+        return Response(StoreThemeSerializer(theme, context={'request': request}).data)
@@ -1,8 +1,9 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from .views import health_check, api_debug_view
+from .views import health_check, api_debug_view, serve_immutable_media
+from .uploads import UploadPresignView, UploadFinalizeView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -15,8 +16,18 @@ urlpatterns = [
     path('api/products/', include('products.api_urls')),
     path('api/orders/', include('orders.api_urls')),
     path('api/notifications/', include('notifications.api_urls')),
+    path('api/uploads/presign/', UploadPresignView.as_view(), name='api_upload_presign'),
+    path('api/uploads/finalize/', UploadFinalizeView.as_view(), name='api_upload_finalize'),
 ]
 
 # Serve media files in development
 if settings.DEBUG:
+    # Variants and content-addressed blobs are named by hash and can be cached forever
+    urlpatterns += [
+        re_path(
+            rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>(?:{settings.IMAGE_VARIANT_PREFIX}|{settings.CAS_PREFIX})/.*)$',
+            serve_immutable_media,
+            {'document_root': settings.MEDIA_ROOT},
+        ),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
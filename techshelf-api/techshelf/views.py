@@ -1,3 +1,4 @@
+from django.views.static import serve
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -16,6 +17,7 @@ def health_check(request):
 def api_debug_view(request):
     """Debug endpoint to check API configuration"""
     from django.conf import settings
+    from .cache import response_cache_stats
     
     # Return useful debugging information
     debug_info = {
@@ -28,6 +30,14 @@ def api_debug_view(request):
             for name, details in settings.DATABASES.items()
         },
         'AUTHENTICATION_BACKENDS': settings.AUTHENTICATION_BACKENDS,
+        'CACHES': {name: {'BACKEND': details['BACKEND']} for name, details in settings.CACHES.items()},
+        'RESPONSE_CACHE': response_cache_stats.snapshot(),
     }
     
     return Response(debug_info)
+
+def serve_immutable_media(request, path, document_root=None):
+    """Serve content-hashed media with far-future cache headers (development only)"""
+    response = serve(request, path, document_root=document_root)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
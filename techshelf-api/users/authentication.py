@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from stores.models import Store
+from techshelf.lru import TTLCache
+
+# Per-process cache of user id -> principal, the column values of the user
+# and of their store (None if they have none). Saves of either in this
+# process invalidate it through signals; other workers pick up changes once
+# the TTL expires. That bound is accepted for reads only: the instances built
+# from a principal are read-only (see User.save and Store.save), so code that
+# writes the user or their store must fetch the row first.
+principal_cache = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL)
+
+
+def user_columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def store_columns():
+    # Rating aggregates change through queryset updates that send no signals,
+    # so they are left deferred: read fresh on access, never written by save()
+    return [field.attname for field in Store._meta.concrete_fields if field.name not in Store.RATING_FIELDS]
+
+
+def make_principal(user):
+    store = getattr(user, 'store', None)
+    return {
+        'user': tuple(getattr(user, column) for column in user_columns(type(user))),
+        'store': tuple(getattr(store, column) for column in store_columns()) if store is not None else None,
+    }
+
+
+def user_from_principal(model, principal):
+    """A fresh, read-only User instance (with its store loaded) built without any query"""
+    user = model.from_db('default', user_columns(model), principal['user'])
+    user.from_principal_cache = True
+    store = None
+    if principal['store'] is not None:
+        store = Store.from_db('default', store_columns(), principal['store'])
+        store.from_principal_cache = True
+        Store._meta.get_field('user').set_cached_value(store, user)
+    # Caching None makes hasattr(user, 'store') False without a query
+    model._meta.get_field('store').set_cached_value(user, store)
+    return user
+
+
+def invalidate_principal(user_pk):
+    principal_cache.delete(str(user_pk))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that loads the user and their store from principal_cache.
+
+    Only a miss queries the database (once, with the store joined in), so
+    authenticated requests normally make no authentication queries and
+    request.user.store is already loaded. Each request gets its own instances.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = str(user_id)
+        principal = principal_cache.get(key)
+        if principal is None:
+            user = (
+                # The primary, since a lagging replica's copy would stay cached
+                self.user_model.objects.using(DEFAULT_DB_ALIAS).select_related('store')
+                .filter(**{api_settings.USER_ID_FIELD: user_id})
+                .first()
+            )
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            principal = make_principal(user)
+            principal_cache.set(key, principal)
+
+        user = user_from_principal(self.user_model, principal)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
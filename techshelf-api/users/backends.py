@@ -1,17 +1,34 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
 
 User = get_user_model()
 
 class EmailBackend(ModelBackend):
+    """
+    Authenticate with either an email address (case-insensitive) or a username.
+
+    Both are looked up in a single query; an email match wins over a
+    username match. Password hashes made with an older hasher are upgraded
+    by check_password() on a successful login.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Check if the username is actually an email
-            user = User.objects.get(email=username)
-            if user.check_password(password):
-                return user
-        except User.DoesNotExist:
-            # If no user with that email exists, try regular username authentication
-            return super().authenticate(request, username, password, **kwargs)
-        
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        candidates = list(User.objects.filter(Q(email__iexact=username) | Q(username=username))[:3])
+        # Prefer an exact email, then any email differing only in case, then the username
+        candidates.sort(key=lambda user: (user.email != username, user.email.lower() != username.lower()))
+        user = candidates[0] if candidates else None
+
+        if user is None:
+            # Run the hasher anyway so unknown accounts take as long as wrong passwords
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
         return None
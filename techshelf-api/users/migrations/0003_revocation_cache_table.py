@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from techshelf.cache_backends import CreateCacheTable
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_email_upper_index'),
+    ]
+
+    operations = [
+        # The revocations cache with REVOCATION_CACHE_BACKEND=db (techshelf.settings)
+        CreateCacheTable('techshelf_revocations'),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
 
 class User(AbstractUser):
@@ -11,6 +12,19 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     role = models.CharField(max_length=10, choices=USER_ROLES, default='BUYER')
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # email__iexact lookups compare UPPER(email) on PostgreSQL
+            models.Index(Upper('email'), name='users_user_email_upper_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if getattr(self, 'from_principal_cache', False):
+            # Up to AUTH_USER_CACHE_TTL seconds old; saving it would write a stale
+            # is_active, password or role back
+            raise RuntimeError('Users from the principal cache are read-only, fetch the row to save it')
+        super().save(*args, **kwargs)
+    
     def upgrade_to_seller(self):
         self.role = 'SELLER'
         self.save()
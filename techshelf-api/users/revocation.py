@@ -0,0 +1,159 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from rest_framework_simplejwt.settings import api_settings
+
+from techshelf.bloom import BloomFilter
+
+# A cache of its own (REVOCATION_CACHE_BACKEND) that never evicts, shared by every worker
+revocation_cache = ConnectionProxy(caches, 'revocations')
+
+REVOKED_PREFIX = 'revoked:'
+JOURNAL_PREFIX = 'revocation:'
+# Journal entries are grouped in buckets of this many seconds
+JOURNAL_BUCKET_SECONDS = 60
+# Entries read past a bucket's last index hint, which can lag behind its entries
+JOURNAL_PROBE = 4
+# Keys per get_many() while syncing
+JOURNAL_READ_BATCH = 500
+
+
+def token_lifetime():
+    """Longest time a token can stay valid, so how long a revocation matters"""
+    return int(max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME).total_seconds())
+
+
+def revoked_key(jti):
+    return f"{REVOKED_PREFIX}{jti}"
+
+
+def bucket_of(timestamp):
+    return int(timestamp // JOURNAL_BUCKET_SECONDS)
+
+
+def hint_key(bucket):
+    return f"{JOURNAL_PREFIX}{bucket}:last"
+
+
+def entry_key(bucket, index):
+    return f"{JOURNAL_PREFIX}{bucket}:{index}"
+
+
+def read_many(keys):
+    values = {}
+    for start in range(0, len(keys), JOURNAL_READ_BATCH):
+        values.update(revocation_cache.get_many(keys[start:start + JOURNAL_READ_BATCH]))
+    return values
+
+
+class RevocationSet:
+    """
+    Revoked token IDs, kept in the revocations cache until the tokens expire.
+
+    Every revocation is also appended to a journal in the cache, and each
+    worker folds new journal entries into its own Bloom filters at most every
+    REVOCATION_SYNC_INTERVAL seconds. A token ID the filters do not contain
+    is not revoked, so the common case costs no cache access; a filter hit is
+    confirmed with the cache. Revocations made by another worker are seen
+    within one sync interval.
+
+    A journal entry claims the next free index of its bucket with add(),
+    which is atomic on every backend, so a bucket's entries run from 1 with
+    no gaps and readers read on until a missing one. Each bucket also keeps
+    a hint of its last index, so neither side has to probe from 1.
+
+    Two filters are rotated every token lifetime, so entries are dropped
+    only once every token they could match has expired.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._current = self._new_filter()
+        self._previous = self._new_filter()
+        self._rotated_at = time.monotonic()
+        self._synced_at = None
+        # Journal bucket -> entries already folded into the filters
+        self._seen = {}
+
+    @staticmethod
+    def _new_filter():
+        return BloomFilter(settings.REVOCATION_FILTER_CAPACITY, settings.REVOCATION_FILTER_ERROR_RATE)
+
+    def _add_local(self, jti):
+        with self._lock:
+            if time.monotonic() - self._rotated_at >= token_lifetime():
+                self._previous, self._current = self._current, self._new_filter()
+                self._rotated_at = time.monotonic()
+            self._current.add(jti)
+
+    def revoke(self, jti, expires_at):
+        """Revoke a token ID until expires_at (a Unix timestamp)"""
+        now = time.time()
+        remaining = int(expires_at - now) + 1
+        if remaining <= 0:
+            return
+        revocation_cache.set(revoked_key(jti), True, remaining)
+
+        bucket = bucket_of(now)
+        journal_timeout = token_lifetime() + 2 * JOURNAL_BUCKET_SECONDS
+        index = (revocation_cache.get(hint_key(bucket)) or 0) + 1
+        while not revocation_cache.add(entry_key(bucket, index), jti, journal_timeout):
+            index += 1
+        # Racing writers can set the hint backwards; readers probe past it
+        revocation_cache.set(hint_key(bucket), index, journal_timeout)
+        self._add_local(jti)
+
+    def is_revoked(self, jti):
+        self.sync()
+        with self._lock:
+            maybe_revoked = jti in self._current or jti in self._previous
+        return maybe_revoked and revocation_cache.get(revoked_key(jti)) is not None
+
+    def sync(self, force=False):
+        """Fold journal entries written since the last sync into the filters"""
+        if not force and self._synced_at is not None and time.monotonic() - self._synced_at < settings.REVOCATION_SYNC_INTERVAL:
+            return
+        # One thread syncs while the others carry on with the filters as they are
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            self._synced_at = time.monotonic()
+            self._sync()
+        finally:
+            self._sync_lock.release()
+
+    def _sync(self):
+        now_bucket = bucket_of(time.time())
+        # A new worker reads the whole window in which revocations still matter
+        first = min(self._seen) if self._seen else bucket_of(time.time() - token_lifetime())
+        buckets = range(first, now_bucket + 1)
+        hints = read_many([hint_key(bucket) for bucket in buckets])
+
+        # Bucket -> (entries read, index to read up to)
+        pending = {}
+        for bucket in buckets:
+            seen = self._seen.get(bucket, 0)
+            pending[bucket] = (seen, max(seen, hints.get(hint_key(bucket), 0)) + JOURNAL_PROBE)
+        while pending:
+            keys = [entry_key(bucket, index) for bucket, (seen, last) in pending.items() for index in range(seen + 1, last + 1)]
+            entries = read_many(keys)
+            for bucket, (seen, last) in list(pending.items()):
+                while seen < last and (jti := entries.get(entry_key(bucket, seen + 1))) is not None:
+                    self._add_local(jti)
+                    seen += 1
+                self._seen[bucket] = seen
+                if seen < last:
+                    del pending[bucket]
+                else:
+                    # Every entry read was there, so there may be more
+                    pending[bucket] = (seen, last + JOURNAL_PROBE)
+
+        # Only the last two buckets can still receive entries
+        self._seen = {bucket: seen for bucket, seen in self._seen.items() if bucket >= now_bucket - 1}
+
+
+revocations = RevocationSet()
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt import serializers as jwt_serializers
 from .models import BillingInfo
+from .tokens import RevocableRefreshToken
 
 User = get_user_model()
 
@@ -49,3 +51,7 @@ class BillingInfoSerializer(serializers.ModelSerializer):
             defaults=validated_data
         )
         return billing_info
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """Refresh that rejects revoked tokens and revokes rotated ones"""
+    token_class = RevocableRefreshToken
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from stores.models import Store
+from techshelf.cache import bump_tags
+from .authentication import invalidate_principal
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    bump_tags(f"user:{instance.pk}")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_principal(instance.pk)
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_cached_owner_store(sender, instance, **kwargs):
+    # The principal includes the user's store
+    invalidate_principal(instance.user_id)
@@ -0,0 +1,273 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from stores.models import Store
+from techshelf.cache import bump_tags
+from techshelf.query_plans import sequential_scans
+from .authentication import principal_cache
+from .models import User
+from .revocation import RevocationSet, entry_key, hint_key, bucket_of, revocation_cache, revocations
+from .tokens import RevocableAccessToken, RevocableRefreshToken
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ada', 'ada@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/users/profile/', **headers)
+
+    def test_unchanged_profile_is_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_bump_changes_the_etag(self):
+        etag = self.get()['ETag']
+        bump_tags(f"user:{self.user.pk}")
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    @override_settings(CONDITIONAL_GET_MAX_AGE=300)
+    def test_etag_expires_after_the_max_age(self):
+        etag = self.get()['ETag']
+        with mock.patch('techshelf.conditional.time') as clock:
+            clock.time.return_value = time.time() + 300
+            response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+PROFILE_HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+}
+
+
+def hasher_profile(profile):
+    """PASSWORD_HASHERS as PASSWORD_HASHER_PROFILE=profile would configure them"""
+    preferred = PROFILE_HASHERS[profile]
+    return override_settings(PASSWORD_HASHERS=[preferred] + [h for h in settings.PASSWORD_HASHERS if h != preferred])
+
+
+class PrincipalCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        principal_cache.clear()
+        self.user = User.objects.create_user('ada', 'ada@example.com', 'pw')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(self.user)}")
+        # Caches the principal
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 200)
+
+    def lock_out(self):
+        # As another worker would: no signal reaches this process's cache
+        User.objects.filter(pk=self.user.pk).update(is_active=False, password='!locked', role='SELLER')
+
+    def assertLockedOut(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual((user.is_active, user.password, user.role), (False, '!locked', 'SELLER'))
+
+    def test_other_workers_changes_show_once_the_entry_expires(self):
+        User.objects.filter(pk=self.user.pk).update(role='SELLER')
+        self.assertEqual(self.client.get('/api/users/profile/').json()['role'], 'BUYER')
+
+        expired = time.monotonic() + settings.AUTH_USER_CACHE_TTL + 1
+        with mock.patch('techshelf.lru.time.monotonic', return_value=expired):
+            self.assertEqual(self.client.get('/api/users/profile/').json()['role'], 'SELLER')
+
+    def test_saves_in_this_process_invalidate_the_principal(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.role = 'SELLER'
+        user.save()
+        self.assertEqual(self.client.get('/api/users/profile/').json()['role'], 'SELLER')
+
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 401)
+
+    @mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True)
+    def test_password_change_revokes_tokens_at_once(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RevocableAccessToken.for_user(self.user)}")
+        self.assertEqual(self.client.get('/api/users/profile/').status_code, 200)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new password')
+        user.save()
+
+        response = self.client.get('/api/users/profile/')
+        self.assertEqual((response.status_code, response.json()['code']), (401, 'password_changed'))
+
+    def test_store_save_invalidates_the_owners_principal(self):
+        Store.objects.create(store_name='Acme', user=self.user)
+        self.assertEqual(self.client.get('/api/users/profile/store/').json()['store_name'], 'Acme')
+
+    def test_cached_copies_cannot_be_saved(self):
+        Store.objects.create(store_name='Acme', user=self.user)
+        user = self.client.get('/api/users/profile/').wsgi_request.user
+        with self.assertRaises(RuntimeError):
+            user.save()
+        with self.assertRaises(RuntimeError):
+            user.store.save()
+
+    def test_profile_update_keeps_other_workers_changes(self):
+        self.lock_out()
+        response = self.client.patch('/api/users/profile/', {'username': 'ada2'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLockedOut()
+        self.assertEqual(User.objects.get(pk=self.user.pk).username, 'ada2')
+
+    def test_seller_upgrade_keeps_other_workers_changes(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False, password='!locked')
+        self.assertEqual(self.client.post('/api/users/upgrade-seller/').status_code, 200)
+        self.assertLockedOut()
+
+    def test_store_create_keeps_other_workers_changes(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False, password='!locked')
+        self.assertEqual(self.client.post('/api/stores/create/', {'store_name': 'Acme'}).status_code, 201)
+        self.assertLockedOut()
+
+
+class LoginTests(TestCase):
+    LOGINS = 5
+
+    def setUp(self):
+        # An existing account hashed with Django's default
+        with hasher_profile('pbkdf2'):
+            self.user = User.objects.create_user('ada', 'Ada@Example.com', 'secret')
+
+    def benchmark(self, profile):
+        with hasher_profile(profile):
+            self.assertEqual(authenticate(username='ada@example.com', password='secret'), self.user)
+            start = time.perf_counter()
+            for _ in range(self.LOGINS):
+                with self.assertNumQueries(1):
+                    self.assertIsNotNone(authenticate(username='ada', password='secret'))
+            elapsed = time.perf_counter() - start
+        self.user.refresh_from_db()
+        algorithm = self.user.password.split('$', 1)[0]
+        print(f"\n{profile}: {self.LOGINS / elapsed:.1f} logins/sec ({algorithm})")
+        return algorithm
+
+    def test_pbkdf2_login(self):
+        self.assertEqual(self.benchmark('pbkdf2'), 'pbkdf2_sha256')
+
+    def test_scrypt_login_rehashes_the_password(self):
+        self.assertEqual(self.benchmark('scrypt'), 'scrypt')
+
+    @skipUnless(importlib.util.find_spec('argon2'), 'argon2-cffi is not installed')
+    def test_argon2_login_rehashes_the_password(self):
+        self.assertEqual(self.benchmark('argon2'), 'argon2')
+
+    def test_email_match_wins_over_username(self):
+        User.objects.create_user('ada@example.com', 'other@example.com', 'other')
+        self.assertEqual(authenticate(username='ada@example.com', password='secret'), self.user)
+
+    def test_unknown_account_runs_the_hasher(self):
+        with mock.patch.object(User, 'set_password') as set_password, self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username='nobody@example.com', password='secret'))
+        set_password.assert_called_once_with('secret')
+
+    @skipUnless(connection.vendor == 'postgresql', 'email__iexact is indexed through UPPER(email) on PostgreSQL')
+    def test_lookup_is_indexed(self):
+        queryset = User.objects.filter(Q(email__iexact='ada@example.com') | Q(username='ada@example.com'))
+        with connection.cursor() as cursor:
+            # Otherwise a table this small is scanned whatever its indexes
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        tables, plan = sequential_scans(queryset)
+        self.assertNotIn('users_user', tables, plan)
+
+
+class RevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ada', 'ada@example.com', 'pw')
+        self.refresh = RevocableRefreshToken.for_user(self.user)
+        self.client = APIClient()
+
+    def profile(self, access):
+        return self.client.get('/api/users/profile/', HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_logout_revokes_both_tokens(self):
+        access = str(self.refresh.access_token)
+        self.assertEqual(self.profile(access).status_code, 200)
+
+        response = self.client.post('/api/users/logout/', {'refresh': str(self.refresh), 'access': access})
+
+        self.assertEqual(response.status_code, 205)
+        self.assertEqual(self.profile(access).status_code, 401)
+        response = self.client.post('/api/users/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_rotated_refresh_token_is_revoked(self):
+        # simplejwt's serializers keep the api_settings they were imported with
+        with mock.patch.object(jwt_serializers.api_settings, 'ROTATE_REFRESH_TOKENS', True):
+            rotated = self.client.post('/api/users/token/refresh/', {'refresh': str(self.refresh)}).json()['refresh']
+            reused = self.client.post('/api/users/token/refresh/', {'refresh': str(self.refresh)})
+            renewed = self.client.post('/api/users/token/refresh/', {'refresh': rotated})
+
+        self.assertEqual(reused.status_code, 401)
+        self.assertEqual(renewed.status_code, 200)
+
+    def test_revocation_reaches_other_workers(self):
+        # Each RevocationSet stands in for a worker's own filters
+        other = RevocationSet()
+        other.sync(force=True)
+        jti = self.refresh['jti']
+
+        revocations.revoke(jti, self.refresh['exp'])
+
+        self.assertTrue(revocations.is_revoked(jti))
+        other.sync(force=True)
+        self.assertTrue(other.is_revoked(jti))
+        # A worker started after the revocation reads it from the journal
+        self.assertTrue(RevocationSet().is_revoked(jti))
+
+    def test_journal_is_read_past_a_lagging_hint(self):
+        writer = RevocationSet()
+        expires_at = time.time() + 60
+        for n in range(10):
+            writer.revoke(f"jti-{n}", expires_at)
+        # As left by a slower writer setting the hint after a faster one
+        bucket = bucket_of(time.time())
+        self.assertEqual(revocation_cache.get(hint_key(bucket)), 10)
+        revocation_cache.set(hint_key(bucket), 1)
+
+        reader = RevocationSet()
+        self.assertTrue(all(reader.is_revoked(f"jti-{n}") for n in range(10)))
+        self.assertIsNone(revocation_cache.get(entry_key(bucket, 11)))
+
+    def test_revocations_survive_a_full_default_cache(self):
+        jti = self.refresh['jti']
+        revocations.revoke(jti, self.refresh['exp'])
+
+        max_entries = settings.CACHES['default']['OPTIONS']['MAX_ENTRIES']
+        cache.set_many({f"response:{n}": n for n in range(max_entries + 1000)})
+
+        self.assertTrue(RevocationSet().is_revoked(jti))
+
+    def test_locmem_refuses_several_workers(self):
+        env = {**os.environ, 'REVOCATION_CACHE_BACKEND': 'locmem', 'SHARED_CACHE_BACKEND': 'db', 'WEB_CONCURRENCY': '2'}
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'check'], env=env, capture_output=True, text=True,
+            cwd=settings.BASE_DIR,
+        )
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('REVOCATION_CACHE_BACKEND=locmem cannot be shared', result.stderr)
@@ -0,0 +1,41 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .revocation import revocations
+
+
+class RevocationMixin:
+    """
+    Tokens that can be revoked through users.revocation.
+
+    Stands in for simplejwt's blacklist app, which would cost a query on
+    every request: verification rejects revoked tokens, and blacklist()
+    (called by logout and by refresh rotation) revokes the token.
+    """
+
+    def verify(self):
+        super().verify()
+        self.check_revoked()
+
+    def check_revoked(self):
+        jti = self.payload.get(api_settings.JTI_CLAIM)
+        if jti is not None and revocations.is_revoked(jti):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        revocations.revoke(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+
+    def outstand(self):
+        # Called on refresh rotation; issued tokens are not recorded, as
+        # simplejwt's OutstandingToken needs the blacklist app
+        return None
+
+
+class RevocableAccessToken(RevocationMixin, AccessToken):
+    pass
+
+
+class RevocableRefreshToken(RevocationMixin, RefreshToken):
+    access_token_class = RevocableAccessToken
@@ -8,11 +8,15 @@ from .forms import RegistrationForm, ProfileEditForm, BillingInfoForm
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from .serializers import UserSerializer, UserRegisterSerializer, BillingInfoSerializer
+from .tokens import RevocableAccessToken, RevocableRefreshToken
 from stores.models import Store
 from stores.serializers import StoreSerializer
+from techshelf.cache import ConditionalGetMixin
 
 User = get_user_model()
 
@@ -96,6 +100,7 @@ class RegisterView(generics.CreateAPIView):
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'login'
     
     def post(self, request):
         email = request.data.get('email')
@@ -106,7 +111,7 @@ class LoginView(APIView):
         
         user = authenticate(request, username=email, password=password)
         if user is not None:
-            refresh = RefreshToken.for_user(user)
+            refresh = RevocableRefreshToken.for_user(user)
             
             return Response({
                 'refresh': str(refresh),
@@ -118,23 +123,49 @@ class LoginView(APIView):
                        status=status.HTTP_401_UNAUTHORIZED)
 
 class LogoutView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
+    """Revoke the refresh token and, if given, the access token"""
+    # The refresh token proves who is logging out, and an expired access
+    # token must not stop it from being revoked
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
     
     def post(self, request):
+        refresh_token = request.data.get('refresh')
+        if not refresh_token:
+            return Response({'error': 'Refresh token is required'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            refresh_token = request.data.get('refresh')
-            token = RefreshToken(refresh_token)
+            token = RevocableRefreshToken(refresh_token)
             token.blacklist()
-            return Response(status=status.HTTP_205_RESET_CONTENT)
-        except Exception:
+        except TokenError:
             return Response(status=status.HTTP_400_BAD_REQUEST)
+        
+        access_token = request.data.get('access')
+        if access_token:
+            try:
+                access = RevocableAccessToken(access_token)
+                if access[api_settings.USER_ID_CLAIM] == token[api_settings.USER_ID_CLAIM]:
+                    access.blacklist()
+            except TokenError:
+                # Already expired or invalid, so nothing to revoke
+                pass
+        return Response(status=status.HTTP_205_RESET_CONTENT)
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        # request.user is a read-only cached copy; update the row as it is now
+        return User.objects.select_for_update().get(pk=self.request.user.pk)
+    
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+    
+    def get_etag_tags(self, request, *args, **kwargs):
+        return [f"user:{request.user.pk}"]
 
 class BillingInfoView(generics.RetrieveUpdateAPIView):
     serializer_class = BillingInfoSerializer
@@ -147,27 +178,34 @@ class BillingInfoView(generics.RetrieveUpdateAPIView):
 class UpgradeToSellerView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
+    @transaction.atomic
     def post(self, request):
-        user = request.user
+        # request.user is a read-only cached copy, and may predate an upgrade
+        user = User.objects.select_for_update().get(pk=request.user.pk)
         if user.role == 'SELLER':
             return Response({'message': 'User is already a seller'}, status=status.HTTP_400_BAD_REQUEST)
         
         user.role = 'SELLER'
-        user.save()
+        user.save(update_fields=['role'])
         
         return Response({'message': 'Account upgraded to seller successfully'}, status=status.HTTP_200_OK)
 
-class UserStoreView(APIView):
+class UserStoreView(ConditionalGetMixin, generics.RetrieveAPIView):
     """Get the store associated with the current user"""
+    serializer_class = StoreSerializer
     permission_classes = [permissions.IsAuthenticated]
     
-    def get(self, request):
-        try:
-            store = Store.objects.get(user=request.user)
-            serializer = StoreSerializer(store)
-            return Response(serializer.data)
-        except Store.DoesNotExist:
+    def get_etag_tags(self, request, *args, **kwargs):
+        store_id = request.seller.store_id
+        return [f"store:{store_id}"] if store_id else None
+    
+    def retrieve(self, request, *args, **kwargs):
+        if request.seller.store is None:
             return Response(
                 {'error': 'You do not have a store yet'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        # Loaded in one query: the request's store leaves its rating fields deferred
+        store = Store.objects.select_related('theme', 'user').get(pk=request.seller.store_pk)
+        serializer = StoreSerializer(store)
+        return Response(serializer.data)